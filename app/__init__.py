@@ -3,19 +3,25 @@ from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 from flask_socketio import SocketIO
 from app.services.schema_data import SchemaManager
+from app.services.schema_reload import ReloadableSchema
 from app.services.cypher_generator import CypherQueryGenerator
 from app.services.metta_generator import MeTTa_Query_Generator
 from db import mongo_init
 from logger import init_logging
 from app.services.llm_handler import LLMHandler
-from app.persistence import AnnotationStorageService, UserStorageService
+from app.services.ontology_index import OntologyClosureIndex, RelationIndex
+from app.persistence import AnnotationStorageService, UserStorageService, create_result_store
+from app.services.graph_cache import GraphCache
+from app.services.graph_stats import GraphStats, StatsCollector, shipped_stats
 import os
 import logging
 import yaml
 from flask_redis import FlaskRedis
 from app.error import ThreadStopException
 import threading
-from app.constants import TaskStatus, GRAPH_INFO_PATH, ES_API_KEY, ES_URL
+from app.constants import TaskStatus, GRAPH_INFO_PATH, COUNT_INFO_PATH, ES_API_KEY, ES_URL, INDEX_DIR, \
+    RESULT_DIR, RESULT_STORE, GRAPH_CACHE_SIZE, SCHEMA_SNAPSHOT_DIR, SCHEMA_RELOAD_INTERVAL, \
+    STATS_DIR, STATS_REFRESH_INTERVAL, STATS_COLLECT_INTERVAL
 import json
 from dotenv import load_dotenv
 from elasticsearch import Elasticsearch
@@ -61,6 +67,12 @@ limiter = Limiter(
 
 mongo_init()
 
+# where annotation results are kept, shared between replicas unless local
+result_store = create_result_store(RESULT_STORE, RESULT_DIR)
+
+# annotation graphs read through memory, redis and the result store
+graph_cache = GraphCache(redis_client, result_store, GRAPH_CACHE_SIZE)
+
 try:
     es_db = Elasticsearch(ES_URL, api_key=ES_API_KEY)
     if es_db.ping():
@@ -85,6 +97,22 @@ databases = {
 database_type = config['database']['type']
 db_instance = databases[database_type]()
 
+# counts of the knowledge graph read by the query planner and /kg-info,
+# collected from the graph once a day and shared through STATS_DIR
+graph_stats = GraphStats(STATS_DIR, lambda: shipped_stats(GRAPH_INFO_PATH, COUNT_INFO_PATH))
+
+# precomputed ontology hierarchies, e.g. the GO cellular component subclasses,
+# rebuilt when the graph version of the statistics changes
+ontology_index = OntologyClosureIndex(db_instance, INDEX_DIR, lambda: graph_stats.kg_version)
+# precomputed node annotations, e.g. the cellular components of each protein
+relation_index = RelationIndex(db_instance, INDEX_DIR, lambda: graph_stats.kg_version)
+if database_type == 'cypher':
+    ontology_index.warm([{'node_type': 'go', 'relationship': 'subclass_of',
+                          'properties': {'subontology': 'cellular_component'}}])
+    relation_index.warm([{'source_type': 'go', 'target_type': 'protein',
+                          'relationship': 'go_gene_product',
+                          'properties': {'subontology': 'cellular_component'}}])
+
 llm = LLMHandler()  # Initialize the LLMHandler
 
 app.config['llm_handler'] = llm
@@ -93,14 +121,20 @@ app.config['annotation_lock'] = threading.Lock()
 app.config['es_db'] = es_db
 app.config['db_type'] = database_type
 
-schema_manager = SchemaManager(schema_config_path='./config/schema_config.yaml',
-                               biocypher_config_path='./config/biocypher_config.yaml',
-                               config_path='./config/schema',
-                               fly_schema_config_path='./config/fly_base_schema/net_act_essential_schema_config.yaml')
+def create_schema_manager():
+    return SchemaManager(schema_config_path='./config/schema_config.yaml',
+                         biocypher_config_path='./config/biocypher_config.yaml',
+                         config_path='./config/schema',
+                         fly_schema_config_path='./config/fly_base_schema/net_act_essential_schema_config.yaml',
+                         snapshot_dir=SCHEMA_SNAPSHOT_DIR)
+
+# rebuilt in the background when the schema configs change
+schema_manager = ReloadableSchema(create_schema_manager, SCHEMA_RELOAD_INTERVAL)
+schema_manager.watch()
 
-#load the json that holds the count for the edges
-graph_info = json.load(open(GRAPH_INFO_PATH))
+stats_collector = StatsCollector(db_instance, schema_manager, graph_stats)
+stats_collector.watch(STATS_REFRESH_INTERVAL, STATS_COLLECT_INTERVAL if database_type == 'cypher' else 0)
 
 # Import routes at the end to avoid circular imports
 from app import routes
-from app.annotation_controller import handle_client_request, process_full_data, requery
\ No newline at end of file
+from app.annotation_controller import handle_client_request, requery
\ No newline at end of file
@@ -1,16 +1,14 @@
 import logging
-from flask import Response, request
+from flask import request
 from app import app, db_instance, schema_manager
-import json
 import os
 import threading
 import datetime
 from app.workers.task_handler import generate_result, start_thread, reset_task, reset_status
-from app.lib import convert_to_csv, generate_file_path, \
-    adjust_file_path
 import time
 from app.constants import TaskStatus
 from app.persistence import AnnotationStorageService
+from app.serialization import json_response
 
 llm = app.config['llm_handler']
 EXP = os.getenv('REDIS_EXPIRATION', 3600) # expiration time of redis cache
@@ -49,9 +47,7 @@ def handle_client_request(query, request, current_user_id, node_types, species,
                 'summary': summary, 'meta_data': meta_data, 'data_source': data_source, 'species': species}
 
         start_thread(annotation_id, args)
-        return Response(
-            json.dumps({"annotation_id": str(annotation_id)}),
-            mimetype='application/json')
+        return json_response({"annotation_id": str(annotation_id)})
     elif annotation_id is None:
         title = llm.generate_title(query[0])
         annotation = {"current_user_id": str(current_user_id),
@@ -67,9 +63,7 @@ def handle_client_request(query, request, current_user_id, node_types, species,
                 'summary': None, 'meta_data': None, 'data_source': data_source, 'species': species}
         start_thread(annotation_id, args)
 
-        return Response(
-            json.dumps({"annotation_id": str(annotation_id)}),
-            mimetype='application/json')
+        return json_response({"annotation_id": str(annotation_id)})
     else:
         title = llm.generate_title(query[0])
         del request['annotation_id']
@@ -89,51 +83,7 @@ def handle_client_request(query, request, current_user_id, node_types, species,
 
         start_thread(annotation_id, args)
 
-        return Response(
-            json.dumps({'annotation_id': str(annotation_id)}),
-            mimetype='application/json'
-        )
-
-def process_full_data(current_user_id, annotation_id):
-    cursor = AnnotationStorageService.get_by_id(annotation_id)
-
-    if cursor is None:
-        return None
-
-
-    query, title, requests = cursor.query, cursor.title, cursor.request
-
-    graph_components = {
-            "nodes": requests['nodes'], "predicates": requests['predicates'],
-            'properties': True}
-
-
-    try:
-        file_path = generate_file_path(
-            file_name=title, user_id=current_user_id, extension='xls')
-        exists = os.path.exists(file_path)
-
-        if exists:
-            file_path = adjust_file_path(file_path)
-            link = f'{request.host_url}{file_path}'
-
-            return link
-
-
-        # Run the query and parse the results
-        result = db_instance.run_query(query)
-        parsed_result = db_instance.convert_to_dict(
-            result, schema_manager.schema, graph_components)
-
-        file_path = convert_to_csv(
-            parsed_result, user_id=current_user_id, file_name=title)
-        file_path = adjust_file_path(file_path)
-
-        link = f'{request.host_url}{file_path}'
-        return link
-
-    except Exception as e:
-        raise e
+        return json_response({"annotation_id": str(annotation_id)})
 
 def requery(annotation_id, query, request):
     #Event to track tasks
@@ -146,7 +146,29 @@ form_fields = {
 
 # Define the absolute path to the JSON file
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-GRAPH_INFO_PATH = os.path.join(BASE_DIR, '../Data/count_info.json')
+COUNT_INFO_PATH = os.path.join(BASE_DIR, '../Data/count_info.json')
+GRAPH_INFO_PATH = os.path.join(BASE_DIR, '../Data/graph_info.json')
+INDEX_DIR = os.path.join(BASE_DIR, '../Data/index')
+# computed schema, rebuilt from the BioCypher configs when they change
+SCHEMA_SNAPSHOT_DIR = os.getenv('SCHEMA_SNAPSHOT_DIR', INDEX_DIR)
+# seconds between checks of the schema configs for changes, 0 disables reloading
+SCHEMA_RELOAD_INTERVAL = int(os.getenv('SCHEMA_RELOAD_INTERVAL', 30))
+# statistics collected from the knowledge graph, see app/services/graph_stats.py
+STATS_DIR = os.getenv('STATS_DIR', os.path.join(BASE_DIR, '../Data/stats'))
+# seconds between checks for statistics saved by other workers
+STATS_REFRESH_INTERVAL = int(os.getenv('STATS_REFRESH_INTERVAL', 60))
+# seconds between collections, 0 disables collecting
+STATS_COLLECT_INTERVAL = int(os.getenv('STATS_COLLECT_INTERVAL', 86400))
+PUBLIC_DIR = os.path.join(BASE_DIR, '../public')
+RESULT_DIR = os.path.join(BASE_DIR, '../public/graph')
+RESULT_STORE = os.getenv('RESULT_STORE', 'local')
+EXPORT_WORKERS = int(os.getenv('EXPORT_WORKERS', 2))
+# seconds /annotation/<id>/full waits for an export before answering 202
+EXPORT_WAIT_TIMEOUT = int(os.getenv('EXPORT_WAIT_TIMEOUT', 30))
+# seconds a running export stays claimed in redis without a heartbeat of its worker
+EXPORT_LEASE = int(os.getenv('EXPORT_LEASE', 60))
+# nodes, edges and group members kept decoded in memory by the graph cache
+GRAPH_CACHE_SIZE = int(os.getenv('GRAPH_CACHE_SIZE', 500000))
 ES_URL = os.getenv('ES_URL')
 ES_API_KEY = os.getenv('ES_API_KEY')
 
@@ -1,8 +1,8 @@
 from .validator import validate_request
-from .map_graph import map_graph
-from .limit_graph import limit_graph
+from .map_graph import map_graph, map_graph_columnar
+from .limit_graph import limit_graph, get_query_anchors
 from .email import send_email
 from .auth import token_required
-from .utils import convert_to_excel, generate_file_path, adjust_file_path, extract_middle, convert_to_csv
+from .utils import generate_file_path, adjust_file_path, extract_middle, convert_to_csv
 from .graph import Graph
-from .heuristic_sort import heuristic_sort
+from .query_planner import plan_predicates, CardinalityStats
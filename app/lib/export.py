@@ -0,0 +1,313 @@
+import csv
+import re
+import zipfile
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# export format -> extension of the generated artifact
+EXPORT_FORMATS = {
+    'xlsx': 'xlsx',
+    'tsv': 'zip',
+    'parquet': 'zip'
+}
+
+NODE_COLUMNS = ['id', 'name', 'type']
+# edges.tsv names the target column 'edge', as the export always did
+EDGE_COLUMNS = ['source', 'edge', 'label']
+
+def export_key(annotation_id, file_format, version):
+    '''
+    Result store key of the export of one version of an annotation result.
+    '''
+    return f'export-{annotation_id}-{file_format}-{version}.{EXPORT_FORMATS[file_format]}'
+
+def iter_member_nodes(graph):
+    '''
+    Yields the member nodes of every group node of a grouped graph,
+    i.e. the nodes of the graph before grouping. Parent (compound) nodes
+    only hold other group nodes and are skipped.
+    '''
+    for node in graph['nodes']:
+        data = node['data']
+        if data['type'] == 'parent':
+            continue
+        for member in data.get('nodes', []):
+            yield member
+
+def iter_member_edges(graph):
+    '''
+    Yields (source id, target id, label) for the edges of a grouped graph
+    expanded to its member nodes, without materializing the expansion.
+
+    How it works:
+        1. Map every parent node to the group nodes it holds and every
+           group node to its members.
+        2. Replace the parent end of an edge with the groups it holds and
+           keep each (source group, label, target group) once.
+        3. Yield the cross product of the members of both groups lazily.
+
+    Only the grouped edges are remembered, so memory does not grow with the
+    number of expanded rows.
+    '''
+    members = {}
+    children = {}
+
+    for node in graph['nodes']:
+        data = node['data']
+        if data['type'] == 'parent':
+            children.setdefault(data['id'], [])
+        else:
+            members[data['id']] = data.get('nodes', [])
+
+    for node in graph['nodes']:
+        data = node['data']
+        if data.get('parent') and data['type'] != 'parent':
+            children.setdefault(data['parent'], []).append(data['id'])
+
+    seen = set()
+
+    for edge in graph['edges']:
+        data = edge['data']
+        label = data['label']
+        sources = children.get(data['source'], [data['source']])
+        targets = children.get(data['target'], [data['target']])
+
+        for source in sources:
+            for target in targets:
+                key = (source, label, target)
+                if key in seen:
+                    continue
+                seen.add(key)
+
+                for source_node in members.get(source, []):
+                    for target_node in members.get(target, []):
+                        yield source_node['id'], target_node['id'], label
+
+class _ChunkBuffer:
+    '''
+    Write-only file object collecting what the zip writer produces until
+    the streaming generator picks it up. It does not support seek or tell,
+    so zipfile writes data descriptors instead of rewriting local headers.
+    '''
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+class _LineBuffer:
+    def __init__(self):
+        self.line = ''
+
+    def write(self, line):
+        self.line = line
+
+def _iter_tsv_lines(header, rows):
+    buffer = _LineBuffer()
+    writer = csv.writer(buffer, delimiter='\t', lineterminator='\n')
+    writer.writerow(header)
+    yield buffer.line
+    for row in rows:
+        writer.writerow(row)
+        yield buffer.line
+
+def iter_tsv_files(graph):
+    '''
+    Yields (file name, line iterator) for the node and edge TSV files
+    of a grouped graph.
+    '''
+    node_rows = ([member.get(column) for column in NODE_COLUMNS]
+                 for member in iter_member_nodes(graph))
+    yield 'nodes.tsv', _iter_tsv_lines(NODE_COLUMNS, node_rows)
+    yield 'edges.tsv', _iter_tsv_lines(EDGE_COLUMNS, iter_member_edges(graph))
+
+def _iter_batches(lines, chunk_size):
+    batch = []
+    batch_size = 0
+    for line in lines:
+        batch.append(line)
+        batch_size += len(line)
+        if batch_size >= chunk_size:
+            yield ''.join(batch).encode('utf-8')
+            batch = []
+            batch_size = 0
+    if batch:
+        yield ''.join(batch).encode('utf-8')
+
+def _stream_zip(files, compression=zipfile.ZIP_DEFLATED):
+    '''
+    Streams a zip archive of `files`, an iterable of (file name, iterator of
+    bytes). Whatever the archive writer produced is yielded after each chunk
+    of input is written, nothing is kept once it has been sent.
+    '''
+    buffer = _ChunkBuffer()
+
+    with zipfile.ZipFile(buffer, 'w', compression) as zipf:
+        for file_name, chunks in files:
+            with zipf.open(file_name, 'w', force_zip64=True) as member:
+                for chunk in chunks:
+                    member.write(chunk)
+                    data = buffer.drain()
+                    if data:
+                        yield data
+
+            data = buffer.drain()
+            if data:
+                yield data
+
+    data = buffer.drain()
+    if data:
+        yield data
+
+def stream_tsv_zip(graph, chunk_size=64 * 1024):
+    '''
+    Streams a zip archive holding nodes.tsv and edges.tsv of a grouped graph.
+
+    How it works:
+        Rows are generated lazily (see iter_member_edges) and written to the
+        deflate stream of the current archive member in batches of about
+        `chunk_size` bytes. The compressed bytes produced by each batch are
+        yielded right away, so memory stays bounded by the batch size
+        whatever the number of expanded rows.
+
+    Args:
+        graph (dict): Grouped graph containing 'nodes' and 'edges'
+        chunk_size (int): Size of the uncompressed batches written to the archive
+
+    Returns:
+        generator: bytes chunks of the zip archive
+    '''
+    files = ((file_name, _iter_batches(lines, chunk_size))
+             for file_name, lines in iter_tsv_files(graph))
+    return _stream_zip(files)
+
+COLUMNAR_FORMATS = {'parquet': 'parquet', 'arrow': 'arrow'}
+ID_COLUMNS = ('id', 'source', 'target')
+
+def _file_name(name, used):
+    '''
+    Archive-safe name of a label. Labels that only differ in the characters
+    replaced here get a numbered suffix, so every entry name is unique.
+    '''
+    base = re.sub(r'[^\w\-]', '_', name) or 'unnamed'
+    file_name = base
+    suffix = 1
+    while file_name in used:
+        suffix += 1
+        file_name = f'{base}_{suffix}'
+    used.add(file_name)
+    return file_name
+
+def _columnar_array(name, values):
+    try:
+        array = pa.array(values)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, TypeError):
+        # mixed value types across the rows of a label, keep them as text
+        array = pa.array([None if value is None else str(value) for value in values],
+                         type=pa.string())
+
+    if name in ID_COLUMNS and pa.types.is_string(array.type):
+        array = array.dictionary_encode()
+    return array
+
+def _columnar_table(rows):
+    columns = {}
+    for row in rows:
+        for key in row:
+            if key not in columns:
+                columns[key] = None
+
+    return pa.table({
+        name: _columnar_array(name, [row.get(name) for row in rows])
+        for name in columns
+    })
+
+def iter_columnar_tables(graph):
+    '''
+    Yields (file name, pyarrow.Table) with one table of member nodes per
+    node label and one table of member edges per relationship type.
+
+    Column types are inferred by Arrow from the stored values. Columns whose
+    values do not share a type are stored as strings, node ids and edge
+    ends are dictionary encoded.
+    '''
+    nodes = {}
+    for member in iter_member_nodes(graph):
+        nodes.setdefault(member.get('type', 'unknown'), []).append(member)
+
+    used = set()
+    for label, rows in nodes.items():
+        yield f'nodes/{_file_name(label, used)}', _columnar_table(rows)
+
+    edges = {}
+    for source, target, label in iter_member_edges(graph):
+        columns = edges.setdefault(label, ([], []))
+        columns[0].append(source)
+        columns[1].append(target)
+
+    used = set()
+    for label, (sources, targets) in edges.items():
+        yield f'edges/{_file_name(label, used)}', pa.table({
+            'source': pa.array(sources, type=pa.string()).dictionary_encode(),
+            'target': pa.array(targets, type=pa.string()).dictionary_encode(),
+            'label': pa.array([label] * len(sources), type=pa.string()).dictionary_encode()
+        })
+
+def _serialize_table(table, file_format):
+    sink = pa.BufferOutputStream()
+    if file_format == 'parquet':
+        pq.write_table(table, sink, compression='zstd')
+    else:
+        with pa.ipc.new_file(sink, table.schema,
+                             options=pa.ipc.IpcWriteOptions(compression='zstd')) as writer:
+            writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+def stream_columnar_zip(graph, file_format='parquet'):
+    '''
+    Streams a zip archive holding a Parquet or Arrow IPC file per node label
+    (nodes/<label>.<ext>) and per relationship type (edges/<label>.<ext>).
+
+    The files are compressed by Arrow already, so they are stored in the
+    archive as they are. Only the table being written is serialized at a
+    time.
+
+    Args:
+        graph (dict): Grouped graph containing 'nodes' and 'edges'
+        file_format (str): 'parquet' or 'arrow'
+
+    Returns:
+        generator: bytes chunks of the zip archive
+    '''
+    if file_format not in COLUMNAR_FORMATS:
+        raise ValueError(f"Unsupported export format {file_format}")
+
+    extension = COLUMNAR_FORMATS[file_format]
+    files = ((f'{name}.{extension}', iter([_serialize_table(table, file_format)]))
+             for name, table in iter_columnar_tables(graph))
+    return _stream_zip(files, compression=zipfile.ZIP_STORED)
+
+def split_by_label(graph):
+    '''
+    Splits an ungrouped graph into (nodes by type, edges by label), the
+    layout the full data export is written from.
+    '''
+    node_dict = {}
+    edge_dict = {}
+
+    for node in graph['nodes']:
+        node_dict.setdefault(node['data']['type'], []).append(node)
+
+    for edge in graph['edges']:
+        edge_dict.setdefault(edge['data']['label'], []).append(edge)
+
+    return (node_dict, edge_dict)
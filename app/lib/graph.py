@@ -2,12 +2,8 @@ from nanoid import generate
 import json
 import hashlib
 from app.lib.utils import extract_middle
-import random
-from copy import deepcopy
 import networkx as nx
 from networkx.readwrite import json_graph
-from copy import deepcopy
-import random
 
 class Graph:
     def __init__(self):
@@ -22,99 +18,107 @@ class Graph:
         """
         Group nodes and edges of a graph based on their cellular location.
 
-         - Nodes with multiple locations are duplicated per location and linked
-           with a `location_alias` edge.
-         - Original edges are remapped to the chosen main duplicate node.
+         - Nodes with multiple locations get one copy per location. The copy of
+           the first listed location is the main node, the others are linked to
+           it with a `location_alias` edge.
+         - Original edges are remapped to the main node.
          - Nodes with the same location and identical in/out edge patterns
-           are merged into a single meta-node.
+           are merged into a single grouped node.
          - Returns a simplified graph JSON with redundant nodes collapsed.
         """
-        G = nx.DiGraph()
         node_to_id_map = {}
         original_id_to_main_id = {}
+        edges = []
 
         for node_entry in graph.get("nodes", []):
-            node_data = deepcopy(node_entry["data"])
+            node_data = node_entry["data"]
             node_id = node_data["id"]
             locations = node_data.get("location", "")
             location_list = [loc.strip() for loc in locations.split(",") if loc.strip()] or [""]
+            location_list = list(dict.fromkeys(location_list))
+            main_id = node_id if len(location_list) == 1 else f"{node_id}_loc_0"
 
-            # Generate unique IDs per location
-            dup_nodes = []
+            # a shallow copy is enough, only the top level keys differ per location
             for idx, location in enumerate(location_list):
-                dup_data = deepcopy(node_data)
-                dup_data["location"] = location
-                dup_id = f"{node_id}_loc_{idx}" if len(location_list) > 1 else node_id
-                dup_data["id"] = dup_id
-                dup_nodes.append((dup_id, dup_data))
-
-            # Choose a main node arbitrarily
-            main_dup_id, main_data = random.choice(dup_nodes)
-            main_data.pop("duplicate", None)  # Ensure no duplicate flag
-
-            for dup_id, dup_data in dup_nodes:
-                if dup_id != main_dup_id:
+                dup_id = node_id if len(location_list) == 1 else f"{node_id}_loc_{idx}"
+                dup_data = {**node_data, "id": dup_id, "location": location}
+                dup_data.pop("duplicate", None)
+
+                if idx > 0:
                     dup_data["duplicate"] = True
-                    G.add_node(dup_id, data=dup_data)
-                    # Connect to main node
-                    G.add_edge(dup_id, main_dup_id, id=generate(), edge_id="location_alias", label="location_alias")
-                else:
-                    G.add_node(dup_id, data=dup_data)
+                    edges.append((dup_id, main_id, {"edge_id": "location_alias", "label": "location_alias"}))
 
                 node_to_id_map[dup_id] = dup_data
 
-            # Map original ID to selected main node
-            original_id_to_main_id[node_id] = main_dup_id
+            original_id_to_main_id[node_id] = main_id
 
         # Add edges with remapped node IDs
         for edge in graph.get("edges", []):
-            src = original_id_to_main_id.get(edge["data"]["source"], edge["data"]["source"])
-            tgt = original_id_to_main_id.get(edge["data"]["target"], edge["data"]["target"])
             edge_data = edge["data"]
-            G.add_edge(src, tgt, **edge_data)
+            src = original_id_to_main_id.get(edge_data["source"], edge_data["source"])
+            tgt = original_id_to_main_id.get(edge_data["target"], edge_data["target"])
+            edges.append((src, tgt, edge_data))
+
+        in_edges = {node_id: [] for node_id in node_to_id_map}
+        out_edges = {node_id: [] for node_id in node_to_id_map}
+
+        for src, tgt, edge_data in edges:
+            if src in out_edges:
+                out_edges[src].append((tgt, edge_data["edge_id"]))
+            if tgt in in_edges:
+                in_edges[tgt].append((src, edge_data["edge_id"]))
 
         # Group nodes by (location, in_edges, out_edges)
         signatures = {}
-        for node in G.nodes():
-            node_data = G.nodes[node].get("data", {})
-            location = node_data.get("location", "")
-            in_edges = [(u, data['edge_id']) for u, _, data in G.in_edges(node, data=True)]
-            out_edges = [(v, data['edge_id']) for _, v, data in G.out_edges(node, data=True)]
-            signature = (location, tuple(sorted(in_edges)), tuple(sorted(out_edges)))
-            signatures.setdefault(signature, []).append(node)
+        for node_id, node_data in node_to_id_map.items():
+            signature = (node_data["location"],
+                         tuple(sorted(set(in_edges[node_id]))),
+                         tuple(sorted(set(out_edges[node_id]))))
+            signatures.setdefault(signature, []).append(node_id)
 
         # Collapse by signature
-        for nodes in signatures.values():
+        new_graph = {"nodes": [], "edges": []}
+        node_to_group = {}
+
+        for (location, _, _), nodes in signatures.items():
             if len(nodes) == 1:
+                node_to_group[nodes[0]] = nodes[0]
+                new_graph["nodes"].append({"data": node_to_id_map[nodes[0]]})
                 continue
 
-            base_label = G.nodes[nodes[0]]["data"]["id"].split(" ")[0]
+            base_label = nodes[0].split(" ")[0]
             merged_id = generate()
-            name = f'{len(nodes)} {base_label} nodes'
-            other_nodes = [node_to_id_map[n] for n in nodes]
 
-            merged_attrs = {
-                "type": base_label,
-                "name": name,
-                "nodes": other_nodes,
-                "id": merged_id,
-            }
+            for node in nodes:
+                node_to_group[node] = merged_id
 
-            G.add_node(merged_id, **merged_attrs)
+            new_graph["nodes"].append({
+                "data": {
+                    "type": base_label,
+                    "name": f"{len(nodes)} {base_label} nodes",
+                    "nodes": [node_to_id_map[n] for n in nodes],
+                    "id": merged_id,
+                    "location": location
+                }
+            })
 
-            connected_nodes = set()
-            for node in nodes:
-                for u, _, data in G.in_edges(node, data=True):
-                    if u not in nodes and u not in connected_nodes:
-                        G.add_edge(u, merged_id, **data)
-                        connected_nodes.add(u)
-                for _, v, data in G.out_edges(node, data=True):
-                    if v not in nodes and v not in connected_nodes:
-                        G.add_edge(merged_id, v, **data)
-                        connected_nodes.add(v)
-                G.remove_node(node)
+        # Redirect the edges to the grouped nodes, dropping the ones inside a group.
+        # Edges keep all of their properties, only their ends are replaced.
+        added = set()
+        for src, tgt, edge_data in edges:
+            source = node_to_group.get(src, src)
+            target = node_to_group.get(tgt, tgt)
+            key = (source, target, edge_data["edge_id"])
 
-        return self.convert_to_graph_json(G)
+            if source == target or key in added:
+                continue
+            added.add(key)
+
+            new_graph["edges"].append({
+                "data": {**edge_data, "id": generate(), "source": source, "target": target}
+            })
+
+        return new_graph
 
     def group_node_only(self, graph, request):
         nodes = graph['nodes']
@@ -144,6 +148,54 @@ class Graph:
             new_graph['nodes'].append(new_node)
         return new_graph
 
+    def to_skeleton(self, graph, sample_size=3):
+        '''
+        Build a level-of-detail view of a grouped graph.
+        Each grouped node keeps only `sample_size` of its members along with
+        the total member count, the rest can be paged with get_group_members.
+        '''
+        skeleton = {"nodes": [], "edges": graph["edges"]}
+
+        for node in graph["nodes"]:
+            data = node["data"]
+            members = data.get("nodes")
+            if members is None:
+                skeleton["nodes"].append(node)
+                continue
+
+            data = {key: value for key, value in data.items() if key != "nodes"}
+            data["count"] = len(members)
+            data["nodes"] = members[:sample_size]
+            data["truncated"] = len(members) > sample_size
+            skeleton["nodes"].append({"data": data})
+
+        return skeleton
+
+    def get_group_members(self, graph, group_id, offset=0, limit=100):
+        '''
+        Return one page of the members of a grouped node.
+        `next_offset` is the cursor for the following page, None on the last one.
+        '''
+        for node in graph["nodes"]:
+            if node["data"]["id"] != group_id:
+                continue
+
+            return self.page_members(group_id, node["data"].get("nodes", []), offset, limit)
+
+        return None
+
+    def page_members(self, group_id, members, offset=0, limit=100):
+        page = members[offset:offset + limit]
+        next_offset = offset + len(page)
+
+        return {
+            "group_id": group_id,
+            "count": len(members),
+            "offset": offset,
+            "next_offset": next_offset if next_offset < len(members) else None,
+            "nodes": page
+        }
+
     def get_node_to_connections_map(self, graph):
         '''
         Build a mapping from node IDs to a dictionary of connections.
@@ -339,7 +391,7 @@ class Graph:
         return G
 
 
-    def convert_to_graph_json(self, graph):
+    def convert_to_graph_json(self, graph, allow_data=True):
         """
         Convert a networkx graph to a json representation.
         """
@@ -352,7 +404,7 @@ class Graph:
                     "data": graph.nodes[node]  # Get the node's attributes here
                 }
             else:
-                data = graph.nodes[nodes]
+                data = graph.nodes[node]
             graph_json['nodes'].append(data)
 
         # build the edges
@@ -536,94 +588,6 @@ class Graph:
         graph["edges"] = new_edges
         return graph
 
-    def collapse_node_nx_location(self, graph):
-        G = nx.DiGraph()
-        node_to_id_map = {}
-        original_id_to_main_id = {}
-
-        for node_entry in graph.get("nodes", []):
-            node_data = deepcopy(node_entry["data"])
-            node_id = node_data["id"]
-            locations = node_data.get("location", "")
-            location_list = [loc.strip() for loc in locations.split(",") if loc.strip()] or [""]
-
-            # Generate unique IDs per location
-            dup_nodes = []
-            for idx, location in enumerate(location_list):
-                dup_data = deepcopy(node_data)
-                dup_data["location"] = location
-                dup_id = f"{node_id}_loc_{idx}" if len(location_list) > 1 else node_id
-                dup_data["id"] = dup_id
-                dup_nodes.append((dup_id, dup_data))
-
-            # Choose a main node arbitrarily
-            main_dup_id, main_data = random.choice(dup_nodes)
-            main_data.pop("duplicate", None)  # Ensure no duplicate flag
-
-            for dup_id, dup_data in dup_nodes:
-                if dup_id != main_dup_id:
-                    dup_data["duplicate"] = True
-                    G.add_node(dup_id, data=dup_data)
-                    # Connect to main node
-                    G.add_edge(dup_id, main_dup_id, id=generate(), edge_id="location_alias", label="location_alias")
-                else:
-                    G.add_node(dup_id, data=dup_data)
-
-                node_to_id_map[dup_id] = dup_data
-
-            # Map original ID to selected main node
-            original_id_to_main_id[node_id] = main_dup_id
-
-        # Add edges with remapped node IDs
-        for edge in graph.get("edges", []):
-            src = original_id_to_main_id.get(edge["data"]["source"], edge["data"]["source"])
-            tgt = original_id_to_main_id.get(edge["data"]["target"], edge["data"]["target"])
-            edge_data = edge["data"]
-            G.add_edge(src, tgt, **edge_data)
-
-        # Group nodes by (location, in_edges, out_edges)
-        signatures = {}
-        for node in G.nodes():
-            node_data = G.nodes[node].get("data", {})
-            location = node_data.get("location", "")
-            in_edges = [(u, data['edge_id']) for u, _, data in G.in_edges(node, data=True)]
-            out_edges = [(v, data['edge_id']) for _, v, data in G.out_edges(node, data=True)]
-            signature = (location, tuple(sorted(in_edges)), tuple(sorted(out_edges)))
-            signatures.setdefault(signature, []).append(node)
-
-        # Collapse by signature
-        for nodes in signatures.values():
-            if len(nodes) == 1:
-                continue
-
-            base_label = G.nodes[nodes[0]]["data"]["id"].split(" ")[0]
-            merged_id = generate()
-            name = f'{len(nodes)} {base_label} nodes'
-            other_nodes = [node_to_id_map[n] for n in nodes]
-
-            merged_attrs = {
-                "type": base_label,
-                "name": name,
-                "nodes": other_nodes,
-                "id": merged_id,
-            }
-
-            G.add_node(merged_id, **merged_attrs)
-
-            connected_nodes = set()
-            for node in nodes:
-                for u, _, data in G.in_edges(node, data=True):
-                    if u not in nodes and u not in connected_nodes:
-                        G.add_edge(u, merged_id, **data)
-                        connected_nodes.add(u)
-                for _, v, data in G.out_edges(node, data=True):
-                    if v not in nodes and v not in connected_nodes:
-                        G.add_edge(merged_id, v, **data)
-                        connected_nodes.add(v)
-                G.remove_node(node)
-
-        return self.convert_to_graph_json(G, allow_data=False)
-
     def break_grouping(self, graph):
         nodes = graph['nodes']
         edges = graph['edges']
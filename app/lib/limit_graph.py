@@ -1,56 +1,99 @@
-from app.lib.map_graph import map_graph
+import heapq
+from app.lib.map_graph import map_graph_columnar
 
-def limit_graph(graph, threshold):
+def get_query_anchors(request):
     '''
-    Reduces the number of graphs based on the threshold while keeping relvant information
+    Collects the ids of the nodes the user explicitly asked for in the query.
+
+    Args:
+        request (dict): The annotation request containing 'nodes'
+
+    Returns:
+        set: node ids in the "<type> <id>" format used by the result graph
+    '''
+    anchors = set()
+    for node in request.get('nodes', []):
+        if node.get('id'):
+            anchors.add(f"{node['type']} {node['id']}".lower())
+    return anchors
+
+def limit_graph(graph, threshold, anchors=None):
+    '''
+    Reduces the graph to the `threshold` most informative nodes.
 
     How it works:
-        1. Identify the nodes with edges and nodes without edges
-        2. Select edges connecting each node that doesn't exceed the threshold.
-        3. Add the nodes connected by the selected edges to a collection of included nodes.
-        4. If capacity allows, includes isolated nodes until the threshold is reached.
-    
+        1. Build a columnar view of the graph (see map_graph_columnar).
+        2. Score each node by whether it holds a query anchor, its degree and
+           the number of distinct edge labels touching it. Edges attached to a
+           parent (compound) node are credited to each of its children.
+        3. Keep the top `threshold` nodes with a bounded heap. Ties are broken
+           by the position of the node in the graph, so the result does not
+           depend on the order edges are visited in.
+        4. Keep the edges whose ends both survived and the parent nodes that
+           still hold at least one of the kept nodes.
+
+    Runs in O(E + N log K) where K is the threshold.
+
     Args:
         graph (dict): Graph containing 'nodes' and 'edges'
         threshold (int): The maximum number of nodes to be displayed
+        anchors (set): Optional node ids that should be ranked first
 
     Returns:
         dict: A new graph containg 'nodes' and 'edges'
     '''
-    (edge_idx, single_node_idx, node_id_to_index) = map_graph(graph)
-    allowed_edges = set()
-    remaining = threshold
-
-    for _, adj_list in enumerate(edge_idx):
-        if len(adj_list) == 0:
-            continue
-        
-        if len(adj_list) + 1 <= remaining:
-            allowed_edges.update(adj_list)
-            remaining -= (len(adj_list) + 1)
-    nodes_to_include = set()
-    for edge_idx in allowed_edges:
-        edge = graph["edges"][edge_idx]
-        source_id = edge["data"]["source"]
-        target_id = edge["data"]["target"]
-        
-        nodes_to_include.add(source_id)
-        nodes_to_include.add(target_id)
-    
+    nodes = graph["nodes"]
+    edges = graph["edges"]
+    anchors = anchors or set()
+
+    columns = map_graph_columnar(graph)
+    parent = columns["parent"]
+    is_parent = columns["is_parent"]
+
+    candidates = [idx for idx in range(len(nodes)) if not is_parent[idx]]
+    if threshold is None or len(candidates) <= threshold:
+        return graph
+
+    degree = [0] * len(nodes)
+    labels = [set() for _ in range(len(nodes))]
+
+    for source, target, label in zip(columns["edge_source"], columns["edge_target"], columns["edge_label"]):
+        degree[source] += 1
+        degree[target] += 1
+        labels[source].add(label)
+        labels[target].add(label)
+
+    def is_anchor(idx):
+        data = nodes[idx]["data"]
+        if data["id"].lower() in anchors:
+            return True
+        return any(member.get("id", "").lower() in anchors for member in data.get("nodes", []))
+
+    def score(idx):
+        node_degree = degree[idx]
+        node_labels = labels[idx]
+        parent_idx = parent[idx]
+        if parent_idx != -1:
+            node_degree += degree[parent_idx]
+            node_labels = node_labels | labels[parent_idx]
+        anchored = bool(anchors) and is_anchor(idx)
+        return (anchored, node_degree, len(node_labels), -idx)
+
+    kept = set(heapq.nlargest(max(threshold, 0), candidates, key=score))
+
+    # keep the compound nodes that still group at least one kept node
+    for idx in list(kept):
+        if parent[idx] != -1:
+            kept.add(parent[idx])
+
     new_response = {"nodes": [], "edges": []}
-    
-    # add nodes with edges
-    for node_id in nodes_to_include:
-        if node_id in node_id_to_index:
-            new_response["nodes"].append(graph["nodes"][node_id_to_index[node_id]])
-    
-    # add edges
-    for edge_idx in allowed_edges:
-        new_response["edges"].append(graph["edges"][edge_idx])
-    
-    # add nodes without edges
-    for node_widx in single_node_idx:
-        if remaining != 0:
-            new_response["nodes"].append(graph["nodes"][node_widx])
-            remaining = remaining - 1
-    return new_response 
+
+    for idx, node in enumerate(nodes):
+        if idx in kept:
+            new_response["nodes"].append(node)
+
+    for source, target, edge_idx in zip(columns["edge_source"], columns["edge_target"], columns["edge_index"]):
+        if source in kept and target in kept:
+            new_response["edges"].append(edges[edge_idx])
+
+    return new_response
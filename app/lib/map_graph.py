@@ -49,3 +49,59 @@ def map_graph(graph):
             single_node_idx.append(idx)
     return edge_indices, single_node_idx, node_id_to_index
 
+
+def map_graph_columnar(graph):
+    '''
+    Builds a columnar view of a graph so that it can be scanned with index arrays
+    instead of nested dictionaries.
+
+    How it works:
+        1. Assign every node an integer index in the order it appears in the graph.
+        2. Record the parent (compound node) index of every node, -1 if it has none.
+        3. Store the edges as parallel source index, target index and label arrays.
+           Edges pointing to unknown nodes are skipped.
+
+    Args:
+        graph (dict): Graph containing 'nodes' and 'edges'
+
+    Returns:
+        dict:
+            - node_id_to_index: a mapping of node Ids to their indices
+            - parent: a list holding the parent index of each node
+            - is_parent: a list of booleans marking compound (parent) nodes
+            - edge_source: a list of source node indices
+            - edge_target: a list of target node indices
+            - edge_label: a list of edge labels
+            - edge_index: a list of the original positions of the kept edges
+    '''
+    nodes = graph["nodes"]
+    edges = graph["edges"]
+
+    node_id_to_index = {node["data"]["id"]: idx for idx, node in enumerate(nodes)}
+    is_parent = [node["data"].get("type") == "parent" for node in nodes]
+    parent = [node_id_to_index.get(node["data"].get("parent") or None, -1) for node in nodes]
+
+    edge_source = []
+    edge_target = []
+    edge_label = []
+    edge_index = []
+
+    for idx, edge in enumerate(edges):
+        source_index = node_id_to_index.get(edge["data"]["source"])
+        target_index = node_id_to_index.get(edge["data"]["target"])
+        if source_index is None or target_index is None:
+            continue
+        edge_source.append(source_index)
+        edge_target.append(target_index)
+        edge_label.append(edge["data"].get("label", ""))
+        edge_index.append(idx)
+
+    return {
+        "node_id_to_index": node_id_to_index,
+        "parent": parent,
+        "is_parent": is_parent,
+        "edge_source": edge_source,
+        "edge_target": edge_target,
+        "edge_label": edge_label,
+        "edge_index": edge_index,
+    }
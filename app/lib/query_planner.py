@@ -0,0 +1,180 @@
+from math import prod
+
+# fraction of the nodes of a type left by each property filter
+PROPERTY_SELECTIVITY = 0.1
+# counts assumed for node and edge types without statistics
+DEFAULT_NODE_COUNT = 100000
+DEFAULT_EDGE_COUNT = 1000000
+# above this many predicates the order is chosen greedily
+MAX_EXHAUSTIVE_PREDICATES = 10
+
+class CardinalityStats:
+    '''
+    Node and edge counts the planner estimates intermediate results from.
+
+    Args:
+        edge_counts (dict): Edge type statistics keyed by schema key or label,
+            {key: {'count': int, 'name': label}} as in Data/count_info.json
+        node_counts (dict): Node count per label
+        properties (dict): Property statistics of a sample of each label,
+            {label: {'sample': int, 'properties': {key: {'count', 'distinct'}}}}
+    '''
+    def __init__(self, edge_counts, node_counts, properties=None):
+        self.edge_counts = {}
+        self.label_counts = {}
+        for key, value in (edge_counts or {}).items():
+            count = value.get('count', 0)
+            self.edge_counts[key] = count
+            label = value.get('name', key)
+            self.label_counts[label] = self.label_counts.get(label, 0) + count
+        self.node_counts = dict(node_counts or {})
+        self.properties = properties or {}
+
+    @classmethod
+    def from_species_stats(cls, species_stats):
+        '''
+        Statistics of a species as kept by GraphStats.
+        '''
+        return cls(species_stats.get('edge_counts'), species_stats.get('node_counts'),
+                   species_stats.get('properties'))
+
+    def node_count(self, node_type):
+        return max(self.node_counts.get(node_type, DEFAULT_NODE_COUNT), 1)
+
+    def edge_count(self, label, edge_key=None):
+        for count in (self.edge_counts.get(edge_key), self.edge_counts.get(label),
+                      self.label_counts.get(label)):
+            if count is not None:
+                return count
+        return DEFAULT_EDGE_COUNT
+
+    def property_selectivity(self, node_type, key):
+        '''
+        Fraction of the nodes of a type equal to a value of the property
+        `key`, assuming its values are equally frequent in the sample.
+        '''
+        label_stats = self.properties.get(node_type, {})
+        property_stats = label_stats.get('properties', {}).get(key)
+        if not property_stats or not label_stats.get('sample') or not property_stats.get('distinct'):
+            return PROPERTY_SELECTIVITY
+        return property_stats['count'] / label_stats['sample'] / property_stats['distinct']
+
+    def selectivity(self, node):
+        '''
+        Fraction of the nodes of its type a request node matches.
+        '''
+        if node.get('id'):
+            return 1 / self.node_count(node['type'])
+        return prod(self.property_selectivity(node['type'], key)
+                    for key in (node.get('properties') or {}))
+
+class JoinEstimate:
+    '''
+    Estimated rows of joining a set of predicates.
+
+    How it works:
+        Every predicate contributes the count of its edge type, every node
+        the selectivity of its filters. A node shared by k predicates is a
+        join on its type, dividing by the node count k - 1 times. The
+        estimate of a set does not depend on the order it is joined in.
+    '''
+    def __init__(self, predicates, node_map, stats, adjacency=None):
+        self.predicates = predicates
+        self.node_map = node_map
+        self.stats = stats
+        self.edge_counts = []
+        for predicate in predicates:
+            label = predicate['type'].replace(' ', '_').lower()
+            edge_key = None
+            if adjacency is not None:
+                edge_key = adjacency.edge_key(node_map[predicate['source']]['type'], label,
+                                              node_map[predicate['target']]['type'])
+            self.edge_counts.append(float(stats.edge_count(label, edge_key)))
+
+    def rows(self, indexes):
+        degree = {}
+        for index in indexes:
+            predicate = self.predicates[index]
+            for node_id in {predicate['source'], predicate['target']}:
+                degree[node_id] = degree.get(node_id, 0) + 1
+
+        rows = prod(self.edge_counts[index] for index in indexes)
+        for node_id, count in degree.items():
+            node = self.node_map[node_id]
+            rows *= self.stats.selectivity(node)
+            rows /= self.stats.node_count(node['type']) ** (count - 1)
+        return rows
+
+def plan_predicates(requests, node_map, stats, adjacency=None):
+    '''
+    Order the predicates of a request so that the query joins them with the
+    fewest estimated intermediate rows. The order is shared by every query
+    generator, they join the predicates in the order of the request.
+
+    How it works:
+        Each predicate after the first one shares a node with the
+        predicates before it, unless none of the remaining ones does. The
+        cost of an order is the sum of the estimated rows after each join
+        (see JoinEstimate). Orders are searched exhaustively by dynamic
+        programming over the sets of joined predicates, or greedily for
+        more than MAX_EXHAUSTIVE_PREDICATES predicates. Ties keep the order
+        of the request.
+
+    Args:
+        requests (dict): Validated request with 'nodes' and 'predicates'
+        node_map (dict): Request nodes by node_id
+        stats (CardinalityStats): Counts to estimate from
+        adjacency (SchemaAdjacency): Resolves the edge type of predicates
+            whose label is shared by several edges
+
+    Returns:
+        dict: The request with its predicates reordered
+    '''
+    predicates = requests.get('predicates') or []
+    if len(predicates) < 2:
+        return requests
+
+    estimate = JoinEstimate(predicates, node_map, stats, adjacency)
+    if len(predicates) > MAX_EXHAUSTIVE_PREDICATES:
+        order = greedy_order(predicates, estimate)
+    else:
+        order = exhaustive_order(predicates, estimate)
+
+    requests['predicates'] = [predicates[index] for index in order]
+    return requests
+
+def candidates(predicates, joined, nodes):
+    '''
+    Predicates that can be joined next, those sharing a node with the
+    joined ones or every remaining one when none does.
+    '''
+    remaining = [index for index in range(len(predicates)) if index not in joined]
+    connected = [index for index in remaining
+                 if not nodes or predicates[index]['source'] in nodes or predicates[index]['target'] in nodes]
+    return connected or remaining
+
+def exhaustive_order(predicates, estimate):
+    # best[joined] = (cost, order, nodes) of the cheapest way to join that set
+    best = {frozenset(): (0, [], frozenset())}
+    for _ in range(len(predicates)):
+        next_best = {}
+        for joined, (cost, order, nodes) in best.items():
+            for index in candidates(predicates, joined, nodes):
+                extended = joined | {index}
+                extended_cost = cost + estimate.rows(extended)
+                if extended not in next_best or extended_cost < next_best[extended][0]:
+                    predicate = predicates[index]
+                    next_best[extended] = (extended_cost, order + [index],
+                                           nodes | {predicate['source'], predicate['target']})
+        best = next_best
+    return min(best.values(), key=lambda plan: plan[0])[1]
+
+def greedy_order(predicates, estimate):
+    order = []
+    nodes = set()
+    while len(order) < len(predicates):
+        index = min(candidates(predicates, set(order), nodes),
+                    key=lambda index: estimate.rows(order + [index]))
+        order.append(index)
+        nodes.update((predicates[index]['source'], predicates[index]['target']))
+    return order
@@ -1,9 +1,8 @@
-import pandas as pd
+import json
 from pathlib import Path
+from openpyxl import Workbook
 import logging
 import re
-import zipfile
-from io import BytesIO
 import os
 
 def adjust_file_path(file_path):
@@ -25,155 +24,119 @@ def generate_file_path(file_name, user_id, extension):
 
     return file_path
 
-def convert_to_csv(response, user_id, file_name):
-    file_path = generate_file_path(file_name=file_name, user_id=user_id, extension='xls')
+NODE_BASE_COLUMNS = ['id', 'type', 'name']
+EDGE_BASE_COLUMNS = ['source', 'target', 'label', 'edge_id']
+INVALID_SHEET_CHARACTERS = re.compile(r'[\[\]:*?/\\]')
+
+def infer_columns(base_columns, schema_entry, rows):
+    '''
+    Columns of a sheet: the base columns, the properties the schema declares
+    for the label and any other key found in the rows, collected in a single
+    pass over them.
+    '''
+    columns = dict.fromkeys(base_columns)
+    if schema_entry:
+        columns.update(dict.fromkeys(schema_entry.get('properties', {}) or {}))
+
+    for row in rows:
+        for key in row:
+            if key not in columns:
+                columns[key] = None
+
+    return list(columns)
+
+def cell_value(value):
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    return json.dumps(value, default=str)
+
+def sheet_title(name, used_titles):
+    # Excel limits sheet names to 31 characters and forbids a few characters
+    title = INVALID_SHEET_CHARACTERS.sub('_', name)[:31] or 'sheet'
+    candidate, counter = title, 1
+    while candidate.lower() in used_titles:
+        suffix = f'_{counter}'
+        candidate = f'{title[:31 - len(suffix)]}{suffix}'
+        counter += 1
+    used_titles.add(candidate.lower())
+    return candidate
+
+def write_workbook(sheets, output):
+    '''
+    Writes an .xlsx workbook with a streaming, write-only worksheet writer.
+
+    How it works:
+        Each sheet is given as (name, columns, rows) where rows is an iterable
+        of dicts. Rows are appended one by one and flushed to disk by
+        openpyxl as they are written, nothing is accumulated per sheet, so
+        time and memory grow linearly with the number of rows.
+
+    Args:
+        sheets (iterable): (sheet name, list of columns, iterable of row dicts)
+        output (str | file): Destination path or binary file object
+    '''
+    workbook = Workbook(write_only=True)
+    used_titles = set()
+
+    for name, columns, rows in sheets:
+        worksheet = workbook.create_sheet(title=sheet_title(name, used_titles))
+        worksheet.append(columns)
+        for row in rows:
+            worksheet.append([cell_value(row.get(column)) for column in columns])
+
+    if not used_titles:
+        workbook.create_sheet(title='empty')
+
+    workbook.save(output)
+
+def convert_to_csv(response, user_id=None, file_name=None, file_path=None, schema=None):
+    '''
+    Writes the full data of an annotation, one sheet per node label and per
+    relationship, to an .xlsx file.
+
+    Args:
+        response (tuple): (nodes by label, edges by label) as returned by convert_to_dict
+        schema (dict): Schema representation of the species, used for the columns
+
+    Returns:
+        Path: the written file
+    '''
+    if file_path is None:
+        file_path = generate_file_path(file_name=file_name, user_id=user_id, extension='xlsx')
     # create public directory if it doesn't exit.
     os.makedirs(os.path.dirname(file_path), exist_ok=True)
-    
+
     nodes, edges = response
-    # Convert nodes and edges to DataFrames
-    # Add sheet for each node
-    # Convert to .xls file so that there is separate sheet for nodes and edges in a single file
-    try:
-        with pd.ExcelWriter(file_path) as writer:
-            for key, _ in nodes.items():
-                node = pd.json_normalize(nodes[key])
-                node.columns = [col.replace('data.', '') for col in node.columns] 
-                node.to_excel(writer, sheet_name=f'{key}', index=False)
-            for key, _ in edges.items():
-                source = edges[key][0]['data']['source'].split(' ')[0]
-                target = edges[key][0]['data']['target'].split(' ')[0]
-                edge = pd.json_normalize(edges[key])
-                edge.columns = [col.replace('data.', '') for col in edge.columns]
-                edge.to_excel(writer, sheet_name=f'{source}-relationship-{target}', index=False)
-    except Exception as e:
-        print(e)
-        os.remove(file_path)
-        logging.error(f"Error converting to Excel: {e}")
-    return file_path
+    schema = schema or {}
+    node_schema = schema.get('nodes', {})
+    edge_schema = schema.get('edges', {})
+
+    def sheets():
+        for key, values in nodes.items():
+            rows = [value['data'] for value in values]
+            columns = infer_columns(NODE_BASE_COLUMNS, node_schema.get(key), rows)
+            yield key, columns, rows
+
+        for key, values in edges.items():
+            rows = [value['data'] for value in values]
+            if len(rows) == 0:
+                continue
+            source = rows[0]['source'].split(' ')[0]
+            target = rows[0]['target'].split(' ')[0]
+            columns = infer_columns(EDGE_BASE_COLUMNS, edge_schema.get(key), rows)
+            yield f'{source}-relationship-{target}', columns, rows
 
-def convert_to_excel(response):
-    output = BytesIO()
     try:
-        nodes = response['nodes']
-        edges = response['edges']
-
-        # Build a map of node ID to name and type
-        node_map = {
-            node['data']['id']: {
-                "name": node['data']['name'],
-                "type": node['data']['type']
-            }
-            for node in nodes
-        }
-
-        # Accumulate nodes by type
-        node_type_data = {}
-        for node_data in nodes:
-            actual_data = node_data['data']
-            node_type = actual_data['type']
-
-            if node_type not in node_type_data:
-                node_type_data[node_type] = []
-
-            if 'nodes' in actual_data and isinstance(actual_data['nodes'], list):
-                df_nested = pd.json_normalize(actual_data['nodes'])
-                df_nested['id'] = actual_data['id']
-                if 'parent' in actual_data:
-                    df_nested['parent'] = actual_data['parent']
-                node_type_data[node_type].append(df_nested)
-            else:
-                df_node = pd.json_normalize(actual_data)
-                node_type_data[node_type].append(df_node)
-
-        # Accumulate edges by source-type -> target-type
-        edge_type_data = {}
-        for edge_data in edges:
-            source_type = node_map[edge_data['data']['source']]['type']
-            target_type = node_map[edge_data['data']['target']]['type']
-            relationship_type = f'{source_type}-relationship-{target_type}'
-
-            if relationship_type not in edge_type_data:
-                edge_type_data[relationship_type] = []
-
-            edge_df = pd.json_normalize(edge_data)
-            edge_df.columns = [col.replace('data.', '') for col in edge_df.columns]
-            edge_type_data[relationship_type].append(edge_df)
-
-        # Write to Excel
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            # One sheet per node type
-            for node_type, dfs in node_type_data.items():
-                combined_df = pd.concat(dfs, ignore_index=True)
-                sheet_name = node_type[:31]  # Excel sheet name limit
-                combined_df.to_excel(writer, sheet_name=sheet_name, index=False)
-
-            # One sheet per edge relationship type
-            for rel_type, dfs in edge_type_data.items():
-                combined_df = pd.concat(dfs, ignore_index=True)
-                sheet_name = rel_type[:31]  # Excel sheet name limit
-                combined_df.to_excel(writer, sheet_name=sheet_name, index=False)
-
-        output.seek(0)
-        return output
+        write_workbook(sheets(), file_path)
     except Exception as e:
+        if os.path.exists(file_path):
+            os.remove(file_path)
         logging.error(f"Error converting to Excel: {e}")
-        return None
+        raise
+    return file_path
 
 def extract_middle(words):
     words = words.split("_")
     if len(words) <= 2:
         return words[1] if len(words) == 2 else ""
     return "_".join(words[1:-1])
-
-def convert_to_tsv(new_graph):
-    output = BytesIO()
-
-    try:
-        nodes = new_graph['nodes']
-        edges = new_graph['edges']
-
-        # flatten all the nodes data, include only id, name, type
-        node_records = []
-        for node in nodes:
-            data = node.get("data", {})
-            filtered_data = {
-                "id": data.get("id"),
-                "name": data.get("name"),
-                "type": data.get("type")
-            }
-            node_records.append(filtered_data)
-
-        df_nodes = pd.json_normalize(node_records)
-
-        # flatten all the edge data
-        edge_records = []
-        for edge in edges:
-            data = edge.get("data", {})
-
-            edge_records.append({
-                "source": data.get("source"),
-                "edge": data.get("target"),
-                "label": data.get('label') or data.get('type') or ''
-            })
-
-        df_edges = pd.DataFrame(edge_records)
-
-        # Write both to a zip file containing two .tsv files
-        with zipfile.ZipFile(output, 'w', zipfile.ZIP_DEFLATED) as zipf:
-            # Write nodes.tsv
-            node_buf = BytesIO()
-            df_nodes.to_csv(node_buf, sep='\t', index=False)
-            zipf.writestr('nodes.tsv', node_buf.getvalue())
-
-            # Write edges.tsv
-            edge_buf = BytesIO()
-            df_edges.to_csv(edge_buf, sep='\t', index=False)
-            zipf.writestr('edges.tsv', edge_buf.getvalue())
-
-        output.seek(0)
-        return output
-
-    except Exception as e:
-        logging.error(f"Error converting to Excel: {e}")
-        return None
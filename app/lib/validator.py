@@ -4,7 +4,7 @@ import re
 def clean_string(s):
     return re.sub(r'[-_]', '', s)
 
-def validate_request(request, schema, source):
+def validate_request(request, adjacency, source):
     if 'nodes' not in request:
         raise Exception("node is missing")
 
@@ -90,8 +90,7 @@ def validate_request(request, schema, source):
             source_type = node_map[predicate['source']]['type']
             target_type = node_map[predicate['target']]['type']
 
-            predicate_type = f'{source_type}_{predicate_type}_{target_type}'
-            if predicate_type not in schema:
+            if adjacency.edge_key(source_type, predicate_type, target_type) is None:
                 raise Exception(
                     f"Invalid source and target for\
                     the predicate {predicate['type']}")
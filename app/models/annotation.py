@@ -25,6 +25,7 @@ class Annotation(Schema):
     data_source = None
     species = None
     path_url = None
+    result_version = None
 
     def __init__(self, **kwargs):
         self.schema = {
@@ -67,6 +68,7 @@ class Annotation(Schema):
                 "required": True
             },
             "path_url": Types.String,
+            "result_version": Types.String,
             "species": {
                 "type": Types.String,
                 "required": True,
@@ -96,5 +98,5 @@ class Annotation(Schema):
         node_count_by_label: {self.node_count_by_label},
         edge_count_by_label: {self.edge_count_by_label},
         status: {self.status}, species: {self.species}, data_source: {self.data_source}
-        path_url: {self.path_url}, created_at: {self.created_at}, updated_at: {self.updated_at}
+        path_url: {self.path_url}, result_version: {self.result_version}, created_at: {self.created_at}, updated_at: {self.updated_at}
         """
@@ -1,3 +1,5 @@
 from .annotation_storage_service import AnnotationStorageService
 from .user_storage_service import UserStorageService
 from .shared_annotation_storage_service import SharedAnnotationStorageService
+from .result_store import ResultStore, LocalResultStore, DirectoryResultStore, \
+    GridFSResultStore, S3ResultStore, create_result_store
@@ -0,0 +1,278 @@
+import logging
+import os
+import shutil
+
+class ResultStore:
+    '''
+    Durable storage of annotation results shared by every replica.
+
+    Results are addressed by key, e.g. "<annotation id>-<result version>.aqr".
+    A key always refers to the same content, so a copy fetched once can be
+    kept in the local cache directory and memory-mapped from there. Subclasses
+    implement upload, download, remote_exists and remove for their backend.
+
+    Keys that are absolute paths are result files written before the store
+    existed and are read from the local disk as they are.
+
+    Keys of the versions of one result share a prefix, "<annotation id>-"
+    for results and "export-<annotation id>-<format>-" for exports. The
+    writer of a new result deletes the previous version with delete(),
+    other replicas drop their local copies of it when they fetch a newer
+    version.
+    '''
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def local_path(self, key):
+        return os.path.join(self.cache_dir, key)
+
+    @staticmethod
+    def version_prefix(key):
+        '''
+        Part of `key` shared by every version of the same result, None for
+        keys that are not versioned. Annotation ids and formats do not
+        contain "-".
+        '''
+        parts = key.split('-', 3 if key.startswith('export-') else 1)
+        if len(parts) < 2 or '.' in parts[-2]:
+            return None
+        return '-'.join(parts[:-1]) + '-'
+
+    def prune_local(self, key):
+        '''
+        Remove the local copies of the other versions of the result `key`
+        belongs to. Files of the same version, e.g. the payload next to a
+        result file, are kept.
+        '''
+        prefix = self.version_prefix(key)
+        if prefix is None:
+            return
+
+        version = key.split('.', 1)[0]
+        for file_name in os.listdir(self.cache_dir):
+            if not file_name.startswith(prefix) or file_name.split('.', 1)[0] == version:
+                continue
+            # downloads and writes in progress are left to their owner
+            if file_name.endswith(('.download', '.tmp')):
+                continue
+            try:
+                os.remove(os.path.join(self.cache_dir, file_name))
+            except OSError:
+                pass
+
+    def put(self, key, file_path):
+        '''
+        Store the file at `file_path` under `key`. The file becomes the
+        local cached copy of the key.
+        '''
+        self.upload(key, file_path)
+        local_path = self.local_path(key)
+        if os.path.abspath(file_path) != os.path.abspath(local_path):
+            os.replace(file_path, local_path)
+        return key
+
+    def delete(self, key):
+        '''
+        Delete `key` from the backend and the local cache.
+        '''
+        if not key:
+            return
+
+        path = key if os.path.isabs(key) else self.local_path(key)
+        if os.path.exists(path):
+            os.remove(path)
+
+        if not os.path.isabs(key):
+            self.remove(key)
+
+    def fetch(self, key):
+        '''
+        Returns a local path holding the content of `key`, downloading it
+        if this replica has no copy yet. None if the key is not stored.
+        '''
+        if not key:
+            return None
+
+        if os.path.isabs(key):
+            return key if os.path.exists(key) else None
+
+        local_path = self.local_path(key)
+        if os.path.exists(local_path):
+            return local_path
+
+        tmp_path = f'{local_path}.{os.getpid()}.download'
+        try:
+            if not self.download(key, tmp_path):
+                return None
+            os.replace(tmp_path, local_path)
+            self.prune_local(key)
+            return local_path
+        except Exception as e:
+            logging.error(f"Error fetching result {key}: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return None
+
+    def exists(self, key):
+        if not key:
+            return False
+        if os.path.isabs(key):
+            return os.path.exists(key)
+        return os.path.exists(self.local_path(key)) or self.remote_exists(key)
+
+    def upload(self, key, file_path):
+        raise NotImplementedError
+
+    def download(self, key, file_path):
+        raise NotImplementedError
+
+    def remote_exists(self, key):
+        raise NotImplementedError
+
+    def remove(self, key):
+        raise NotImplementedError
+
+class LocalResultStore(ResultStore):
+    '''
+    Results on the local disk of the replica, for single instance deployments.
+    '''
+    def upload(self, key, file_path):
+        pass
+
+    def download(self, key, file_path):
+        return False
+
+    def remote_exists(self, key):
+        return False
+
+    def remove(self, key):
+        pass
+
+class DirectoryResultStore(ResultStore):
+    '''
+    A directory standing in for a shared backend, e.g. in tests or on a
+    volume mounted by every replica.
+    '''
+    def __init__(self, cache_dir, directory):
+        super().__init__(cache_dir)
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def upload(self, key, file_path):
+        tmp_path = os.path.join(self.directory, f'{key}.{os.getpid()}.tmp')
+        shutil.copyfile(file_path, tmp_path)
+        os.replace(tmp_path, os.path.join(self.directory, key))
+
+    def download(self, key, file_path):
+        source = os.path.join(self.directory, key)
+        if not os.path.exists(source):
+            return False
+        shutil.copyfile(source, file_path)
+        return True
+
+    def remote_exists(self, key):
+        return os.path.exists(os.path.join(self.directory, key))
+
+    def remove(self, key):
+        path = os.path.join(self.directory, key)
+        if os.path.exists(path):
+            os.remove(path)
+
+class GridFSResultStore(ResultStore):
+    '''
+    Results stored in a GridFS bucket of the application's MongoDB.
+    '''
+    def __init__(self, cache_dir, database, bucket_name='results'):
+        super().__init__(cache_dir)
+        import gridfs
+        self.bucket = gridfs.GridFSBucket(database, bucket_name=bucket_name)
+
+    def upload(self, key, file_path):
+        with open(file_path, 'rb') as file:
+            self.bucket.upload_from_stream(key, file)
+
+    def download(self, key, file_path):
+        import gridfs
+        try:
+            with open(file_path, 'wb') as file:
+                self.bucket.download_to_stream_by_name(key, file)
+            return True
+        except gridfs.errors.NoFile:
+            os.remove(file_path)
+            return False
+
+    def remote_exists(self, key):
+        return next(self.bucket.find({'filename': key}).limit(1), None) is not None
+
+    def remove(self, key):
+        for file in self.bucket.find({'filename': key}):
+            self.bucket.delete(file._id)
+
+class S3ResultStore(ResultStore):
+    '''
+    Results stored in an S3 compatible bucket (AWS S3, MinIO, ...).
+    '''
+    def __init__(self, cache_dir, bucket, prefix='', endpoint_url=None):
+        super().__init__(cache_dir)
+        import boto3
+        self.client = boto3.client('s3', endpoint_url=endpoint_url)
+        self.bucket = bucket
+        self.prefix = prefix
+
+    def object_key(self, key):
+        return f'{self.prefix}{key}'
+
+    def upload(self, key, file_path):
+        self.client.upload_file(file_path, self.bucket, self.object_key(key))
+
+    def download(self, key, file_path):
+        from botocore.exceptions import ClientError
+        try:
+            self.client.download_file(self.bucket, self.object_key(key), file_path)
+            return True
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey'):
+                return False
+            raise
+
+    def remote_exists(self, key):
+        from botocore.exceptions import ClientError
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self.object_key(key))
+            return True
+        except ClientError:
+            return False
+
+    def remove(self, key):
+        self.client.delete_object(Bucket=self.bucket, Key=self.object_key(key))
+
+def create_result_store(store_type, cache_dir):
+    '''
+    Build the result store configured by RESULT_STORE
+    (local, directory, gridfs or s3) and its RESULT_STORE_* settings.
+    '''
+    if store_type == 'local':
+        return LocalResultStore(cache_dir)
+
+    if store_type == 'directory':
+        directory = os.getenv('RESULT_STORE_DIR')
+        if not directory:
+            raise ValueError("RESULT_STORE=directory requires RESULT_STORE_DIR, "
+                             "the directory shared by every replica")
+        return DirectoryResultStore(cache_dir, directory)
+
+    if store_type == 'gridfs':
+        from pymongo import MongoClient
+        client = MongoClient(os.getenv('MONGO_URI'))
+        return GridFSResultStore(cache_dir, client.test,
+                                 os.getenv('RESULT_STORE_BUCKET', 'results'))
+
+    if store_type == 's3':
+        if not os.getenv('RESULT_STORE_BUCKET'):
+            raise ValueError("RESULT_STORE=s3 requires RESULT_STORE_BUCKET")
+        return S3ResultStore(cache_dir, os.getenv('RESULT_STORE_BUCKET'),
+                             os.getenv('RESULT_STORE_PREFIX', ''),
+                             os.getenv('RESULT_STORE_ENDPOINT'))
+
+    raise ValueError(f"Unknown result store {store_type}")
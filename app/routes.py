@@ -1,31 +1,38 @@
 from flask import copy_current_request_context, request, jsonify, \
-    Response, send_from_directory, send_file, after_this_request
+    Response, send_from_directory, send_file, after_this_request, stream_with_context
 import logging
 import json
 import os
 import threading
 import jwt
 from pathlib import Path
-from app import app, schema_manager, db_instance, socketio, redis_client
+from app import app, schema_manager, db_instance, socketio, redis_client, result_store, graph_cache, \
+    ontology_index, relation_index, graph_stats
 from app.lib import validate_request
 from flask_cors import CORS
 from flask_socketio import disconnect, join_room, send
-# from app.lib import limit_graph
+from app.lib import limit_graph, get_query_anchors
 from app.lib.auth import token_required, socket_token_required
 from app.lib.email import init_mail, send_email
 from app.lib.utils import convert_to_csv
 from dotenv import load_dotenv
 from distutils.util import strtobool
 import datetime
-from app.lib import Graph, heuristic_sort
-from app.annotation_controller import handle_client_request, process_full_data, requery
-from app.constants import TaskStatus, Species, form_fieldsm, ROLES
-from app.workers.task_handler import get_annotation_redis
+from app.lib import Graph, plan_predicates, CardinalityStats
+from app.annotation_controller import handle_client_request, requery
+from app.workers.export_jobs import export_jobs, EXPORT_FORMATS, normalize_format
+from app.services.result_file import ResultFile
+from app.services.graph_payload import payload_key, read_payload, iter_file, splice, iter_spliced
+from app.serialization import init_serialization, json_response, dumps, negotiate_format, \
+    negotiated_response, make_etag, not_modified, not_modified_response, cached_response, \
+    PUBLIC_CACHE, PRIVATE_CACHE
+from app.constants import TaskStatus, Species, form_fieldsm, ROLES, EXPORT_WAIT_TIMEOUT
+from app.workers.task_handler import get_annotation_redis, reset_task, remove_result
+from app.workers.graph_delivery import push_graph, graph_room, delivery_formats
 from app.persistence import AnnotationStorageService, UserStorageService, SharedAnnotationStorageService
 from nanoid import generate
-from app.lib.utils import convert_to_tsv
+from app.lib.export import stream_tsv_zip, stream_columnar_zip, COLUMNAR_FORMATS
 import traceback
-from app.lib import convert_to_excel
 from pathlib import Path
 
 # Load environmental variables
@@ -54,42 +61,54 @@ EXP = os.getenv('REDIS_EXPIRATION', 3600) # expiration time of redis cache
 # Initialize Flask-Mail
 init_mail(app)
 
+# orjson for every JSON response, compressed when the client accepts it
+init_serialization(app)
+
 CORS(app)
 
 @app.route('/kg-info', methods=['GET'])
 @token_required
 def get_graph_info(current_user_id):
-    graph_info = json.dumps(schema_manager.graph_info, indent=4)
-    return Response(graph_info, mimetype='application/json')
+    user = UserStorageService.get(current_user_id)
+    species = user.species if user else 'human'
+    etag = make_etag(graph_stats.version, 'kg-info', species)
+    if not_modified(etag):
+        return not_modified_response(etag, PRIVATE_CACHE)
+    return cached_response(json_response(graph_stats.kg_info(species)), etag, PRIVATE_CACHE)
+
+@app.route('/graph-cache/stats', methods=['GET'])
+@token_required
+def get_graph_cache_stats(current_user_id):
+    return json_response(graph_cache.stats())
 
 @app.route('/nodes', methods=['GET'])
 @token_required
 def get_nodes_endpoint(current_user_id):
     user = UserStorageService.get(current_user_id)
     species = user.species if user else 'human'
+    etag = make_etag(schema_manager.version, 'nodes', species)
+    if not_modified(etag):
+        return not_modified_response(etag, PRIVATE_CACHE)
     nodes = schema_manager.get_nodes()
-    nodes = nodes[species]
-    nodes = json.dumps(nodes, indent=4)
-    return Response(nodes, mimetype='application/json')
+    return cached_response(json_response(nodes[species]), etag, PRIVATE_CACHE)
 
 @app.route('/edges', methods=['GET'])
 @token_required
 def get_edges_endpoint(current_user_id):
     user = UserStorageService.get(current_user_id)
     species = user.species if user else 'human'
+    etag = make_etag(schema_manager.version, 'edges', species)
+    if not_modified(etag):
+        return not_modified_response(etag, PRIVATE_CACHE)
     edges = schema_manager.get_edges()
-    edges = edges[species]
-    edges = json.dumps(edges, indent=4)
-    return Response(edges, mimetype='application/json')
+    return cached_response(json_response(edges[species]), etag, PRIVATE_CACHE)
 
 @app.route('/relations/<node_label>', methods=['GET'])
 @token_required
 def get_relations_for_node_endpoint(current_user_id, node_label):
     user = UserStorageService.get(current_user_id)
     species = user.species if user else 'human'
-    relations = json.dumps(
-        schema_manager.get_relations_for_node(node_label, species), indent=4)
-    return Response(relations, mimetype='application/json')
+    return json_response(schema_manager.get_relations_for_node(node_label, species))
 
 def get_schema_list():
     schema_list = schema_manager.schema_list
@@ -97,140 +116,19 @@ def get_schema_list():
 
     return response
 
-def schema_by_source(species, query_string):
-    try:
-        response = {'schema': {'nodes': [], 'edges': []}}
-
-        if species == 'human':
-            schema = schema_manager.schmea_representation
-        else:
-            schema = schema_manager.fly_schema_represetnation
-        if query_string == 'all' and species == 'fly':
-            for key, value in schema['nodes'].items():
-                response['schema']['nodes'].append({
-                    'data': {
-                    'name': value['label'],
-                    'properites':[property for property in value['properties'].keys()]
-                    }
-                })
-
-            for key, value in schema['edges'].items():
-                is_new = True
-                for ed in response['schema']['edges']:
-                    if value['source'] == ed['data']['source'] and value['target'] == ed['data']['target']:
-                        is_new = False
-                        ed['data']['possible_connection'].append( value.get('input_label') or value.get('output_label') or 'unknown')
-                if is_new:
-                    response['schema']['edges'].extend(flatten_edges(value))
-            return response
-
-        for schema_type in query_string:
-            source = schema_type.upper()
-            sub_schema = schema.get(source, None)
-
-            if sub_schema is None:
-                continue
-
-            for _, values in sub_schema['edges'].items():
-                edge_key = values.get('input_label') or values.get('output_label')
-                edge = sub_schema['edges'][edge_key]
-                edge_data = { 'data': {
-                    "possible_connection": [edge.get('output_label') or edge.get('input_label')],
-                    "source": edge.get('source'),
-                    "target": edge.get('target')
-                }}
-                response['schema']['edges'].append(edge_data)
-                node_to_add_src = schema[source]['nodes'][edge['source']]
-                node_label_src = node_to_add_src['label']
-                if not node_exists(response, node_label_src):
-                    response['schema']['nodes'].append({
-                        'data': {
-                            'name': node_to_add_src['label'],
-                            'properites':[property for property in node_to_add_src['properties'].keys()]
-                        }
-                    })
-
-                node_to_add_trgt = schema[source]['nodes'][edge['target']]
-                node_label_trgt = node_to_add_trgt['label']
-                if not node_exists(response, node_label_trgt):
-                    response['schema']['nodes'].append({
-                                    'data': {
-                                        'name': node_to_add_trgt['label'],
-                                        'properites':[property for property in node_to_add_trgt['properties'].keys()]
-                                    }
-                                })
-
-            if len(response['schema']['edges']) == 0:
-                for node in sub_schema['nodes']:
-                    response['schema']['nodes'].append({
-                        'data': {
-                            'name': schema[source]['nodes'][node]['label'],
-                            'properties': [property for property in schema[source]['nodes'][node]['properties'].keys()]
-                        }
-                    })
-                    response['schema']['nodes'].append(schema[source]['nodes'][node])
-
-        return response
-    except Exception as e:
-        logging.error(f"Error fetching schema: {e}", exc_info=True)
-        return []
-
-def node_exists(response, name):
-    name = name.strip().lower()
-    return any(n['data']['name'].strip().lower() == name for n in response['schema']['nodes'])
-
-def flatten_edges(value):
-    sources = value['source'] if isinstance(value['source'], list) else [value['source']]
-    targets = value['target'] if isinstance(value['target'], list) else [value['target']]
-    label = value.get('input_label') or value.get('output_label') or 'unknown'
-
-    return [
-        {'data': {
-            'source': src,
-            'target': tgt,
-            'possible_connection': [label]
-            }
-        for src in sources
-        for tgt in targets
-        }
-    ]
-
 @app.route('/preference-option', methods=['GET'])
 @token_required
 def get_preference_option(current_user_id):
     try:
-        response = {
-            'species': [specie.value for specie in Species ],
-            'sources': {
-                'human': [],
-                'fly': []
-            }
-        }
+        body, etag = schema_manager.responses.preference_option()
+        if not_modified(etag):
+            return not_modified_response(etag, PRIVATE_CACHE)
 
-        schema_list = get_schema_list()
-
-        for source in schema_list:
-            if source['id'] not in ['polyphen-2', 'bgee']:
-                sch = schema_by_source('human', [source['name']])
-                data = {
-                    'id': source['id'],
-                    'name': source['name'],
-                    'url': source['url'],
-                    'schema': sch['schema']
-                }
-                response['sources']['human'].append(data)
-        schema_fly = schema_by_source('fly', 'all')
-        data = {
-            'id': 'flyall',
-            'name': 'all',
-            'schema': schema_fly
-        }
-        response['sources']['fly'].append(data)
         logging.info(json.dumps({
             "status": "success", "method": "GET",
             "timestamp": datetime.datetime.now().isoformat(),
         }))
-        return Response(json.dumps(response, indent=4), mimetype='application/json')
+        return cached_response(Response(body, mimetype='application/json'), etag, PRIVATE_CACHE)
     except Exception as e:
         logging.error(json.dumps({"status": "error", "method": "GET",
                                   "timestamp":  datetime.datetime.now().isoformat(),
@@ -241,9 +139,7 @@ def get_preference_option(current_user_id):
         "message": "An internal server error occurred. Please try again later.",
         "timestamp": datetime.datetime.now().isoformat()
         }
-        return Response(json.dumps(error_response, indent=4),
-                    mimetype='application/json',
-                    status=500)
+        return json_response(error_response, status=500)
 
 @app.route('/schema', methods=['GET'])
 def get_schema_by_data_source():
@@ -254,44 +150,15 @@ def get_schema_by_data_source():
         if len(data_source) == 1 and data_source[0] == 'flyall':
             data_source = 'all'
 
-        print(data_source)
-        schemas = schema_by_source(species, data_source)
-
-        response = {'nodes': [], 'edges': []}
-
-        nodes = schemas['schema']['nodes']
-        edges = schemas['schema']['edges']
-
-        for node in nodes:
-            label = node['data']['name']
-
-            if label in form_fields:
-                node_data = form_fields[label]
-            else:
-                node_data = []
-
-            response['nodes'].append({
-                'id': label,
-                'name': label,
-                'inputs': node_data
-            })
+        # the schema is public, the reverse proxy can answer repeats
+        body, etag = schema_manager.responses.schema(species, data_source)
+        if not_modified(etag):
+            return not_modified_response(etag, PUBLIC_CACHE)
 
-        for edge in edges:
-            source = edge['data']['source']
-            target = edge['data']['target']
-            possible_connections = edge['data']['possible_connection']
-            for possible_connection in possible_connections:
-                response['edges'].append({
-                    'id': generate(),
-                    'source': source,
-                    'target': target,
-                    'label': possible_connection
-                })
-        
         logging.info(json.dumps({"status": "success", "method": "GET",
                                   "timestamp":  datetime.datetime.now().isoformat(),
                                   "endpoint": "/schema"}))
-        return Response(json.dumps(response, indent=4), mimetype='application/json')
+        return cached_response(Response(body, mimetype='application/json'), etag, PUBLIC_CACHE)
     except Exception as e:
         logging.error(json.dumps({"status": "error", "method": "GET",
                                   "timestamp":  datetime.datetime.now().isoformat(),
@@ -302,9 +169,7 @@ def get_schema_by_data_source():
         "message": "An internal server error occurred. Please try again later.",
         "timestamp": datetime.datetime.now().isoformat()
         }
-    return Response(json.dumps(error_response, indent=4),
-                    mimetype='application/json',
-                    status=500)
+    return json_response(error_response, status=500)
 
 @socketio.on('connect')
 # @socket_token_required
@@ -328,14 +193,50 @@ def on_join(data):
 
     if cache != None:
         status = cache['status']
-        graph = cache['graph']
-        graph_status = True if graph is not None else False
+        graph_status = cache['graph'] is not None
+        socketio.emit('update', {'status': status, 'update': {'graph': graph_status}}, to=str(room))
+
+@socketio.on('subscribe_graph')
+@socket_token_required
+def on_subscribe_graph(current_user_id, data):
+    '''
+    Opt in to receive the final graph of an annotation as binary 'graph'
+    frames, in 'json' or 'msgpack' format, instead of requesting it once the
+    'update' event reports it. A graph that is stored already is sent to the
+    subscribing client right away, the annotation may still be pending on
+    its counts or summary.
+    '''
+    annotation_id = data['room']
+    wire_format = data.get('format', 'json')
+
+    if wire_format not in delivery_formats():
+        return {'error': f"Unsupported format, expected one of {delivery_formats()}"}
+
+    owner_id = resolve_annotation_user(current_user_id, annotation_id, data.get('token'))
+    cursor = AnnotationStorageService.get_user_annotation(annotation_id, owner_id) \
+        if owner_id is not None else None
 
-        if status == TaskStatus.COMPLETE.value:
-            socketio.emit('update', {'status': status, 'update': {'graph': graph_status}},
-                  to=str(room))
-        else:
-            socketio.emit('update', {'status': status, 'update': {'graph': graph_status}}, to=str(room))
+    if cursor is None:
+        return {'error': 'unauthorized'}
+
+    join_room(graph_room(annotation_id, wire_format))
+    logging.info(f"user subscribed to the {wire_format} graph of {annotation_id}")
+
+    # the result written by a run that is still going is named in redis
+    # before the annotation is updated, a run that has not written its
+    # result yet pushes it to the room once it is stored
+    cache = get_annotation_redis(annotation_id)
+    if cache is not None and cache['status'] == TaskStatus.PENDING.value and not cache.get('result_key'):
+        result_key = None
+    else:
+        result_key = (cache or {}).get('result_key') or cursor.path_url
+
+    if result_key:
+        graph = graph_cache.get(cursor.id, result_key)
+        if graph is not None:
+            push_graph(cursor.id, graph, result_key, to=request.sid, formats=[wire_format])
+
+    return {'status': 'subscribed'}
 
 @app.route('/query', methods=['POST'])  # type: ignore
 @token_required
@@ -410,7 +311,7 @@ def process_query(current_user_id):
         user = UserStorageService.get(current_user_id)
         data_source = user.data_source if user else 'all'
         species = user.species if user else 'human'
-        node_map = validate_request(requests, schema_manager.schema[species], source)
+        node_map = validate_request(requests, schema_manager.adjacency[species], source)
         if node_map is None:
             return jsonify(
                 {"error": "Invalid node_map returned by validate_request"}
@@ -419,8 +320,9 @@ def process_query(current_user_id):
         # convert id to appropriate format
         requests = db_instance.parse_id(requests)
 
-        # sort the predicate based on the the edge count
-        requests = heuristic_sort(requests, node_map)
+        # order the predicates by the estimated size of their joins
+        stats = CardinalityStats.from_species_stats(graph_stats.species(species))
+        requests = plan_predicates(requests, node_map, stats, schema_manager.adjacency[species])
 
         node_only = True if source == 'hypothesis' else False
 
@@ -456,8 +358,7 @@ def process_query(current_user_id):
 
         if source == 'hypothesis':
             response = {"nodes": result_graph['nodes']}
-            formatted_response = json.dumps(response, indent=4)
-            return Response(formatted_response, mimetype='application/json')
+            return json_response(response)
 
         total_count = db_instance.run_query(total_count_query)
         count_by_label = db_instance.run_query(count_by_label_query)
@@ -500,17 +401,15 @@ def process_query(current_user_id):
                       }
 
         annotation_id = AnnotationStorageService.save(annotation)
-        redis_client.setex(str(annotation_id), EXP, json.dumps({'task': 4,
+        redis_client.setex(str(annotation_id), EXP, dumps({'task': 4,
                                 'graph': {'nodes': response['nodes'], 'edges': response['edges']}}))
         response = {"annotation_id": str(
             annotation_id), "question": question, "answer": answer}
-        formatted_response = json.dumps(response, indent=4)
-        
         logging.info(json.dumps({"status": "success", "method": "POST",
                                   "timestamp":  datetime.datetime.now().isoformat(),
                                   "endpoint": "/query"}))
     
-        return Response(formatted_response, mimetype='application/json')
+        return json_response(response)
     except Exception as e:
         logging.error(json.dumps({"status": "error", "method": "POST",
                                   "timestamp":  datetime.datetime.now().isoformat(),
@@ -522,9 +421,7 @@ def process_query(current_user_id):
         "timestamp": datetime.datetime.now().isoformat()
         }
 
-        return Response(json.dumps(error_response, indent=4),
-                    mimetype='application/json',
-                    status=500)
+        return json_response(error_response, status=500)
 
 
 @app.route('/email-query/<id>', methods=['POST'])
@@ -534,25 +431,27 @@ def process_email_query(current_user_id, id):
     if 'email' not in data:
         return jsonify({"error": "Email missing"}), 400
 
+    annotation = AnnotationStorageService.get_by_id(id)
 
-    @copy_current_request_context
-    def send_full_data():
-        try:
-            email = data['email']
+    if annotation is None:
+        return jsonify('No value Found'), 404
+
+    email = data['email']
 
-            link = process_full_data(
-                current_user_id=current_user_id, annotation_id=id)
+    def send_full_data(job):
+        if job.status != TaskStatus.COMPLETE.value:
+            logging.error(f"Full data export of {id} failed, no email sent to {email}")
+            return
 
-            subject = 'Full Data'
-            body = f'Hello {email}. click this link {link}\
-            to download the full data you requested.'
+        subject = 'Full Data'
+        body = f'Hello {email}. click this link {job.link}\
+        to download the full data you requested.'
 
-            send_email(subject, [email], body)
-        except Exception as e:
-            logging.error(f"Error processing query: {e}", exc_info=True)
+        send_email(subject, [email], body)
 
-    sender = threading.Thread(name='main_sender', target=send_full_data)
-    sender.start()
+    # the export runs on the shared export pool, repeated requests for the
+    # same result attach to the running job instead of starting another one
+    export_jobs.submit(id, annotation, 'xlsx', request.host_url, on_complete=send_full_data)
     return jsonify({'message': 'Email sent successfully'}), 200
 
 @app.route('/history', methods=['GET'])
@@ -597,8 +496,7 @@ def process_user_history(current_user_id):
                           "timestamp":  datetime.datetime.now().isoformat(),
                           "endpoint": "/history"}))
                 
-        return Response(json.dumps(return_value, indent=4),
-                        mimetype='application/json')
+        return json_response(return_value)
     except Exception as e:
         logging.error(json.dumps({"status": "error", "method": "GET",
                                   "timestamp":  datetime.datetime.now().isoformat(),
@@ -610,14 +508,13 @@ def process_user_history(current_user_id):
         "timestamp": datetime.datetime.now().isoformat()
         }
 
-        return Response(json.dumps(error_response, indent=4),
-                    mimetype='application/json',
-                    status=500)
+        return json_response(error_response, status=500)
 
-@app.route('/annotation/<id>', methods=['GET'])
-@token_required
-def get_by_id(current_user_id, id):
-    token = request.args.get('token', None)
+def resolve_annotation_user(current_user_id, annotation_id, token=None):
+    '''
+    Resolve the user an annotation should be read as, following share tokens
+    and shared annotations. Returns None if the user has no access to it.
+    '''
     try:
         if token:
             SHARED_TOKEN_SECRET = os.getenv('SHARED_TOKEN_SECRET')
@@ -626,37 +523,51 @@ def get_by_id(current_user_id, id):
 
             shared_resource = SharedAnnotationStorageService.get({
                 'user_id': current_user_id,
-                'annotation_id': id
+                'annotation_id': annotation_id
             })
 
             if shared_resource is None:
-                return jsonify({'error': 'unauthorized'}), 401
+                return None
     except Exception as e:
-        return jsonify({'error': 'unauthorized'}), 401
-    
-    existing_annotation = AnnotationStorageService.get_by_id(id)
-    
+        return None
+
+    existing_annotation = AnnotationStorageService.get_by_id(annotation_id)
+
+    if existing_annotation is None:
+        return None
+
     owner_id = existing_annotation.user_id
-    
-    # check if its shared 
+
+    # check if its shared
     shared_annotation = SharedAnnotationStorageService.get({
         'user_id': owner_id,
-        'annotation_id': id
+        'annotation_id': annotation_id
     })
-    
+
     if shared_annotation is None:
         if str(owner_id) != str(current_user_id):
-            return jsonify({'error': 'unauthorized'}), 401
+            return None
     else:
         share_type = shared_annotation.share_type
         recipient_user_id = shared_annotation.recipient_user_id
-        
+
         if share_type != 'public':
             if str(recipient_user_id) != str(current_user_id):
-                return jsonify({'error': 'unauthorized'}), 401
-            
+                return None
+
         current_user_id = owner_id
 
+    return current_user_id
+
+@app.route('/annotation/<id>', methods=['GET'])
+@token_required
+def get_by_id(current_user_id, id):
+    token = request.args.get('token', None)
+    current_user_id = resolve_annotation_user(current_user_id, id, token)
+
+    if current_user_id is None:
+        return jsonify({'error': 'unauthorized'}), 401
+
 
     response_data = {}
     cursor = AnnotationStorageService.get_user_annotation(id, current_user_id)
@@ -666,6 +577,8 @@ def get_by_id(current_user_id, id):
 
     limit = request.args.get('limit')
     properties = request.args.get('properties')
+    # return only group counts and a few sample members per group
+    skeleton = request.args.get('skeleton')
 
     # can be either hypothesis or ai_assistant
     source = request.args.get('source')
@@ -675,6 +588,8 @@ def get_by_id(current_user_id, id):
     else:
         properties = False
 
+    skeleton = bool(strtobool(skeleton)) if skeleton else False
+
     if limit:
         try:
             limit = int(limit)
@@ -695,7 +610,7 @@ def get_by_id(current_user_id, id):
     node_count_by_label = cursor.node_count_by_label
     edge_count_by_label = cursor.edge_count_by_label
     status = cursor.status
-    file_path = cursor.path_url
+    result_key = cursor.path_url
     species = cursor.species
     source = cursor.data_source
 
@@ -706,6 +621,13 @@ def get_by_id(current_user_id, id):
         node_types.add(node["type"])
     node_types = list(node_types)
 
+    def shape_graph(graph):
+        if limit:
+            graph = limit_graph(graph, limit, get_query_anchors(json_request))
+        if skeleton:
+            graph = Graph().to_skeleton(graph)
+        return graph
+
     try:
         if question:
             response_data["question"] = question
@@ -716,8 +638,7 @@ def get_by_id(current_user_id, id):
         if source == 'ai-assistant':
             response = {"annotation_id": str(
                 annotation_id), "question": question, "answer": answer}
-            formatted_response = json.dumps(response, indent=4)
-            return Response(formatted_response, mimetype='application/json')
+            return json_response(response)
 
         response_data["annotation_id"] = str(annotation_id)
         response_data["request"] = json_request
@@ -740,31 +661,53 @@ def get_by_id(current_user_id, id):
             response_data["edge_count_by_label"] = edge_count_by_label
         response_data["status"] = status
 
-        cache = redis_client.get(str(annotation_id))
-
-        if cache is not None:
-            cache = json.loads(cache)
-            graph = cache['graph']
-            if graph is not None:
-                response_data['nodes'] = graph['nodes']
-                response_data['edges'] = graph['edges']
-
-            return Response(json.dumps(response_data, indent=4), mimetype='application/json')
+        # json, or the compact msgpack format when the client asks for it
+        wire_format = negotiate_format()
+
+        # a complete result only changes with its result version, its
+        # metadata or the way it is shared and requested
+        etag = None
+        if status == TaskStatus.COMPLETE.value and result_key:
+            etag = make_etag('annotation', result_key, dumps(response_data), current_user_id,
+                             bool(token), wire_format, limit, skeleton)
+            if not_modified(etag):
+                return not_modified_response(etag, PRIVATE_CACHE)
+
+        # a complete result is sent as it was serialized when it was stored,
+        # only the metadata around it is encoded per request
+        if wire_format == 'json' and etag and not limit and not skeleton:
+            payload_path = result_store.fetch(payload_key(result_key))
+            if payload_path is not None:
+                # gzip clients get the stored gzip members as they are
+                stream = iter_spliced(response_data, payload_path) \
+                    if 'gzip' in request.accept_encodings else None
+                if stream is not None:
+                    response = Response(stream, mimetype='application/json',
+                                        headers={'Content-Encoding': 'gzip',
+                                                 'Vary': 'Accept, Accept-Encoding'})
+                    return cached_response(response, f'{etag}-gzip', PRIVATE_CACHE)
+
+                response = Response(splice(response_data, read_payload(payload_path)),
+                                    mimetype='application/json')
+                return cached_response(response, etag, PRIVATE_CACHE)
+
+        graph = graph_cache.get(annotation_id, result_key)
+
+        if graph is not None:
+            graph = shape_graph(graph)
+            response_data['nodes'] = graph['nodes']
+            response_data['edges'] = graph['edges']
+
+            response = negotiated_response(response_data, wire_format)
+            return cached_response(response, etag, PRIVATE_CACHE) if etag else response
 
         if status in [TaskStatus.PENDING.value, TaskStatus.COMPLETE.value]:
             if status == TaskStatus.COMPLETE.value:
-                if os.path.exists(file_path):
-                    # open the file and read the graph
-                    with open(file_path, 'r') as file:
-                        graph = json.load(file)
-
-                    response_data['nodes'] = graph['nodes']
-                    response_data['edges'] = graph['edges']
-                else:
-                    response_data['status'] = TaskStatus.PENDING.value
-                    requery(annotation_id, query, json_request)
-            formatted_response = json.dumps(response_data, indent=4)
-            return Response(formatted_response, mimetype='application/json')
+                # the query only runs again when the result is missing
+                # from every tier of the graph cache
+                response_data['status'] = TaskStatus.PENDING.value
+                requery(annotation_id, query, json_request)
+            return negotiated_response(response_data, wire_format)
 
         # Run the query and parse the results
         result = db_instance.run_query(query)
@@ -777,6 +720,7 @@ def get_by_id(current_user_id, id):
             grouped_graph = graph.group_node_only(response_data, json_request)
         else:
             grouped_graph = graph.group_graph(response_data)
+        grouped_graph = shape_graph(grouped_graph)
         response_data['nodes'] = grouped_graph['nodes']
         response_data['edges'] = grouped_graph['edges']
 
@@ -785,16 +729,12 @@ def get_by_id(current_user_id, id):
                 "nodes": response_data['nodes'],
                 "edges": response_data['edges']
             }
-            formatted_response = json.dumps(response, indent=4)
-            return Response(formatted_response, mimetype='application/json')
-        # if limit:
-        # response_data = limit_graph(response_data, limit)
+            return json_response(response)
 
         logging.info(json.dumps({"status": "success", "method": "GET",
                                   "timestamp":  datetime.datetime.now().isoformat(),
                                   "endpoint": "/annotation/<id>"}))
-        formatted_response = json.dumps(response_data, indent=4)
-        return Response(formatted_response, mimetype='application/json')
+        return negotiated_response(response_data, wire_format)
     except Exception as e:
         logging.error(json.dumps({"status": "error", "method": "GET",
                                   "timestamp":  datetime.datetime.now().isoformat(),
@@ -806,9 +746,127 @@ def get_by_id(current_user_id, id):
         "timestamp": datetime.datetime.now().isoformat()
         }
 
-        return Response(json.dumps(error_response, indent=4),
-                    mimetype='application/json',
-                    status=500)
+        return json_response(error_response, status=500)
+
+@app.route('/annotation/<id>/graph', methods=['GET'])
+@token_required
+def get_annotation_graph(current_user_id, id):
+    '''
+    The nodes and edges of a complete annotation, streamed from the stored
+    gzip payload. Clients accepting gzip receive the stored bytes as they are,
+    clients asking for application/x-msgpack the compact format.
+    '''
+    token = request.args.get('token', None)
+    current_user_id = resolve_annotation_user(current_user_id, id, token)
+
+    if current_user_id is None:
+        return jsonify({'error': 'unauthorized'}), 401
+
+    cursor = AnnotationStorageService.get_user_annotation(id, current_user_id)
+
+    if cursor is None or not cursor.path_url:
+        return jsonify('No value Found'), 404
+
+    try:
+        wire_format = negotiate_format()
+        payload_path = result_store.fetch(payload_key(cursor.path_url)) \
+            if wire_format == 'json' else None
+
+        if payload_path is None:
+            # the compact format, or results stored before payloads were written
+            graph = graph_cache.get(cursor.id, cursor.path_url)
+            if graph is None:
+                return jsonify('No value Found'), 404
+            return negotiated_response({'nodes': graph['nodes'], 'edges': graph['edges']},
+                                       wire_format)
+
+        gzip_accepted = 'gzip' in request.accept_encodings
+        headers = {'Vary': 'Accept, Accept-Encoding'}
+        if gzip_accepted:
+            headers['Content-Encoding'] = 'gzip'
+            headers['Content-Length'] = str(os.path.getsize(payload_path))
+
+        logging.info(json.dumps({"status": "success", "method": "GET",
+                                  "timestamp":  datetime.datetime.now().isoformat(),
+                                  "endpoint": "/annotation/<id>/graph"}))
+
+        return Response(iter_file(payload_path, decompress=not gzip_accepted),
+                        mimetype='application/json', headers=headers)
+    except Exception as e:
+        logging.error(json.dumps({"status": "error", "method": "GET",
+                                  "timestamp":  datetime.datetime.now().isoformat(),
+                                  "endpoint": "/annotation/<id>/graph",
+                                  "exception": str(e)}), exc_info=True)
+        error_response = {
+        "status": "error",
+        "message": "An internal server error occurred. Please try again later.",
+        "timestamp": datetime.datetime.now().isoformat()
+        }
+
+        return json_response(error_response, status=500)
+
+@app.route('/annotation/<id>/group/<group_id>', methods=['GET'])
+@token_required
+def get_group_members(current_user_id, id, group_id):
+    token = request.args.get('token', None)
+    current_user_id = resolve_annotation_user(current_user_id, id, token)
+
+    if current_user_id is None:
+        return jsonify({'error': 'unauthorized'}), 401
+
+    try:
+        offset = int(request.args.get('offset', 0))
+        limit = int(request.args.get('limit', 100))
+    except ValueError:
+        return jsonify(
+            {"error": "Invalid offset or limit value. They should be integers."}
+        ), 400
+
+    if offset < 0 or limit <= 0:
+        return jsonify({"error": "Offset must be non-negative and limit greater than zero."}), 400
+
+    cursor = AnnotationStorageService.get_user_annotation(id, current_user_id)
+
+    if cursor is None:
+        return jsonify('No value Found'), 404
+
+    try:
+        file_path = result_store.fetch(cursor.path_url) if cursor.path_url else None
+
+        if file_path is not None and file_path.endswith(ResultFile.EXTENSION):
+            # only the section holding this group is read from the result file
+            with ResultFile(file_path) as result:
+                members = result.members(group_id)
+            response = None if members is None else \
+                Graph().page_members(group_id, members, offset, limit)
+        else:
+            graph = graph_cache.get(cursor.id, cursor.path_url)
+
+            if graph is None:
+                return jsonify('No value Found'), 404
+
+            response = Graph().get_group_members(graph, group_id, offset, limit)
+
+        if response is None:
+            return jsonify('No value Found'), 404
+
+        logging.info(json.dumps({"status": "success", "method": "GET",
+                                  "timestamp":  datetime.datetime.now().isoformat(),
+                                  "endpoint": "/annotation/<id>/group/<group_id>"}))
+
+        return json_response(response)
+    except Exception as e:
+        logging.error(json.dumps({"status": "error", "method": "GET",
+                                  "timestamp":  datetime.datetime.now().isoformat(),
+                                  "endpoint": "/annotation/<id>/group/<group_id>",
+                                  "exception": str(e)}), exc_info=True)
+        error_response = {
+        "status": "error",
+        "message": "An internal server error occurred. Please try again later.",
+        "timestamp": datetime.datetime.now().isoformat()
+        }
+
+        return json_response(error_response, status=500)
 
 @app.route('/annotation/<id>', methods=['POST'])
 @token_required
@@ -855,14 +913,11 @@ def process_by_id(current_user_id, id):
         if question:
             response_data["question"] = question
 
-        cache = redis_client.get(str(id))
+        graph = graph_cache.get(id, cursor.path_url)
 
-        if cache is not None:
-            cache = json.loads(cache)
-            graph = cache['graph']
-            if graph is not None:
-                response_data['nodes'] = graph['nodes']
-                response_data['edges'] = graph['edges']
+        if graph is not None:
+            response_data['nodes'] = graph['nodes']
+            response_data['edges'] = graph['edges']
         else:
             # Run the query and parse the results
             result = db_instance.run_query(query)
@@ -886,8 +941,7 @@ def process_by_id(current_user_id, id):
                                   "timestamp":  datetime.datetime.now().isoformat(),
                                   "endpoint": "/annotation/<id>"}))
 
-        formatted_response = json.dumps(response, indent=4)
-        return Response(formatted_response, mimetype='application/json')
+        return json_response(response)
     except Exception as e:
         logging.error(json.dumps({"status": "error", "method": "POST",
                                   "timestamp":  datetime.datetime.now().isoformat(),
@@ -899,21 +953,28 @@ def process_by_id(current_user_id, id):
         "timestamp": datetime.datetime.now().isoformat()
         }
 
-        return Response(json.dumps(error_response, indent=4),
-                    mimetype='application/json',
-                    status=500)
+        return json_response(error_response, status=500)
 
 @app.route('/annotation/<id>/full', methods=['GET'])
 @token_required
 def process_full_annotation(current_user_id, id):
     try:
-        link = process_full_data(
-            current_user_id=current_user_id, annotation_id=id)
-        if link is None:
+        annotation = AnnotationStorageService.get_by_id(id)
+        if annotation is None:
             return jsonify('No value Found'), 200
 
+        job = export_jobs.submit(id, annotation, 'xlsx', request.host_url)
+
+        # large exports keep running, the client follows them with
+        # /annotation/<id>/export/<file_format> or the 'export' socket events
+        if not job.wait(EXPORT_WAIT_TIMEOUT):
+            return json_response(job.to_dict(), status=202)
+
+        if job.status != TaskStatus.COMPLETE.value:
+            raise Exception(job.error)
+
         response_data = {
-            'link': link
+            'link': job.link
         }
 
         logging.info(json.dumps({"status": "success", "method": "GET",
@@ -921,8 +982,7 @@ def process_full_annotation(current_user_id, id):
                                   "endpoint": "/annotation/<id>/full",
                                   }))
 
-        formatted_response = json.dumps(response_data, indent=4)
-        return Response(formatted_response, mimetype='application/json')
+        return json_response(response_data)
     except Exception as e:
         logging.error(json.dumps({"status": "error", "method": "GET",
                                   "timestamp":  datetime.datetime.now().isoformat(),
@@ -934,12 +994,72 @@ def process_full_annotation(current_user_id, id):
         "timestamp": datetime.datetime.now().isoformat()
         }
 
-        return Response(json.dumps(error_response, indent=4),
-                    mimetype='application/json',
-                    status=500)
+        return json_response(error_response, status=500)
+
+@app.route('/annotation/<id>/export', methods=['POST'])
+@token_required
+def start_export(current_user_id, id):
+    data = request.get_json() or {}
+    file_format = normalize_format(data.get('format', 'xlsx'))
+
+    if file_format not in EXPORT_FORMATS:
+        return jsonify({"error": f"Unsupported format, expected one of {list(EXPORT_FORMATS)}"}), 400
+
+    annotation = AnnotationStorageService.get_user_annotation(id, current_user_id)
+
+    if annotation is None:
+        return jsonify('No value Found'), 404
+
+    try:
+        job = export_jobs.submit(id, annotation, file_format, request.host_url)
+
+        logging.info(json.dumps({"status": "success", "method": "POST",
+                                  "timestamp":  datetime.datetime.now().isoformat(),
+                                  "endpoint": "/annotation/<id>/export"}))
+
+        status_code = 200 if job.status == TaskStatus.COMPLETE.value else 202
+        return json_response(job.to_dict(), status=status_code)
+    except Exception as e:
+        logging.error(json.dumps({"status": "error", "method": "POST",
+                                  "timestamp":  datetime.datetime.now().isoformat(),
+                                  "endpoint": "/annotation/<id>/export",
+                                  "exception": str(e)}), exc_info=True)
+        error_response = {
+        "status": "error",
+        "message": "An internal server error occurred. Please try again later.",
+        "timestamp": datetime.datetime.now().isoformat()
+        }
+
+        return json_response(error_response, status=500)
+
+@app.route('/annotation/<id>/export/<file_format>', methods=['GET'])
+@token_required
+def get_export(current_user_id, id, file_format):
+    file_format = normalize_format(file_format)
+    if file_format not in EXPORT_FORMATS:
+        return jsonify({"error": f"Unsupported format, expected one of {list(EXPORT_FORMATS)}"}), 400
+
+    annotation = AnnotationStorageService.get_user_annotation(id, current_user_id)
+
+    if annotation is None:
+        return jsonify('No value Found'), 404
+
+    job = export_jobs.get(id, annotation, file_format, request.host_url)
+
+    if job is None:
+        return jsonify({"error": "No export started for this result"}), 404
+
+    return json_response(job.to_dict())
 
 @app.route('/public/<file_name>')
 def serve_file(file_name):
+    # exports are kept in the result store, any replica can serve them
+    if file_name.startswith('export-'):
+        file_path = result_store.fetch(file_name)
+        if file_path is None:
+            return jsonify('No value Found'), 404
+        return send_file(file_path, as_attachment=True, download_name=file_name)
+
     public_folder = os.path.join(os.getcwd(), 'public')
     return send_from_directory(public_folder, file_name)
 
@@ -977,6 +1097,9 @@ def delete_by_id(current_user_id, id):
         if deleted_record is None:
             return jsonify('Failed to delete the annotation'), 500
 
+        # drop the cached graph and the stored result files
+        reset_task(id)
+        remove_result(id, existing_record)
 
         response_data = {
             'message': 'Annotation deleted successfully'
@@ -987,8 +1110,7 @@ def delete_by_id(current_user_id, id):
                                   "endpoint": "/annotation/<id>",
                                  }))
 
-        formatted_response = json.dumps(response_data, indent=4)
-        return Response(formatted_response, mimetype='application/json')
+        return json_response(response_data)
     except Exception as e:
         logging.error(json.dumps({"status": "error", "method": "DELETE",
                                   "timestamp":  datetime.datetime.now().isoformat(),
@@ -1000,9 +1122,7 @@ def delete_by_id(current_user_id, id):
         "timestamp": datetime.datetime.now().isoformat()
         }
 
-        return Response(json.dumps(error_response, indent=4),
-                    mimetype='application/json',
-                    status=500)
+        return json_response(error_response, status=500)
 
 
 @app.route('/annotation/<id>/title', methods=['PUT'])
@@ -1033,8 +1153,7 @@ def update_title(current_user_id, id):
                                   "endpoint": "/annotation/<id>/title",
                                   "exception": str(e)}), exc_info=True)
     
-        formatted_response = json.dumps(response_data, indent=4)
-        return Response(formatted_response, mimetype='application/json')
+        return json_response(response_data)
     except Exception as e:
         logging.error(json.dumps({"status": "error", "method": "PUT",
                                   "timestamp":  datetime.datetime.now().isoformat(),
@@ -1046,9 +1165,7 @@ def update_title(current_user_id, id):
         "timestamp": datetime.datetime.now().isoformat()
         }
 
-        return Response(json.dumps(error_response, indent=4),
-                    mimetype='application/json',
-                    status=500)
+        return json_response(error_response, status=500)
 
 @app.route('/annotation/delete', methods=['POST'])
 @token_required
@@ -1070,10 +1187,12 @@ def delete_many(current_user_id):
     annotation_ids = data['annotation_ids']
 
     #check if user have access to delete the resource
+    annotations = {}
     for annotation_id in annotation_ids:
         annotation = AnnotationStorageService.get_user_annotation(annotation_id, current_user_id)
         if annotation is None:
             return jsonify('No value Found'), 404
+        annotations[annotation_id] = annotation
 
     if not isinstance(annotation_ids, list):
         return jsonify({"error": "Annotation ids must be a list"}), 400
@@ -1084,6 +1203,11 @@ def delete_many(current_user_id):
     try:
         delete_count = AnnotationStorageService.delete_many_by_id(annotation_ids)
 
+        # drop the cached graphs and the stored result files
+        for annotation_id, annotation in annotations.items():
+            reset_task(annotation_id)
+            remove_result(annotation_id, annotation)
+
         response_data = {
             'message': f'Out of {len(annotation_ids)}, {delete_count} were successfully deleted.'
         }
@@ -1092,8 +1216,7 @@ def delete_many(current_user_id):
                                   "timestamp":  datetime.datetime.now().isoformat(),
                                   "endpoint": "/annotation/delete"}))
 
-        formatted_response = json.dumps(response_data, indent=4)
-        return Response(formatted_response, mimetype='application/json')
+        return json_response(response_data)
     except Exception as e:
         logging.error(json.dumps({"status": "error", "method": "POST",
                                   "timestamp":  datetime.datetime.now().isoformat(),
@@ -1105,9 +1228,7 @@ def delete_many(current_user_id):
         "timestamp": datetime.datetime.now().isoformat()
         }
 
-        return Response(json.dumps(error_response, indent=4),
-                    mimetype='application/json',
-                    status=500)
+        return json_response(error_response, status=500)
 
 @app.route('/save-preference', methods=['POST'])
 @token_required
@@ -1141,8 +1262,7 @@ def update_settings(current_user_id):
                     'message': 'Data source updated successfully',
                     'data_source': ['all']
                 }
-            formatted_response = json.dumps(response_data, indent=4)
-            return Response(formatted_response, mimetype='application/json')
+            return json_response(response_data)
         else:
             return jsonify({"error": "Invalid data source format"}), 400
 
@@ -1173,8 +1293,7 @@ def update_settings(current_user_id):
                                   "timestamp":  datetime.datetime.now().isoformat(),
                                   "endpoint": "/save-preference"}))
 
-        formatted_response = json.dumps(response_data, indent=4)
-        return Response(formatted_response, mimetype='application/json')
+        return json_response(response_data)
     except Exception as e:
         logging.error(json.dumps({"status": "error", "method": "POST",
                                   "timestamp":  datetime.datetime.now().isoformat(),
@@ -1186,9 +1305,7 @@ def update_settings(current_user_id):
         "timestamp": datetime.datetime.now().isoformat()
         }
 
-        return Response(json.dumps(error_response, indent=4),
-                    mimetype='application/json',
-                    status=500)
+        return json_response(error_response, status=500)
         logging.error(f"Error updating data source: {e}", exc_info=True)
         return jsonify({"error": str(e)}), 500
 
@@ -1217,7 +1334,7 @@ def get_saved_preferences(current_user_id):
                                   "timestamp":  datetime.datetime.now().isoformat(),
                                   "endpoint": "/saved-preference"}))
 
-        return Response(json.dumps(response_data, indent=4), mimetype='application/json')
+        return json_response(response_data)
     except Exception as e:
         logging.error(json.dumps({"status": "error", "method": "GET",
                                   "timestamp":  datetime.datetime.now().isoformat(),
@@ -1229,9 +1346,7 @@ def get_saved_preferences(current_user_id):
         "timestamp": datetime.datetime.now().isoformat()
         }
 
-        return Response(json.dumps(error_response, indent=4),
-                    mimetype='application/json',
-                    status=500)
+        return json_response(error_response, status=500)
 
 @app.route("/share", methods=["POST"])
 @token_required
@@ -1283,7 +1398,7 @@ def share_annotation(current_user_id):
                 'role': role
             }
 
-            return Response(json.dumps(response, indent=4), mimetype='application/json')
+            return json_response(response)
 
         # JWT Secret Key
         SHARED_TOKEN_SECRET = os.getenv("SHARED_TOKEN_SECRET")
@@ -1323,7 +1438,7 @@ def share_annotation(current_user_id):
             'role': role
         }
 
-        return Response(json.dumps(response, indent=4), mimetype='application/json')
+        return json_response(response)
     except Exception as e:
         logging.error(f"Error sharing annotation: {e}")
         return jsonify({"error": str(e)}), 500
@@ -1365,6 +1480,11 @@ def cell_component(current_user_id):
     # get annotation id and get go term id
     annotation_id = request.args.get('id')
     locations = request.args.get('locations')
+    # either none or location, location groups proteins by their cellular component
+    grouping = request.args.get('grouping', 'none')
+
+    if grouping not in ['none', 'location']:
+        return jsonify({"error": "Invalid grouping. It should be either none or location."}), 400
 
     # parse the location
     locations = locations.split(',')
@@ -1373,11 +1493,11 @@ def cell_component(current_user_id):
 
     try:
         # get the graph and filter out the protein
-        file_name = f'{annotation_id}.json'
-        path = Path(__file__).parent /".."/ "public" / "graph" / f"{file_name}"
+        annotation = AnnotationStorageService.get_by_id(annotation_id)
+        graph = graph_cache.get(annotation_id, annotation.path_url) if annotation is not None else None
 
-        with open(path, 'r') as f:
-            graph = json.load(f)
+        if graph is None:
+            return jsonify('No value Found'), 404
 
         nodes = graph['nodes']
         edges = graph['edges']
@@ -1495,71 +1615,44 @@ def cell_component(current_user_id):
                         protein_node_map[id] = {}
                     protein_node_map[id]["data"] = { **single_node, "location": "" }
 
-        go_subcomponents = {
-            "type": "go",
-            "id": "",
-            "properties": {
-                "subontology": "cellular_component"
-            }
-        }
-
-        go_parent = {
-            "type": "go",
-            "id": "",
-            "properties": {}
-        }
-
         for location in locations:
             go_id = location.lower()
             go_id = go_id.replace(':', '_')
             go_ids.append(go_id)
 
-        query = db_instance.list_query_generator_source_target(go_subcomponents, go_parent, go_ids, "subclass_of")
+        # expand the locations into their subclasses from the precomputed hierarchy
+        go_descendants = ontology_index.descendants(
+            go_ids, 'go', 'subclass_of', {'subontology': 'cellular_component'})
 
-        result = db_instance.run_query(query)
-        parsed_result_go = db_instance.parse_list_query(result)
-
-        go_ids = []
+        # map every go term to the requested locations it falls under
+        term_to_location = {}
 
-        for key in parsed_result_go.keys():
-            go_ids.append(key)
-            go_ids.extend(parsed_result_go[key]['node_ids'])
+        for parent_id, descendants in go_descendants.items():
+            normalized_id = parent_id.replace('_', ':').upper()
+            for go_id in [parent_id, *descendants]:
+                term_to_location.setdefault(go_id, []).append(normalized_id)
 
-        source = {
-            "type": "go",
-            "id": "",
-            "properties": {}
-        }
+        # the cellular components of every protein, from the precomputed index
+        protein_locations = relation_index.related(
+            proteins, 'go', 'protein', 'go_gene_product', {'subontology': 'cellular_component'})
 
-        target = {
-            "type": "protein",
-            "id": "",
-            "properties": {}
-        }
-
-        query = db_instance.list_query_generator_both(source, target, go_ids, proteins, "go_gene_product")
-
-        result = db_instance.run_query(query)
-        parsed_result = db_instance.parse_list_query(result)
-
-        for key in parsed_result.keys():
+        for protein_id, go_terms in protein_locations.items():
             normalized_id = []
-            location = parsed_result[key]['node_ids']
-            for i, _ in enumerate(location):
-                for parent_id in parsed_result_go.keys():
-                    if location[i] == parent_id or location[i] in parsed_result_go[parent_id]['node_ids']:
-                        normalized_id.append(parent_id.replace('_', ':').upper())
-            protein_node_map[key]['data']['location'] =  ','.join(normalized_id)
+            for go_id in go_terms:
+                normalized_id.extend(term_to_location.get(go_id, []))
+            protein_node_map[protein_id]['data']['location'] = ','.join(dict.fromkeys(normalized_id))
 
         for values in protein_node_map.values():
             response["nodes"].append(values)
 
+        if grouping == 'location':
+            response = Graph().collapse_node_nx_location(response)
 
         logging.info(json.dumps({"status": "success", "method": "GET",
                                   "timestamp":  datetime.datetime.now().isoformat(),
                                   "endpoint": "/localized-graph"}))
 
-        return Response(json.dumps(response, indent=4), mimetype='application/json')
+        return json_response(response)
     except Exception as e:
         logging.error(json.dumps({"status": "error", "method": "GET",
                                   "timestamp":  datetime.datetime.now().isoformat(),
@@ -1571,44 +1664,86 @@ def cell_component(current_user_id):
         "timestamp": datetime.datetime.now().isoformat()
         }
 
-        return Response(json.dumps(error_response, indent=4),
-                    mimetype='application/json',
-                    status=500)
+        return json_response(error_response, status=500)
+
+@app.route('/annotation/<id>/download', methods=['GET'])
+@token_required
+def download_columnar(current_user_id, id):
+    file_format = request.args.get('format', 'parquet')
+
+    if file_format not in COLUMNAR_FORMATS:
+        return jsonify({"error": f"Unsupported format, expected one of {list(COLUMNAR_FORMATS)}"}), 400
+
+    token = request.args.get('token', None)
+    current_user_id = resolve_annotation_user(current_user_id, id, token)
+
+    if current_user_id is None:
+        return jsonify({'error': 'unauthorized'}), 401
+
+    cursor = AnnotationStorageService.get_user_annotation(id, current_user_id)
+
+    if cursor is None:
+        return jsonify('No value Found'), 404
+
+    try:
+        graph = graph_cache.get(cursor.id, cursor.path_url)
+        if graph is None:
+            return jsonify('No value Found'), 404
+
+        stream = stream_columnar_zip(graph, file_format)
+
+        logging.info(json.dumps({"status": "success", "method": "GET",
+                                  "timestamp":  datetime.datetime.now().isoformat(),
+                                  "endpoint": "/annotation/<id>/download"}))
+
+        return Response(
+            stream_with_context(stream),
+            mimetype='application/zip',
+            headers={'Content-Disposition': f'attachment; filename=graph_export_{file_format}.zip'}
+        )
+    except Exception as e:
+        logging.error(json.dumps({"status": "error", "method": "GET",
+                                  "timestamp":  datetime.datetime.now().isoformat(),
+                                  "endpoint": "/annotation/<id>/download",
+                                  "exception": str(e)}), exc_info=True)
+        error_response = {
+        "status": "error",
+        "message": "An internal server error occurred. Please try again later.",
+        "timestamp": datetime.datetime.now().isoformat()
+        }
+
+        return json_response(error_response, status=500)
 
 @app.route('/annotation/<id>/download-tsv', methods=['GET'])
 @token_required
 def download_csv(current_user_id, id):
-    cursor = cursor = storage_service.get_by_id(id)
+    token = request.args.get('token', None)
+    current_user_id = resolve_annotation_user(current_user_id, id, token)
+
+    if current_user_id is None:
+        return jsonify({'error': 'unauthorized'}), 401
+
+    cursor = AnnotationStorageService.get_user_annotation(id, current_user_id)
     
     if cursor is None:
         return jsonify('No value Found'), 404
 
-    file_path = cursor.path_url
-    
     try:
-        graph = json.load(open(file_path))
-        
-        g = Graph()
-        new_graph = g.break_grouping(graph)
-        
-        file_obj = convert_to_tsv(new_graph)
-        
-        if file_obj:
-            logging.error(json.dumps({"status": "success", "method": "GET",
+        graph = graph_cache.get(cursor.id, cursor.path_url)
+        if graph is None:
+            return jsonify('No value Found'), 404
+
+        logging.info(json.dumps({"status": "success", "method": "GET",
                                   "timestamp":  datetime.datetime.now().isoformat(),
                                   "endpoint": "/annotation/<id>/download-tsv"}))
-            return send_file(
-                file_obj,
-                mimetype='application/zip',
-                as_attachment=True,
-                download_name='graph_export.zip'
-            )
-        else:
-            logging.error(json.dumps({"status": "error", "method": "GET",
-                                  "timestamp":  datetime.datetime.now().isoformat(),
-                                  "endpoint": "/annotation/<id>/download-tsv",
-                                  "exception": "Error generating the file"}))
-            return jsonify('Error generating the file'), 500
+
+        # the archive is produced row by row while it is sent,
+        # the response goes out with chunked transfer encoding
+        return Response(
+            stream_with_context(stream_tsv_zip(graph)),
+            mimetype='application/zip',
+            headers={'Content-Disposition': 'attachment; filename=graph_export.zip'}
+        )
         
     except Exception as e:
         logging.error(json.dumps({"status": "error", "method": "GET",
@@ -1621,6 +1756,4 @@ def download_csv(current_user_id, id):
         "timestamp": datetime.datetime.now().isoformat()
         }
 
-        return Response(json.dumps(error_response, indent=4),
-                    mimetype='application/json',
-                    status=500)
+        return json_response(error_response, status=500)
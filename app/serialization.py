@@ -0,0 +1,237 @@
+import datetime
+import gzip
+import hashlib
+import os
+from enum import Enum
+import orjson
+from bson import ObjectId
+from flask import Response, current_app, request
+from flask.json.provider import JSONProvider
+
+# responses smaller than this are sent uncompressed
+COMPRESS_MIN_SIZE = int(os.getenv('COMPRESS_MIN_SIZE', 1024))
+GZIP_LEVEL = 5
+ZSTD_LEVEL = 3
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+MSGPACK_MIMETYPE = 'application/x-msgpack'
+COMPACT_FORMAT_VERSION = 1
+# keys whose string values are node ids, sent as references to the string table
+REFERENCE_KEYS = frozenset(['id', 'source', 'target', 'parent'])
+COMPRESSED_MIMETYPES = frozenset(['application/json', MSGPACK_MIMETYPE])
+
+# Cache-Control of responses the reverse proxy may store and serve to anyone
+PUBLIC_CACHE = f"public, max-age={int(os.getenv('PUBLIC_CACHE_MAX_AGE', 300))}, must-revalidate"
+# Cache-Control of per-user responses, kept by the browser and revalidated
+PRIVATE_CACHE = 'private, no-cache'
+
+def _default(value):
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    if isinstance(value, Enum):
+        return value.value
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def dumps(value, indent=False):
+    '''
+    Serialize `value` to JSON bytes with orjson. Datetimes are written as
+    ISO 8601 strings and ObjectIds as their hex string.
+    '''
+    option = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+    if indent:
+        option |= orjson.OPT_INDENT_2
+    return orjson.dumps(value, default=_default, option=option)
+
+def loads(data):
+    return orjson.loads(data)
+
+def json_response(data, status=200, headers=None):
+    '''
+    JSON response of `data`, indented only when the app runs in debug mode.
+    Compression is negotiated for every response by compress_response.
+    '''
+    return Response(dumps(data, indent=current_app.debug), status=status,
+                    mimetype='application/json', headers=headers)
+
+class StringTable:
+    def __init__(self):
+        self.strings = []
+        self.index = {}
+
+    def ref(self, value):
+        ref = self.index.get(value)
+        if ref is None:
+            ref = self.index[value] = len(self.strings)
+            self.strings.append(value)
+        return ref
+
+def _encode_compact(value, table):
+    if isinstance(value, dict):
+        encoded = {}
+        for key, item in value.items():
+            key = str(key)
+            if key in REFERENCE_KEYS and isinstance(item, str):
+                # negative keys mark values that are references
+                encoded[-table.ref(key) - 1] = table.ref(item)
+            else:
+                encoded[table.ref(key)] = _encode_compact(item, table)
+        return encoded
+    if isinstance(value, (list, tuple)):
+        return [_encode_compact(item, table) for item in value]
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    if isinstance(value, (ObjectId, set, frozenset, Enum)):
+        return _encode_compact(_default(value), table)
+    return value
+
+def _decode_compact(value, strings):
+    if isinstance(value, dict):
+        decoded = {}
+        for key, item in value.items():
+            if key < 0:
+                decoded[strings[-key - 1]] = strings[item]
+            else:
+                decoded[strings[key]] = _decode_compact(item, strings)
+        return decoded
+    if isinstance(value, list):
+        return [_decode_compact(item, strings) for item in value]
+    return value
+
+def pack_compact(value):
+    '''
+    Serialize `value` to the compact MessagePack wire format.
+
+    How it works:
+        Every map key and every node id (the string values of 'id',
+        'source', 'target' and 'parent') is written once to a string table,
+        maps use the index of their keys instead of the key. A reference
+        valued entry is stored under the negated index of its key minus one,
+        its value is the index of the id. The document is
+        {'v': version, 'strings': [...], 'data': encoded value}.
+
+    Returns:
+        bytes: The MessagePack document
+    '''
+    table = StringTable()
+    data = _encode_compact(value, table)
+    return msgpack.packb({'v': COMPACT_FORMAT_VERSION, 'strings': table.strings, 'data': data},
+                         use_bin_type=True)
+
+def unpack_compact(data):
+    document = msgpack.unpackb(data, raw=False, strict_map_key=False)
+    return _decode_compact(document['data'], document['strings'])
+
+def negotiate_format():
+    '''
+    'msgpack' when the client prefers the compact wire format and it is
+    available on this server, 'json' otherwise.
+    '''
+    if msgpack is None:
+        return 'json'
+    best = request.accept_mimetypes.best_match(['application/json', MSGPACK_MIMETYPE])
+    return 'msgpack' if best == MSGPACK_MIMETYPE else 'json'
+
+def negotiated_response(data, wire_format, status=200, headers=None):
+    if wire_format == 'msgpack':
+        response = Response(pack_compact(data), status=status,
+                            mimetype=MSGPACK_MIMETYPE, headers=headers)
+    else:
+        response = json_response(data, status, headers)
+    response.vary.add('Accept')
+    return response
+
+def make_etag(*parts):
+    '''
+    Strong entity tag of a representation identified by `parts`, e.g. the
+    schema version and the query arguments it was built from.
+    '''
+    digest = hashlib.sha256('|'.join(str(part) for part in parts).encode('utf-8'))
+    return digest.hexdigest()[:32]
+
+def not_modified(etag):
+    '''
+    Whether the client's If-None-Match holds `etag`, for any of the content
+    encodings compress_response may have tagged it with.
+    '''
+    if_none_match = request.if_none_match
+    return any(if_none_match.contains(f'{etag}{suffix}')
+               for suffix in ('', '-gzip', '-zstd'))
+
+def not_modified_response(etag, cache_control):
+    response = Response(status=304)
+    return cached_response(response, etag, cache_control)
+
+def cached_response(response, etag, cache_control):
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = cache_control
+    return response
+
+class OrjsonProvider(JSONProvider):
+    '''
+    JSON provider backing jsonify and request.get_json.
+    '''
+    def dumps(self, obj, **kwargs):
+        return dumps(obj).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        return loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return Response(dumps(obj, indent=current_app.debug), mimetype='application/json')
+
+def _zstd_compressor():
+    try:
+        import zstandard
+    except ImportError:
+        return None
+    return zstandard.ZstdCompressor(level=ZSTD_LEVEL)
+
+_zstd = _zstd_compressor()
+
+def available_encodings():
+    return ['zstd', 'gzip'] if _zstd is not None else ['gzip']
+
+def compress(data, encoding):
+    if encoding == 'zstd':
+        return _zstd.compress(data)
+    return gzip.compress(data, compresslevel=GZIP_LEVEL)
+
+def compress_response(response):
+    '''
+    Compress a JSON or MessagePack response with the best encoding the
+    client accepts, zstd when the zstandard package is installed, else gzip. Streamed
+    responses and responses that are encoded already are left as they are.
+    '''
+    if response.direct_passthrough or response.is_streamed or \
+            response.mimetype not in COMPRESSED_MIMETYPES or \
+            'Content-Encoding' in response.headers:
+        return response
+
+    response.vary.add('Accept-Encoding')
+    encoding = request.accept_encodings.best_match(available_encodings())
+    if encoding is None:
+        return response
+
+    data = response.get_data()
+    if len(data) < COMPRESS_MIN_SIZE:
+        return response
+
+    response.set_data(compress(data, encoding))
+    response.headers['Content-Encoding'] = encoding
+
+    # a strong tag identifies the encoded bytes
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(f'{etag}-{encoding}')
+    return response
+
+def init_serialization(app):
+    app.json = OrjsonProvider(app)
+    app.after_request(compress_response)
@@ -0,0 +1,112 @@
+import mmap
+import os
+import struct
+from array import array
+
+class CSRIndex:
+    '''
+    Read only, memory-mapped mapping of string keys to lists of strings.
+
+    The file is laid out in compressed sparse row form:
+        header   - magic, format version, term count, key count, entry count
+                   and the byte length of the term table
+        terms    - every distinct string, newline separated. The keys are
+                   stored first so key i is term i.
+        offsets  - key count + 1 unsigned ints, the entries of key i are
+                   entries[offsets[i]:offsets[i + 1]]
+        entries  - term indices
+
+    Only the term table is decoded when the file is opened, the offsets and
+    entries are read straight from the mapped pages.
+    '''
+    MAGIC = b'AQCS'
+    FORMAT_VERSION = 1
+    HEADER = struct.Struct('<4sIIIII')
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, term_count, key_count, entry_count, terms_size = \
+            self.HEADER.unpack_from(self._mmap, 0)
+
+        if magic != self.MAGIC or version != self.FORMAT_VERSION:
+            self.close()
+            raise ValueError(f"{path} is not a valid index file")
+
+        position = self.HEADER.size
+        terms = bytes(self._mmap[position:position + terms_size]).decode('utf-8')
+        self.terms = terms.split('\n') if term_count else []
+        position += self._padded(terms_size)
+
+        view = memoryview(self._mmap)
+        self._offsets = view[position:position + (key_count + 1) * 4].cast('I')
+        position += (key_count + 1) * 4
+        self._entries = view[position:position + entry_count * 4].cast('I')
+
+        self.key_count = key_count
+        self._key_to_index = {self.terms[idx]: idx for idx in range(key_count)}
+
+    @staticmethod
+    def _padded(size):
+        return size + (-size % 4)
+
+    @classmethod
+    def write(cls, path, mapping):
+        '''
+        Write `mapping` (key -> iterable of strings) to `path`.
+        The file is written next to its destination and moved in place so
+        readers never see a partially written index.
+        '''
+        keys = list(mapping.keys())
+        term_to_index = {key: idx for idx, key in enumerate(keys)}
+        terms = list(keys)
+        offsets = array('I', [0])
+        entries = array('I')
+
+        for key in keys:
+            for value in mapping[key]:
+                if value not in term_to_index:
+                    term_to_index[value] = len(terms)
+                    terms.append(value)
+                entries.append(term_to_index[value])
+            offsets.append(len(entries))
+
+        term_bytes = '\n'.join(terms).encode('utf-8')
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+
+        with open(tmp_path, 'wb') as file:
+            file.write(cls.HEADER.pack(cls.MAGIC, cls.FORMAT_VERSION, len(terms),
+                                       len(keys), len(entries), len(term_bytes)))
+            file.write(term_bytes)
+            file.write(b'\0' * (-len(term_bytes) % 4))
+            offsets.tofile(file)
+            entries.tofile(file)
+
+        os.replace(tmp_path, path)
+
+    def __contains__(self, key):
+        return key in self._key_to_index
+
+    def keys(self):
+        return self.terms[:self.key_count]
+
+    def get(self, key, default=None):
+        idx = self._key_to_index.get(key)
+        if idx is None:
+            return default
+        start, end = self._offsets[idx], self._offsets[idx + 1]
+        return [self.terms[entry] for entry in self._entries[start:end]]
+
+    def get_many(self, keys):
+        return {key: self.get(key, []) for key in keys}
+
+    def close(self):
+        for view in ('_offsets', '_entries'):
+            if hasattr(self, view):
+                getattr(self, view).release()
+        self._mmap.close()
+        self._file.close()
@@ -66,12 +66,12 @@ class CypherQueryGenerator(QueryGeneratorInterface):
         logger.info(
             f"Finished loading {len(nodes_paths)} nodes and {len(edges_paths)} edges datasets.")
 
-    def run_query(self, query_code, stop_event=None,  species="human"):
+    def run_query(self, query_code, stop_event=None,  species="human", parameters=None):
         results = []
         driver = self.human_driver if species == "human" else self.fly_driver
         # use lazy loading for improved performance
         with driver.session() as session:
-            result = session.run(query_code)
+            result = session.run(query_code, parameters)
             for record in result:
                 if stop_event is not None and stop_event.is_set():
                     raise ThreadStopException('Query runner is stopped')
@@ -223,6 +223,10 @@ class CypherQueryGenerator(QueryGeneratorInterface):
         return f"{optional_clause} {return_clause} {self.limit_query(limit)}"
 
     def construct_count_clause(self, query_clauses, node_map, predicate_map):
+        unfiltered_count = self.construct_unfiltered_count_clause(query_clauses, node_map)
+        if unfiltered_count is not None:
+            return unfiltered_count
+
         match_no_clause = ''
         where_no_clause = ''
         match_clause = ''
@@ -304,6 +308,75 @@ class CypherQueryGenerator(QueryGeneratorInterface):
 
         return [total_count, label_count_query]
 
+    def construct_unfiltered_count_clause(self, query_clauses, node_map):
+        '''
+        Count queries of a single node or a single predicate without ids or
+        property filters, e.g. all genes or all gene-transcript edges, which
+        do not need to collect every match.
+
+        How it works:
+            The nodes of a label are counted from the count store, in
+            constant time. The count store can not count the edges between
+            two labels nor their distinct ends, the edges are counted as they
+            are matched and each end as the nodes of its label having such
+            an edge. Both stream without holding the matches in memory.
+
+        Returns:
+            list: The total count and count by label queries, None when the
+            request has to be counted from its matches
+        '''
+        predicates = query_clauses.get('predicates') or []
+        nodes = [node_map[node_id] for node_id in query_clauses['list_of_node_ids']]
+        if any(node['id'] or node['properties'] for node in nodes):
+            return None
+
+        if not predicates and len(nodes) == 1:
+            var = nodes[0]['node_id']
+            node_type = nodes[0]['type']
+            match_clause = f"MATCH ({var}:{node_type})"
+            total_count = f"{match_clause} RETURN count({var}) AS total_nodes"
+            label_count_query = f"{match_clause} RETURN count({var}) AS {var}_{node_type}"
+            return [total_count, label_count_query]
+
+        if len(predicates) != 1 or predicates[0]['source'] == predicates[0]['target']:
+            return None
+
+        predicate = predicates[0]
+        edge_id = predicate['predicate_id']
+        edge_type = predicate['type'].replace(" ", "_").lower()
+        source = node_map[predicate['source']]
+        target = node_map[predicate['target']]
+        source_var, source_type = source['node_id'], source['type']
+        target_var, target_type = target['node_id'], target['type']
+
+        edge_count = f"MATCH (:{source_type})-[{edge_id}:{edge_type}]->(:{target_type}) RETURN count({edge_id})"
+        source_count = f"MATCH ({source_var}:{source_type}) WHERE ({source_var})-[:{edge_type}]->(:{target_type}) RETURN count({source_var})"
+        target_count = f"MATCH ({target_var}:{target_type}) WHERE (:{source_type})-[:{edge_type}]->({target_var}) RETURN count({target_var})"
+
+        source_alias = f"{source_var}_{source_type}"
+        target_alias = f"{target_var}_{target_type}"
+        edge_alias = f"{edge_id}_{predicate['type'].replace(' ', '_')}"
+
+        if source_type == target_type:
+            # a node at both ends of the edges is counted once
+            node_var = f"{source_var}_{target_var}"
+            nodes_count = f"CALL {{ MATCH ({node_var}:{source_type}) " \
+                          f"WHERE ({node_var})-[:{edge_type}]->(:{target_type}) OR (:{source_type})-[:{edge_type}]->({node_var}) " \
+                          f"RETURN count({node_var}) AS total_nodes }} "
+        else:
+            nodes_count = f"CALL {{ {source_count} AS source_count }} " \
+                          f"CALL {{ {target_count} AS target_count }} " \
+                          f"WITH total_edges, source_count + target_count AS total_nodes "
+
+        total_count = f"CALL {{ {edge_count} AS total_edges }} " \
+                      f"{nodes_count}" \
+                      f"RETURN total_nodes, total_edges"
+        label_count_query = f"CALL {{ {source_count} AS {source_alias} }} " \
+                            f"CALL {{ {target_count} AS {target_alias} }} " \
+                            f"CALL {{ {edge_count} AS {edge_alias} }} " \
+                            f"RETURN {source_alias}, {target_alias}, {edge_alias}"
+        return [total_count, label_count_query]
+
     def limit_query(self, limit):
         '''
         for now remove the limit from the backend
@@ -555,6 +628,79 @@ class CypherQueryGenerator(QueryGeneratorInterface):
 
         return query
 
+    def property_filter(self, variable, properties):
+        '''
+        WHERE clause matching the properties of `variable`. The values are
+        passed as query parameters and the keys are quoted, so neither can
+        change the query.
+
+        Returns:
+            tuple: The clause, empty without properties, and its parameters
+        '''
+        if not properties:
+            return "", {}
+
+        conditions = []
+        parameters = {}
+        for idx, (key, value) in enumerate(properties.items()):
+            name = f"{variable}_{idx}"
+            key = str(key).replace("`", "``")
+            conditions.append(f"{variable}.`{key}` = ${name}")
+            parameters[name] = value
+
+        return f"WHERE {' AND '.join(conditions)}", parameters
+
+    def hierarchy_query_generator(self, node_type, relationship, properties=None):
+        where_clause, parameters = self.property_filter("child", properties)
+
+        query = f"""
+        MATCH (child:{node_type})-[:{relationship}]->(parent:{node_type})
+        {where_clause}
+        RETURN child.id AS child_id, parent.id AS parent_id
+        """
+
+        return query, parameters
+
+    def relation_query_generator(self, source_type, target_type, relationship, properties=None):
+        where_clause, parameters = self.property_filter("source", properties)
+
+        query = f"""
+        MATCH (source:{source_type})-[:{relationship}]->(target:{target_type})
+        {where_clause}
+        RETURN target.id AS node_id, COLLECT(DISTINCT source.id) AS related_ids
+        """
+
+        return query, parameters
+
+    def labels_query_generator(self):
+        return "CALL db.labels() YIELD label RETURN label"
+
+    def relationship_types_query_generator(self):
+        return "CALL db.relationshipTypes() YIELD relationshipType RETURN relationshipType"
+
+    def node_count_query_generator(self, label=None):
+        # answered from the count store, without reading the nodes
+        node = f"(n:`{label}`)" if label else "(n)"
+        return f"MATCH {node} RETURN count(n) AS count"
+
+    def edge_count_query_generator(self, relationship=None, source_type=None, target_type=None):
+        # the count store holds counts with at most one end labeled, labeling
+        # both ends reads every edge of the type
+        source = f"(:`{source_type}`)" if source_type else "()"
+        target = f"(:`{target_type}`)" if target_type else "()"
+        edge = f"[r:`{relationship}`]" if relationship else "[r]"
+        return f"MATCH {source}-{edge}->{target} RETURN count(r) AS count"
+
+    def property_stats_query_generator(self, label, sample_size):
+        query = f"""
+        MATCH (n:`{label}`)
+        WITH n LIMIT {int(sample_size)}
+        UNWIND keys(n) AS key
+        RETURN key, count(*) AS count, count(DISTINCT n[key]) AS distinct_count
+        """
+
+        return query
+
     def list_query_generator_both(self, source, target, source_ids, target_ids, relationship):
         source_node = self.match_node(source, "source")
         target_node = self.match_node(target, "target")
@@ -0,0 +1,194 @@
+import threading
+from collections import OrderedDict
+from app.services.result_file import read_result_graph
+from app.serialization import loads
+
+def graph_size(graph):
+    '''
+    Weight of a grouped graph in the in-process tier: its nodes, edges and
+    the members held by the group nodes.
+    '''
+    members = sum(len(node['data'].get('nodes', [])) for node in graph['nodes'])
+    return len(graph['nodes']) + len(graph['edges']) + members
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.graph = None
+        self.error = None
+
+class GraphCache:
+    '''
+    Read path of annotation graphs, shared by every route and worker.
+
+    Tiers, from the cheapest:
+        memory - size bounded LRU of decoded graphs in this process, keyed by
+                 result key. A result key always names the same content so
+                 entries never go stale.
+        redis  - the graph written by the task handler under the annotation id,
+                 shared by the replicas. It is only used for a result key when
+                 the entry was written for that key, a graph still being
+                 generated is returned but not kept in memory.
+        store  - the result file of the result key in the result store.
+
+    Concurrent requests for the same graph wait for a single load instead of
+    decoding it once each. Every caller gets its own node and edge lists, the
+    node and edge dicts in them are shared and must not be modified.
+    '''
+    TIERS = ('memory', 'redis', 'store')
+
+    def __init__(self, redis_client, result_store, max_size=500000):
+        self.redis_client = redis_client
+        self.result_store = result_store
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.keys_by_annotation = {}
+        self.size = 0
+        self.flights = {}
+        self.lock = threading.Lock()
+        self.metrics = {tier: {'hit': 0, 'miss': 0} for tier in self.TIERS}
+
+    def get(self, annotation_id, result_key=None):
+        '''
+        The grouped graph of an annotation, None if no tier holds it.
+
+        Args:
+            annotation_id: Id of the annotation
+            result_key (str): Key of the stored result (annotation.path_url).
+                Without it only the graph cached in redis is returned.
+
+        Returns:
+            dict: Graph containing 'nodes' and 'edges'
+        '''
+        graph = self._get(str(annotation_id), result_key)
+        if graph is None:
+            return None
+
+        return {**graph, 'nodes': list(graph['nodes']), 'edges': list(graph['edges'])}
+
+    def _get(self, annotation_id, result_key):
+
+        if result_key:
+            with self.lock:
+                graph = self._memory_get(result_key)
+            if graph is not None:
+                return graph
+
+        flight_key = (annotation_id, result_key)
+        with self.lock:
+            flight = self.flights.get(flight_key)
+            leader = flight is None
+            if leader:
+                flight = self.flights[flight_key] = _Flight()
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.graph
+
+        try:
+            flight.graph = self._load(annotation_id, result_key)
+            return flight.graph
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self.lock:
+                self.flights.pop(flight_key, None)
+            flight.done.set()
+
+    def _load(self, annotation_id, result_key):
+        graph = self._redis_get(annotation_id, result_key)
+        if graph is not None:
+            return graph
+
+        if not result_key:
+            return None
+
+        file_path = self.result_store.fetch(result_key)
+        if file_path is None:
+            self._count('store', 'miss')
+            return None
+
+        self._count('store', 'hit')
+        graph = read_result_graph(file_path)
+        self.put(annotation_id, result_key, graph)
+        return graph
+
+    def _redis_get(self, annotation_id, result_key):
+        cache = self.redis_client.get(annotation_id)
+        entry = loads(cache) if cache is not None else None
+        graph = entry['graph'] if entry is not None else None
+
+        if graph is None:
+            self._count('redis', 'miss')
+            return None
+
+        if not result_key:
+            self._count('redis', 'hit')
+            return graph
+
+        # the entry may still hold the graph of a previous result
+        if entry.get('result_key') != result_key:
+            self._count('redis', 'miss')
+            return None
+
+        self._count('redis', 'hit')
+        self.put(annotation_id, result_key, graph)
+        return graph
+
+    def _memory_get(self, result_key):
+        entry = self.entries.get(result_key)
+        if entry is None:
+            self.metrics['memory']['miss'] += 1
+            return None
+
+        self.metrics['memory']['hit'] += 1
+        self.entries.move_to_end(result_key)
+        return entry[1]
+
+    def _count(self, tier, outcome):
+        with self.lock:
+            self.metrics[tier][outcome] += 1
+
+    def put(self, annotation_id, result_key, graph):
+        size = graph_size(graph)
+        if size > self.max_size:
+            return
+
+        with self.lock:
+            if result_key in self.entries:
+                return
+
+            annotation_id = str(annotation_id)
+            self.entries[result_key] = (size, graph, annotation_id)
+            self.keys_by_annotation.setdefault(annotation_id, set()).add(result_key)
+            self.size += size
+
+            while self.size > self.max_size:
+                key, (evicted_size, _, owner) = self.entries.popitem(last=False)
+                self.size -= evicted_size
+                keys = self.keys_by_annotation.get(owner, set())
+                keys.discard(key)
+                if not keys:
+                    self.keys_by_annotation.pop(owner, None)
+
+    def invalidate(self, annotation_id):
+        '''
+        Drop the graphs of an annotation from this process, e.g. once a new
+        result replaced them.
+        '''
+        with self.lock:
+            for result_key in self.keys_by_annotation.pop(str(annotation_id), set()):
+                size = self.entries.pop(result_key, (0, None, None))[0]
+                self.size -= size
+
+    def stats(self):
+        with self.lock:
+            return {
+                'entries': len(self.entries),
+                'size': self.size,
+                'max_size': self.max_size,
+                'tiers': {tier: dict(counts) for tier, counts in self.metrics.items()}
+            }
@@ -0,0 +1,99 @@
+import gzip
+import os
+from app.serialization import dumps
+
+PAYLOAD_EXTENSION = 'graph.json.gz'
+CHUNK_SIZE = 64 * 1024
+GZIP_LEVEL = 6
+
+# payloads start with the opening brace in a gzip member of its own, so the
+# rest of the file can follow the gzip member of a response envelope as it is
+OPENING_MEMBER = gzip.compress(b'{', compresslevel=GZIP_LEVEL, mtime=0)
+
+def payload_key(result_key):
+    '''
+    Key of the pre-serialized graph stored next to a result,
+    e.g. "<annotation id>-<result version>.graph.json.gz".
+    '''
+    root, _ = os.path.splitext(result_key)
+    return f'{root}.{PAYLOAD_EXTENSION}'
+
+def write_payload(path, graph):
+    '''
+    Write the grouped `graph` as gzip compressed compact JSON holding only
+    'nodes' and 'edges', the bytes sent to clients as they are. The opening
+    brace and the rest of the document are two gzip members, see
+    iter_spliced.
+    '''
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    data = dumps({'nodes': graph['nodes'], 'edges': graph['edges']})
+
+    # mtime=0 keeps the bytes identical for identical graphs
+    with open(tmp_path, 'wb') as file:
+        file.write(OPENING_MEMBER)
+        file.write(gzip.compress(data[1:], compresslevel=GZIP_LEVEL, mtime=0))
+
+    os.replace(tmp_path, path)
+
+def read_payload(path):
+    with open(path, 'rb') as file:
+        return gzip.decompress(file.read())
+
+def iter_file(path, decompress=False):
+    '''
+    Yields the content of a stored payload in chunks, decompressed for
+    clients that do not accept gzip.
+    '''
+    opener = gzip.open if decompress else open
+    with opener(path, 'rb') as file:
+        while True:
+            chunk = file.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+
+def splice(envelope, graph_bytes):
+    '''
+    Build a JSON object holding the keys of `envelope` followed by the
+    'nodes' and 'edges' of a stored payload, without decoding the payload.
+
+    Args:
+        envelope (dict): The metadata of the response, must not be empty
+        graph_bytes (bytes): A decompressed payload, see write_payload
+
+    Returns:
+        bytes: The JSON document
+    '''
+    head = dumps(envelope)
+    return head[:-1] + b',' + graph_bytes[1:]
+
+def iter_spliced(envelope, path):
+    '''
+    The gzip compressed JSON document of splice, built without decompressing
+    the stored payload: a gzip member holding the envelope is followed by the
+    members of the payload after its opening brace. Clients decompress
+    concatenated members as a single stream.
+
+    Args:
+        envelope (dict): The metadata of the response, must not be empty
+        path (str): A payload written by write_payload
+
+    Returns:
+        generator: The compressed chunks, None if the payload was written
+            as a single gzip member
+    '''
+    file = open(path, 'rb')
+    if file.read(len(OPENING_MEMBER)) != OPENING_MEMBER:
+        file.close()
+        return None
+
+    def chunks():
+        with file:
+            yield gzip.compress(dumps(envelope)[:-1] + b',', compresslevel=GZIP_LEVEL, mtime=0)
+            while True:
+                chunk = file.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+
+    return chunks()
@@ -0,0 +1,341 @@
+import datetime
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+STATS_FORMAT = 1
+STATS_PREFIX = 'graph_stats_'
+# stats files kept next to the current one
+STATS_KEEP = 3
+# nodes of each label read for the property statistics
+PROPERTY_SAMPLE_SIZE = 10000
+# seconds before a process retries a collection that failed
+COLLECT_RETRY_DELAY = 3600
+
+def read_json(file_path):
+    with open(file_path, 'r') as file:
+        return json.load(file)
+
+def stats_version(species_stats):
+    content = json.dumps(species_stats, sort_keys=True, default=str)
+    timestamp = datetime.datetime.now(datetime.timezone.utc).strftime('%Y%m%dT%H%M%S')
+    return f"{timestamp}-{hashlib.sha256(content.encode('utf-8')).hexdigest()[:8]}"
+
+def graph_version(stats):
+    '''
+    Version of the knowledge graph the statistics were read from, it only
+    changes when the node or edge counts of a species do.
+    '''
+    counts = {species: [value.get('node_counts'), value.get('edge_counts')]
+              for species, value in stats['species'].items()}
+    return hashlib.sha256(json.dumps(counts, sort_keys=True).encode('utf-8')).hexdigest()[:12]
+
+def shipped_stats(graph_info_path, count_info_path):
+    '''
+    Statistics of the human graph from the files shipped in Data/, used
+    until statistics were collected from the knowledge graph.
+    '''
+    graph_info = read_json(graph_info_path)
+    edge_counts = read_json(count_info_path)
+    node_counts = {entity['name']: entity['count'] for entity in graph_info.get('top_entities', [])}
+
+    digest = hashlib.sha256(json.dumps([graph_info, edge_counts], sort_keys=True).encode('utf-8'))
+    return {
+        'format': STATS_FORMAT,
+        'version': f'shipped-{digest.hexdigest()[:8]}',
+        'generated_at': None,
+        'species': {
+            'human': {
+                'kg_info': graph_info,
+                'node_counts': node_counts,
+                'edge_counts': edge_counts,
+                'properties': {}
+            }
+        }
+    }
+
+class GraphStats:
+    '''
+    The current statistics of the knowledge graph of each species, read by
+    the query planner and /kg-info.
+
+    Collected statistics are written to `stats_dir` as
+    graph_stats_<version>.json, versions sort by the time they were
+    collected. Each process loads the newest one and swaps it in with a
+    single assignment when refresh() finds a newer one, e.g. written by
+    the collector of another worker.
+
+    kg_version identifies the graph itself for the indexes precomputed
+    from it (see KGIndex). KG_VERSION overrides it, e.g. to rebuild them
+    after a reload that kept the counts.
+
+    Args:
+        stats_dir (str): Directory of the collected statistics
+        fallback (callable): Returns the statistics to use when none were
+            collected yet, see shipped_stats
+    '''
+    def __init__(self, stats_dir, fallback):
+        self.stats_dir = stats_dir
+        self.fallback = fallback
+        self.current = self.load_latest() or fallback()
+        self.kg_version_override = os.getenv('KG_VERSION')
+        # (statistics version, graph version) computed once per statistics
+        self._kg_version = (None, None)
+
+    @property
+    def version(self):
+        return self.current['version']
+
+    @property
+    def kg_version(self):
+        if self.kg_version_override:
+            return self.kg_version_override
+        current = self.current
+        if self._kg_version[0] != current['version']:
+            self._kg_version = (current['version'], graph_version(current))
+        return self._kg_version[1]
+
+    def species(self, species):
+        return self.current['species'].get(species, {})
+
+    def kg_info(self, species='human'):
+        '''
+        /kg-info of a species, the one of the human graph when none was
+        collected for it.
+        '''
+        return self.species(species).get('kg_info') or self.species('human').get('kg_info', {})
+
+    def stats_files(self):
+        try:
+            files = os.listdir(self.stats_dir)
+        except OSError:
+            return []
+        return sorted(file for file in files if file.startswith(STATS_PREFIX) and file.endswith('.json'))
+
+    def load_latest(self):
+        for file in reversed(self.stats_files()):
+            file_path = os.path.join(self.stats_dir, file)
+            try:
+                stats = read_json(file_path)
+            except (OSError, ValueError) as e:
+                logging.warning(f"Ignoring graph statistics {file_path}: {e}")
+                continue
+            if stats.get('format') == STATS_FORMAT:
+                return stats
+        return None
+
+    def refresh(self):
+        '''
+        Swap in the newest collected statistics.
+
+        Returns:
+            bool: Whether newer statistics were loaded
+        '''
+        stats = self.load_latest()
+        if stats is None or stats['version'] == self.version:
+            return False
+        generated_at = self.current.get('generated_at')
+        if generated_at and stats['generated_at'] <= generated_at:
+            return False
+        self.current = stats
+        logging.info(f"Loaded graph statistics {stats['version']}")
+        return True
+
+    def save(self, stats):
+        '''
+        Write collected statistics and swap them in, only the newest
+        STATS_KEEP files are kept.
+        '''
+        os.makedirs(self.stats_dir, exist_ok=True)
+        file_path = os.path.join(self.stats_dir, f"{STATS_PREFIX}{stats['version']}.json")
+        tmp_path = f'{file_path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w') as file:
+            json.dump(stats, file)
+        os.replace(tmp_path, file_path)
+
+        for file in self.stats_files()[:-STATS_KEEP]:
+            os.remove(os.path.join(self.stats_dir, file))
+
+        self.current = stats
+
+    def age(self):
+        '''
+        Seconds since the current statistics were collected, None for the
+        shipped ones.
+        '''
+        generated_at = self.current.get('generated_at')
+        if not generated_at:
+            return None
+        generated_at = datetime.datetime.fromisoformat(generated_at)
+        return (datetime.datetime.now(datetime.timezone.utc) - generated_at).total_seconds()
+
+class StatsCollector:
+    '''
+    Collects the statistics of the knowledge graph of each species.
+
+    How it works:
+        Node counts per label and edge counts per relationship type are read
+        from the count store. Edges whose label is shared by several schema
+        edges (e.g. expressed_in) are also counted per schema key, which
+        requires reading them. The properties of a sample of the nodes of
+        each label are summarized as the number of nodes having them and
+        their distinct values, from which the planner estimates the
+        selectivity of property filters.
+
+    Args:
+        db_instance: Query generator of the knowledge graph, only Cypher
+            generators implement the statistics queries
+        schema_manager: Provides the adjacency index of each species
+        graph_stats (GraphStats): Where the statistics are saved
+    '''
+    def __init__(self, db_instance, schema_manager, graph_stats):
+        self.db_instance = db_instance
+        self.schema_manager = schema_manager
+        self.graph_stats = graph_stats
+        self.stop_event = threading.Event()
+        self.last_attempt = None
+
+    def query(self, query, species):
+        return self.db_instance.run_query(query, None, species)
+
+    def count(self, query, species):
+        results = self.query(query, species)
+        return results[0]['count'] if results else 0
+
+    def collect_species(self, species):
+        db = self.db_instance
+        labels = [record['label'] for record in self.query(db.labels_query_generator(), species)]
+        relationship_types = [record['relationshipType']
+                              for record in self.query(db.relationship_types_query_generator(), species)]
+
+        node_counts = {label: self.count(db.node_count_query_generator(label), species) for label in labels}
+        label_counts = {relationship: self.count(db.edge_count_query_generator(relationship), species)
+                        for relationship in relationship_types}
+
+        # edges sharing a label are counted per schema key, e.g. gene_expressed_in_clo
+        edge_keys = {}
+        for source_type, edges in self.schema_manager.adjacency[species].outgoing.items():
+            for label, targets in edges.items():
+                for target_type, key in targets.items():
+                    edge_keys.setdefault(label, []).append((source_type, target_type, key))
+
+        edge_counts = {}
+        for relationship, count in label_counts.items():
+            keys = edge_keys.get(relationship, [])
+            if len(keys) < 2:
+                edge_counts[relationship] = {'count': count, 'name': relationship}
+                continue
+            for source_type, target_type, key in keys:
+                query = db.edge_count_query_generator(relationship, source_type, target_type)
+                edge_counts[key] = {'count': self.count(query, species), 'name': relationship}
+
+        properties = {}
+        for label, count in node_counts.items():
+            query = db.property_stats_query_generator(label, PROPERTY_SAMPLE_SIZE)
+            properties[label] = {
+                'sample': min(count, PROPERTY_SAMPLE_SIZE),
+                'properties': {record['key']: {'count': record['count'], 'distinct': record['distinct_count']}
+                               for record in self.query(query, species)}
+            }
+
+        # keep what can not be counted, e.g. the datasets and the data size
+        kg_info = dict(self.graph_stats.species(species).get('kg_info', {}))
+        kg_info.update({
+            'node_count': self.count(db.node_count_query_generator(), species),
+            'edge_count': self.count(db.edge_count_query_generator(), species),
+            'top_entities': [{'count': count, 'name': label} for label, count in
+                             sorted(node_counts.items(), key=lambda item: -item[1])],
+            'top_connections': [{'count': count, 'name': relationship} for relationship, count in
+                                sorted(label_counts.items(), key=lambda item: -item[1])]
+        })
+
+        return {
+            'kg_info': kg_info,
+            'node_counts': node_counts,
+            'edge_counts': edge_counts,
+            'properties': properties
+        }
+
+    def collect(self, species_list=('human', 'fly')):
+        '''
+        Collect and save the statistics of every species, the previous
+        statistics of a species are kept when its graph can not be read.
+        '''
+        species_stats = {}
+        collected = False
+        for species in species_list:
+            try:
+                species_stats[species] = self.collect_species(species)
+                collected = True
+            except Exception as e:
+                logging.error(f"Error collecting the statistics of the {species} graph: {e}", exc_info=True)
+                if self.graph_stats.species(species):
+                    species_stats[species] = self.graph_stats.species(species)
+
+        if not collected:
+            return None
+
+        stats = {
+            'format': STATS_FORMAT,
+            'version': stats_version(species_stats),
+            'generated_at': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            'species': species_stats
+        }
+        self.graph_stats.save(stats)
+        logging.info(f"Collected graph statistics {stats['version']}")
+        return stats
+
+    def collect_if_due(self, interval):
+        '''
+        Collect when the current statistics are older than `interval`
+        seconds, in one process of the host at a time.
+        '''
+        age = self.graph_stats.age()
+        if age is not None and age < interval:
+            return None
+        if self.last_attempt is not None and \
+                time.monotonic() - self.last_attempt < min(interval, COLLECT_RETRY_DELAY):
+            return None
+
+        os.makedirs(self.graph_stats.stats_dir, exist_ok=True)
+        with open(os.path.join(self.graph_stats.stats_dir, '.collect.lock'), 'w') as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                return None
+            try:
+                # another process may have collected while this one waited
+                self.graph_stats.refresh()
+                age = self.graph_stats.age()
+                if age is not None and age < interval:
+                    return None
+                self.last_attempt = time.monotonic()
+                return self.collect()
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def watch(self, refresh_interval, collect_interval):
+        '''
+        Reload statistics saved by other processes every `refresh_interval`
+        seconds and collect new ones every `collect_interval` seconds, 0
+        disables collecting.
+        '''
+        def run():
+            while True:
+                try:
+                    self.graph_stats.refresh()
+                    if collect_interval > 0:
+                        self.collect_if_due(collect_interval)
+                except Exception as e:
+                    logging.error(f"Error refreshing the graph statistics: {e}", exc_info=True)
+                if self.stop_event.wait(refresh_interval):
+                    return
+
+        threading.Thread(target=run, name='graph-stats', daemon=True).start()
+
+    def stop(self):
+        self.stop_event.set()
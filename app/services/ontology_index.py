@@ -0,0 +1,207 @@
+import hashlib
+import logging
+import os
+import threading
+from app.services.csr_index import CSRIndex
+
+UNVERSIONED = 'unversioned'
+
+class KGIndex:
+    '''
+    Base class of the indexes precomputed from the knowledge graph.
+
+    Each index is queried once per knowledge graph version, written to disk
+    as a CSRIndex and memory-mapped by every process afterwards. Subclasses
+    implement spec(...), turning their arguments into the hashable tuple that
+    identifies an index, and build(path, *spec).
+
+    Indexes are built outside of the shared lock, one build per index at a
+    time, so lookups of other indexes are served meanwhile. When the graph
+    version changes the index of the previous version is closed as soon as
+    the lookups still reading it are done.
+
+    Args:
+        db_instance: Query generator the indexes are built with
+        index_dir (str): Directory of the index files
+        version (callable): Returns the version of the knowledge graph,
+            e.g. GraphStats.kg_version
+    '''
+    prefix = 'index'
+
+    def __init__(self, db_instance, index_dir, version=None):
+        self.db_instance = db_instance
+        self.index_dir = index_dir
+        self.version = version or (lambda: UNVERSIONED)
+        # spec -> (path, CSRIndex) of the current version
+        self.indexes = {}
+        # CSRIndex -> lookups in progress
+        self.users = {}
+        # replaced indexes closed once their last lookup is done
+        self.retired = set()
+        # path -> lock held while that index is built
+        self.building = {}
+        self.lock = threading.Lock()
+
+    def index_path(self, spec, version):
+        digest = hashlib.sha1(repr(spec).encode('utf-8')).hexdigest()[:12]
+        return os.path.join(self.index_dir, f'{self.prefix}_{digest}_{version}.csr')
+
+    def acquire(self, spec, path):
+        # called with self.lock held
+        path_index = self.indexes.get(spec)
+        if path_index is None or path_index[0] != path:
+            return None
+        index = path_index[1]
+        self.users[index] = self.users.get(index, 0) + 1
+        return index
+
+    def release(self, index):
+        with self.lock:
+            self.users[index] -= 1
+            if self.users[index]:
+                return
+            del self.users[index]
+            if index in self.retired:
+                self.retired.discard(index)
+                index.close()
+
+    def open_index(self, spec):
+        '''
+        The index of `spec` for the current graph version, built when
+        missing. Callers release() it when they are done reading it.
+        '''
+        path = self.index_path(spec, self.version())
+
+        with self.lock:
+            index = self.acquire(spec, path)
+            if index is not None:
+                return index
+            build_lock = self.building.setdefault(path, threading.Lock())
+
+        with build_lock:
+            with self.lock:
+                index = self.acquire(spec, path)
+                if index is not None:
+                    return index
+
+            try:
+                if not os.path.exists(path):
+                    logging.info(f"Building {self.prefix} index {spec} at {path}")
+                    self.build(path, *spec)
+                index = CSRIndex(path)
+            finally:
+                with self.lock:
+                    self.building.pop(path, None)
+
+            with self.lock:
+                previous = self.indexes.get(spec)
+                self.indexes[spec] = (path, index)
+                if previous is not None:
+                    self.retire(previous[1])
+                return self.acquire(spec, path)
+
+    def retire(self, index):
+        # called with self.lock held
+        if index in self.users:
+            self.retired.add(index)
+        else:
+            index.close()
+
+    def lookup(self, spec, keys):
+        index = self.open_index(spec)
+        try:
+            return index.get_many(keys)
+        finally:
+            self.release(index)
+
+    def spec(self, *args, **kwargs):
+        raise NotImplementedError
+
+    def build(self, path, *spec):
+        raise NotImplementedError
+
+    def warm(self, specs):
+        '''
+        Build the indexes of the given spec arguments (dicts of keyword
+        arguments to spec) in the background so the first request does not
+        pay for it.
+        '''
+        def build_all():
+            for kwargs in specs:
+                spec = self.spec(**kwargs)
+                try:
+                    self.release(self.open_index(spec))
+                except Exception as e:
+                    logging.error(f"Error building {self.prefix} index {spec}: {e}")
+
+        threading.Thread(name=f'{self.prefix}_index_builder', target=build_all, daemon=True).start()
+
+class OntologyClosureIndex(KGIndex):
+    '''
+    Transitive closure of an ontology hierarchy (e.g. go subclass_of go),
+    answering "all descendants of these terms" without a database round-trip.
+    Indexes are identified by (node type, relationship, child properties, species).
+    '''
+    prefix = 'closure'
+
+    def spec(self, node_type, relationship, properties=None, species='human'):
+        return (node_type, relationship, tuple(sorted((properties or {}).items())), species)
+
+    def build(self, path, node_type, relationship, properties, species):
+        query, parameters = self.db_instance.hierarchy_query_generator(node_type, relationship, dict(properties))
+        results = self.db_instance.run_query(query, None, species, parameters)
+
+        children = {}
+        for record in results:
+            children.setdefault(record['parent_id'], []).append(record['child_id'])
+
+        closure = {}
+        for term in children:
+            descendants = []
+            visited = {term}
+            stack = list(children[term])
+            while stack:
+                child = stack.pop()
+                if child in visited:
+                    continue
+                visited.add(child)
+                descendants.append(child)
+                stack.extend(children.get(child, []))
+            closure[term] = descendants
+
+        CSRIndex.write(path, closure)
+
+    def descendants(self, term_ids, node_type, relationship, properties=None, species='human'):
+        '''
+        Returns a dict mapping each requested term to the list of its descendants.
+        '''
+        return self.lookup(self.spec(node_type, relationship, properties, species), term_ids)
+
+class RelationIndex(KGIndex):
+    '''
+    Maps the nodes of one type to the ids of the nodes related to them,
+    e.g. protein -> the GO cellular components annotated with go_gene_product.
+    Indexes are identified by (source type, target type, relationship,
+    source properties, species), the keys are target node ids.
+    '''
+    prefix = 'relation'
+
+    def spec(self, source_type, target_type, relationship, properties=None, species='human'):
+        return (source_type, target_type, relationship, tuple(sorted((properties or {}).items())), species)
+
+    def build(self, path, source_type, target_type, relationship, properties, species):
+        query, parameters = self.db_instance.relation_query_generator(
+            source_type, target_type, relationship, dict(properties))
+        results = self.db_instance.run_query(query, None, species, parameters)
+
+        related = {}
+        for record in results:
+            related.setdefault(record['node_id'], []).extend(record['related_ids'])
+
+        CSRIndex.write(path, related)
+
+    def related(self, node_ids, source_type, target_type, relationship, properties=None, species='human'):
+        '''
+        Returns a dict mapping each requested node id to its related ids.
+        '''
+        return self.lookup(self.spec(source_type, target_type, relationship, properties, species), node_ids)
@@ -0,0 +1,166 @@
+import json
+import mmap
+import os
+import struct
+import zlib
+
+class ResultFile:
+    '''
+    Binary store of a grouped annotation result, read through mmap.
+
+    Layout:
+        header   - magic, format version and the offset of the index
+        sections - length-prefixed, zlib compressed JSON blobs:
+                   the group nodes without their members, the members of
+                   each group and the edges of each label
+        index    - length-prefixed, compressed JSON holding the counts and
+                   the offset of every section
+
+    Only the index is decoded when the file is opened. Counts, the members
+    of one group or the edges of one label are read by decompressing their
+    section alone.
+    '''
+    MAGIC = b'AQRS'
+    FORMAT_VERSION = 1
+    HEADER = struct.Struct('<4sIQ')
+    LENGTH = struct.Struct('<I')
+    EXTENSION = 'aqr'
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, index_offset = self.HEADER.unpack_from(self._mmap, 0)
+        if magic != self.MAGIC or version != self.FORMAT_VERSION:
+            self.close()
+            raise ValueError(f"{path} is not a valid result file")
+
+        self.index = self._read(index_offset)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    @classmethod
+    def write(cls, path, graph):
+        '''
+        Write the grouped `graph` to `path`. The file is written next to its
+        destination and moved in place so readers never see a partial file.
+        '''
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+
+        with open(tmp_path, 'wb') as file:
+            file.write(cls.HEADER.pack(cls.MAGIC, cls.FORMAT_VERSION, 0))
+
+            def write_section(value):
+                offset = file.tell()
+                data = zlib.compress(json.dumps(value).encode('utf-8'))
+                file.write(cls.LENGTH.pack(len(data)))
+                file.write(data)
+                return offset
+
+            nodes = []
+            groups = {}
+            member_count = 0
+            for node in graph['nodes']:
+                data = node['data']
+                members = data.get('nodes')
+                if members is None:
+                    nodes.append(node)
+                    continue
+                nodes.append({'data': {key: value for key, value in data.items() if key != 'nodes'}})
+                groups[data['id']] = [write_section(members), len(members)]
+                member_count += len(members)
+
+            edges_by_label = {}
+            for edge in graph['edges']:
+                edges_by_label.setdefault(edge['data']['label'], []).append(edge)
+
+            index = {
+                'node_count': len(nodes),
+                'edge_count': len(graph['edges']),
+                'member_count': member_count,
+                'nodes': write_section(nodes),
+                'groups': groups,
+                'edges': {label: [write_section(edges), len(edges)]
+                          for label, edges in edges_by_label.items()}
+            }
+
+            index_offset = write_section(index)
+            file.seek(0)
+            file.write(cls.HEADER.pack(cls.MAGIC, cls.FORMAT_VERSION, index_offset))
+
+        os.replace(tmp_path, path)
+
+    def _read(self, offset):
+        (length,) = self.LENGTH.unpack_from(self._mmap, offset)
+        start = offset + self.LENGTH.size
+        return json.loads(zlib.decompress(self._mmap[start:start + length]))
+
+    def counts(self):
+        return {
+            'node_count': self.index['node_count'],
+            'edge_count': self.index['edge_count'],
+            'member_count': self.index['member_count'],
+            'edge_count_by_label': {label: count for label, (_, count) in self.index['edges'].items()}
+        }
+
+    def labels(self):
+        return list(self.index['edges'].keys())
+
+    def nodes(self):
+        '''
+        The nodes of the graph, grouped nodes without their members.
+        '''
+        return self._read(self.index['nodes'])
+
+    def members(self, group_id):
+        '''
+        The members of one grouped node, None if there is no such group.
+        '''
+        group = self.index['groups'].get(group_id)
+        if group is None:
+            return None
+        return self._read(group[0])
+
+    def member_count(self, group_id):
+        group = self.index['groups'].get(group_id)
+        return None if group is None else group[1]
+
+    def edges(self, label=None):
+        if label is not None:
+            section = self.index['edges'].get(label)
+            return [] if section is None else self._read(section[0])
+
+        edges = []
+        for offset, _ in self.index['edges'].values():
+            edges.extend(self._read(offset))
+        return edges
+
+    def to_graph(self):
+        nodes = self.nodes()
+        for node in nodes:
+            members = self.members(node['data']['id'])
+            if members is not None:
+                node['data']['nodes'] = members
+        return {'nodes': nodes, 'edges': self.edges()}
+
+    def close(self):
+        self._mmap.close()
+        self._file.close()
+
+def read_result_graph(path):
+    '''
+    Load a stored grouped graph, either a result file or a JSON file
+    written before result files were introduced.
+    '''
+    if path.endswith('.json'):
+        with open(path, 'r') as file:
+            return json.load(file)
+
+    with ResultFile(path) as result:
+        return result.to_graph()
@@ -0,0 +1,64 @@
+def as_list(value):
+    return value if isinstance(value, list) else [value]
+
+class SchemaAdjacency:
+    '''
+    Adjacency of the node types of one species, built once from its processed
+    schema (see SchemaManager.process_schema).
+
+    outgoing maps a source type to {edge label: {target type: schema key}},
+    incoming maps a target type to {edge label: {source type: schema key}}.
+    Node types are written with underscores as in the schema keys, e.g.
+    'super_enhancer'.
+    '''
+    def __init__(self, schema):
+        self.outgoing = {}
+        self.incoming = {}
+        # node label -> relations of /relations/<node_label>
+        self.relations = {}
+
+        for key, value in schema.items():
+            if value.get('represented_as') != 'edge' or 'source' not in value or 'target' not in value:
+                continue
+
+            labels = as_list(value.get('output_label') or value.get('input_label'))
+            for label in labels:
+                for source in as_list(value['source']):
+                    for target in as_list(value['target']):
+                        if source is None or target is None:
+                            continue
+                        source_type = source.replace(' ', '_')
+                        target_type = target.replace(' ', '_')
+                        # entries with list endpoints are stored once per combination
+                        if f'{source_type}_{label}_{target_type}' != key:
+                            continue
+                        self.outgoing.setdefault(source_type, {}).setdefault(label, {})[target_type] = key
+                        self.incoming.setdefault(target_type, {}).setdefault(label, {})[source_type] = key
+
+            self.add_relation(key, value)
+
+    def add_relation(self, key, value):
+        '''
+        List the edge under its source and target node label. Endpoints that
+        are lists of node labels are not matched, as before the index.
+        '''
+        relation = {
+            'type': key,
+            'label': value.get('input_label'),
+            'source': value.get('source', ''),
+            'target': value.get('target', '')
+        }
+        node_labels = [label for label in (value['source'], value['target']) if isinstance(label, str)]
+        for node_label in dict.fromkeys(node_labels):
+            self.relations.setdefault(node_label, []).append(relation)
+
+    def relations_for(self, node):
+        return self.relations.get(node.replace('_', ' '), [])
+
+    def edge_key(self, source_type, label, target_type):
+        '''
+        Returns:
+            str: Schema key of the edge `label` from `source_type` to
+            `target_type`, None when the schema has no such edge
+        '''
+        return self.outgoing.get(source_type, {}).get(label, {}).get(target_type)
@@ -1,34 +1,152 @@
+import hashlib
 import json
+import pickle
 from biocypher import BioCypher
 import logging
 import yaml
 import os
 from pathlib import Path
+from app.services.schema_adjacency import SchemaAdjacency
+from app.services.schema_responses import SchemaResponses
 
 # Setup basic logging
 logging.basicConfig(level=logging.DEBUG)
 
+# bump when the state kept in a snapshot or the way it is computed changes
+SNAPSHOT_VERSION = 1
+SNAPSHOT_STATE = ('human_schema', 'fly_schema', 'fly_schema_represetnation', 'schema',
+                  'parent_nodes', 'parent_edges', 'filter_schema', 'schema_list',
+                  'schmea_representation', 'full_schema_representation')
+
 class SchemaManager:
     def __init__(self, schema_config_path: str,
                  biocypher_config_path: str,
                  config_path: str,
-                 fly_schema_config_path: str):
-        self.human_bcy = BioCypher(schema_config_path=schema_config_path, biocypher_config_path=biocypher_config_path)
-        self.fly_bcy = BioCypher(schema_config_path=fly_schema_config_path, biocypher_config_path=biocypher_config_path)
-        self.human_schema = self.process_schema(self.human_bcy._get_ontology_mapping()._extend_schema())
-        self.fly_schema = self.process_schema(self.fly_bcy._get_ontology_mapping()._extend_schema())
-        self.fly_schema_represetnation = self.get_fly_schema_representation(self.fly_bcy._get_ontology_mapping()._extend_schema())
+                 fly_schema_config_path: str,
+                 snapshot_dir: str = None):
+        self.schema_config_path = schema_config_path
+        self.config_path = config_path
+        self.biocypher_config_path = biocypher_config_path
+        self.fly_schema_config_path = fly_schema_config_path
+        self.config_hash = self.get_config_hash()
+        self.snapshot_path = self.get_snapshot_path(snapshot_dir) if snapshot_dir else None
+
+        if not self.load_snapshot():
+            self.build(schema_config_path, biocypher_config_path, fly_schema_config_path)
+            self.save_snapshot()
+
+        self.adjacency = {'human': SchemaAdjacency(self.human_schema),
+                          'fly': SchemaAdjacency(self.fly_schema)}
+        self.version = self.get_version()
+        # schema endpoint bodies, built once for this version of the schema
+        self.responses = SchemaResponses(self)
+
+    def build(self, schema_config_path, biocypher_config_path, fly_schema_config_path):
+        human_bcy = BioCypher(schema_config_path=schema_config_path, biocypher_config_path=biocypher_config_path)
+        fly_bcy = BioCypher(schema_config_path=fly_schema_config_path, biocypher_config_path=biocypher_config_path)
+        fly_extended_schema = fly_bcy._get_ontology_mapping()._extend_schema()
+        self.human_schema = self.process_schema(human_bcy._get_ontology_mapping()._extend_schema())
+        self.fly_schema = self.process_schema(fly_extended_schema)
+        self.fly_schema_represetnation = self.get_fly_schema_representation(fly_extended_schema)
         self.schema = self.merge_schema(self.human_schema, self.fly_schema)
         self.parent_nodes =self.parent_nodes()
         self.parent_edges =self.parent_edges()
-        self.graph_info = self.get_graph_info()
         self.filter_schema = self.filter_schema(self.schema)
-        self.config_path = config_path
         self.schema_list = self.get_schema_list()
-        self.biocypher_config_path = biocypher_config_path
         self.schmea_representation = self.get_schema_represnetion_per_source(self.schema_list)
         self.full_schema_representation = self.get_merged_schema_represntation(self.schmea_representation, self.fly_schema_represetnation)
 
+    def get_config_files(self):
+        return [self.schema_config_path, self.biocypher_config_path, self.fly_schema_config_path] + \
+            [os.path.join(self.config_path, file) for file in sorted(os.listdir(self.config_path))]
+
+    def get_config_hash(self):
+        '''
+        Digest of the snapshot format and of the content of every config file
+        the schema is built from, read again on every call.
+        '''
+        digest = hashlib.sha256(f'{SNAPSHOT_VERSION}'.encode('utf-8'))
+        for file_path in self.get_config_files():
+            digest.update(os.path.basename(file_path).encode('utf-8'))
+            with open(file_path, 'rb') as file:
+                digest.update(hashlib.sha256(file.read()).digest())
+        return digest.hexdigest()[:16]
+
+    def get_snapshot_path(self, snapshot_dir):
+        return os.path.join(snapshot_dir, f'schema_{self.config_hash}.pickle')
+
+    def load_snapshot(self):
+        '''
+        Restore the computed schema from the snapshot of the current config
+        files.
+
+        Returns:
+            bool: Whether the snapshot was loaded, False when there is none
+            or it can not be read and the schema has to be built
+        '''
+        if self.snapshot_path is None or not os.path.exists(self.snapshot_path):
+            return False
+
+        try:
+            with open(self.snapshot_path, 'rb') as file:
+                snapshot = pickle.load(file)
+            if snapshot.get('version') != SNAPSHOT_VERSION:
+                return False
+            for name in SNAPSHOT_STATE:
+                setattr(self, name, snapshot['state'][name])
+        except Exception as e:
+            logging.warning(f"Ignoring schema snapshot {self.snapshot_path}: {e}")
+            return False
+
+        logging.info(f"Loaded schema snapshot {self.snapshot_path}")
+        return True
+
+    def save_snapshot(self):
+        '''
+        Write the computed schema to the snapshot of the current config files
+        and remove the snapshots of older configs.
+
+        How it works:
+            The snapshot is written to a temporary file first and moved in
+            place, processes starting at the same time never read a partial
+            snapshot and the last one to finish wins.
+        '''
+        if self.snapshot_path is None:
+            return
+
+        snapshot_dir = os.path.dirname(self.snapshot_path)
+        snapshot = {
+            'version': SNAPSHOT_VERSION,
+            'state': {name: getattr(self, name) for name in SNAPSHOT_STATE}
+        }
+
+        try:
+            os.makedirs(snapshot_dir, exist_ok=True)
+            tmp_path = f'{self.snapshot_path}.{os.getpid()}.tmp'
+            with open(tmp_path, 'wb') as file:
+                pickle.dump(snapshot, file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self.snapshot_path)
+
+            for file in os.listdir(snapshot_dir):
+                file_path = os.path.join(snapshot_dir, file)
+                if file.startswith('schema_') and file.endswith('.pickle') and file_path != self.snapshot_path:
+                    os.remove(file_path)
+        except OSError as e:
+            logging.warning(f"Could not write schema snapshot {self.snapshot_path}: {e}")
+
+    def get_version(self):
+        '''
+        Digest of everything the schema endpoints are built from, it changes
+        whenever the loaded schema does.
+        '''
+        content = json.dumps({
+            'schema': self.schema,
+            'schema_list': self.schema_list,
+            'schema_representation': self.schmea_representation,
+            'fly_schema_representation': self.fly_schema_represetnation
+        }, sort_keys=True, default=str)
+        return hashlib.sha256(content.encode('utf-8')).hexdigest()[:16]
+
     def get_merged_schema_represntation(self, human_schema_representation, fly_schema_representation):
         full_schema_representation = {"human": {"nodes": {}, "edges": {}}, "fly": {"nodes": {}, "edges": {}}}
         
@@ -366,31 +484,10 @@ class SchemaManager:
         return [{'child_edges': edges[key], 'parent_edge': key} for key in edges]
 
     def get_relations_for_node(self, node, specieds='human'):
-        if specieds == 'human':
-            schema = self.human_schema
-        elif specieds == 'fly':
-            schema = self.fly_schema
-        else:
+        if specieds not in self.adjacency:
             raise ValueError("Invalid species specified. Use 'human' or 'fly'.")
 
-        return self.get_relations_for_nodes_specied(node, schema)
-
-    def get_relations_for_nodes_specied(self, node, schema):
-        relations = []
-        node_label = node.replace('_', ' ')
-        for key, value in schema.items():
-            if value['represented_as'] == 'edge':
-                if 'source' in value and 'target' in value:
-                    if value['source'] == node_label or value['target'] == node_label:
-                        label = value.get('output_lable', value['input_label'])
-                        relation = {
-                            'type': key,
-                            'label': label,
-                            'source': value.get('source', ''),
-                            'target': value.get('target', '')
-                        }
-                        relations.append(relation)
-        return relations
+        return self.adjacency[specieds].relations_for(node)
 
     def get_schema():
         with open('schema_config.yaml', 'r') as file:
@@ -409,11 +506,3 @@ class SchemaManager:
                 }
 
         return schema
-
-    def get_graph_info(self, file_path='./Data/graph_info.json'):
-        try:
-            with open(file_path, 'r') as file:
-                graph_info = json.load(file)
-                return graph_info
-        except Exception as e:
-            return {"error": str(e)}
@@ -0,0 +1,85 @@
+import logging
+import threading
+
+class ReloadableSchema:
+    '''
+    Holds the current SchemaManager and replaces it when the schema configs
+    change, without restarting the process.
+
+    How it works:
+        Attribute access is forwarded to the current manager, so code using
+        `schema_manager.<attribute>` keeps working. A watcher thread compares
+        the hash of the config files with the one the current manager was
+        built from every `interval` seconds. On a change a new manager is
+        built by `factory` in that thread, while requests are served by the
+        old one, and swapped in with a single assignment. Everything derived
+        from the schema (responses, adjacency index, ETags) belongs to the
+        manager or is keyed by its version, and is replaced with it.
+        Annotations being processed keep the manager they already read.
+        When a build fails the hash of its configs is remembered and not
+        built again until the configs change once more.
+
+    Args:
+        factory (callable): Builds a SchemaManager from the current configs
+        interval (int): Seconds between checks, 0 disables the watcher
+    '''
+    def __init__(self, factory, interval=0):
+        self.factory = factory
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.failed_hash = None
+        self.current = factory()
+
+    def __getattr__(self, name):
+        # only called for attributes the holder itself does not have
+        if name == 'current':
+            raise AttributeError(name)
+        return getattr(self.current, name)
+
+    def reload(self):
+        '''
+        Build a new SchemaManager and swap it in, the current one is kept
+        when the build fails.
+
+        Returns:
+            bool: Whether the schema was replaced
+        '''
+        with self.lock:
+            previous = self.current
+            try:
+                schema_manager = self.factory()
+            except Exception as e:
+                logging.error(f"Schema reload failed, keeping version {previous.version}: {e}", exc_info=True)
+                return False
+            self.current = schema_manager
+
+        logging.info(f"Reloaded schema version {previous.version} -> {schema_manager.version}")
+        return True
+
+    def reload_if_changed(self):
+        try:
+            config_hash = self.current.get_config_hash()
+        except OSError as e:
+            logging.warning(f"Could not read the schema configs: {e}")
+            return False
+
+        if config_hash in (self.current.config_hash, self.failed_hash):
+            return False
+
+        replaced = self.reload()
+        self.failed_hash = None if replaced else config_hash
+        return replaced
+
+    def watch(self):
+        if self.interval <= 0:
+            return
+
+        def run():
+            while not self.stop_event.wait(self.interval):
+                self.reload_if_changed()
+
+        threading.Thread(target=run, name='schema-reload', daemon=True).start()
+
+    def stop(self):
+        self.stop_event.set()
@@ -0,0 +1,207 @@
+import threading
+from app.constants import Species, form_fields
+from app.serialization import dumps, make_etag
+
+def flatten_edges(value):
+    sources = value['source'] if isinstance(value['source'], list) else [value['source']]
+    targets = value['target'] if isinstance(value['target'], list) else [value['target']]
+    label = value.get('input_label') or value.get('output_label') or 'unknown'
+
+    return [
+        {'data': {
+            'source': src,
+            'target': tgt,
+            'possible_connection': [label]
+            }
+        for src in sources
+        for tgt in targets
+        }
+    ]
+
+def schema_node(node):
+    return {
+        'data': {
+            'name': node['label'],
+            'properites': [property for property in node['properties'].keys()]
+        }
+    }
+
+# bound on the responses kept, /schema accepts any combination of sources
+MAX_CACHED_RESPONSES = 256
+
+class SchemaResponses:
+    '''
+    Bodies of the schema endpoints, serialized once per schema version.
+
+    /preference-option and the /schema of every single data source are
+    built when the schema is loaded, other (species, data sources)
+    combinations the first time they are requested. A body never changes
+    for a schema version, the version is part of its ETag and a new schema
+    comes with new responses.
+    '''
+    def __init__(self, schema_manager):
+        self.schema_manager = schema_manager
+        self.version = schema_manager.version
+        self.cache = {}
+        self.lock = threading.Lock()
+
+        self.preference_option()
+        for source in schema_manager.schema_list:
+            self.schema('human', [source['name']])
+        self.schema('fly', 'all')
+
+    def _cached(self, key, build):
+        entry = self.cache.get(key)
+        if entry is None:
+            body = dumps(build())
+            entry = (body, make_etag(self.version, *key))
+            with self.lock:
+                if len(self.cache) < MAX_CACHED_RESPONSES:
+                    entry = self.cache.setdefault(key, entry)
+        return entry
+
+    def schema_by_source(self, species, query_string):
+        '''
+        The nodes and edges of the requested data sources, or of every fly
+        source when `query_string` is 'all'. Nodes are kept once per label.
+        '''
+        response = {'schema': {'nodes': [], 'edges': []}}
+        seen_nodes = set()
+
+        def add_node(node):
+            name = node['label'].strip().lower()
+            if name not in seen_nodes:
+                seen_nodes.add(name)
+                response['schema']['nodes'].append(schema_node(node))
+
+        if species == 'human':
+            schema = self.schema_manager.schmea_representation
+        else:
+            schema = self.schema_manager.fly_schema_represetnation
+
+        if query_string == 'all' and species == 'fly':
+            for value in schema['nodes'].values():
+                response['schema']['nodes'].append(schema_node(value))
+
+            # edges between the same nodes are merged into one
+            edges_by_ends = {}
+            for value in schema['edges'].values():
+                ends = (value['source'], value['target'])
+                matches = None
+                if not any(isinstance(end, list) for end in ends):
+                    matches = edges_by_ends.get(ends)
+
+                if matches:
+                    label = value.get('input_label') or value.get('output_label') or 'unknown'
+                    for edge in matches:
+                        edge['data']['possible_connection'].append(label)
+                    continue
+
+                for flat_edge in flatten_edges(value):
+                    flat_ends = (flat_edge['data']['source'], flat_edge['data']['target'])
+                    edges_by_ends.setdefault(flat_ends, []).append(flat_edge)
+                    response['schema']['edges'].append(flat_edge)
+            return response
+
+        for schema_type in query_string:
+            source = schema_type.upper()
+            sub_schema = schema.get(source, None)
+
+            if sub_schema is None:
+                continue
+
+            for _, values in sub_schema['edges'].items():
+                edge_key = values.get('input_label') or values.get('output_label')
+                edge = sub_schema['edges'][edge_key]
+                response['schema']['edges'].append({'data': {
+                    "possible_connection": [edge.get('output_label') or edge.get('input_label')],
+                    "source": edge.get('source'),
+                    "target": edge.get('target')
+                }})
+                add_node(schema[source]['nodes'][edge['source']])
+                add_node(schema[source]['nodes'][edge['target']])
+
+            if len(response['schema']['edges']) == 0:
+                for node in sub_schema['nodes'].values():
+                    seen_nodes.add(node['label'].strip().lower())
+                    response['schema']['nodes'].append({
+                        'data': {
+                            'name': node['label'],
+                            'properties': [property for property in node['properties'].keys()]
+                        }
+                    })
+
+        return response
+
+    def build_preference_option(self):
+        response = {
+            'species': [specie.value for specie in Species],
+            'sources': {
+                'human': [],
+                'fly': []
+            }
+        }
+
+        for source in self.schema_manager.schema_list:
+            if source['id'] not in ['polyphen-2', 'bgee']:
+                sch = self.schema_by_source('human', [source['name']])
+                response['sources']['human'].append({
+                    'id': source['id'],
+                    'name': source['name'],
+                    'url': source['url'],
+                    'schema': sch['schema']
+                })
+
+        response['sources']['fly'].append({
+            'id': 'flyall',
+            'name': 'all',
+            'schema': self.schema_by_source('fly', 'all')
+        })
+        return response
+
+    def build_schema(self, species, data_source):
+        schemas = self.schema_by_source(species, data_source)
+        response = {'nodes': [], 'edges': []}
+
+        for node in schemas['schema']['nodes']:
+            label = node['data']['name']
+            response['nodes'].append({
+                'id': label,
+                'name': label,
+                'inputs': form_fields.get(label, [])
+            })
+
+        # ids are derived from the edge so they are the same on every call
+        edge_ids = set()
+        for edge in schemas['schema']['edges']:
+            source = edge['data']['source']
+            target = edge['data']['target']
+            for possible_connection in edge['data']['possible_connection']:
+                edge_id = f'{source}_{possible_connection}_{target}'
+                if edge_id in edge_ids:
+                    edge_id = f'{edge_id}_{len(response["edges"])}'
+                edge_ids.add(edge_id)
+                response['edges'].append({
+                    'id': edge_id,
+                    'source': source,
+                    'target': target,
+                    'label': possible_connection
+                })
+
+        return response
+
+    def preference_option(self):
+        '''
+        Returns:
+            tuple: (JSON bytes, ETag) of /preference-option
+        '''
+        return self._cached(('preference-option',), self.build_preference_option)
+
+    def schema(self, species, data_source):
+        '''
+        Returns:
+            tuple: (JSON bytes, ETag) of /schema for the species and data sources
+        '''
+        key_sources = data_source if isinstance(data_source, str) else tuple(data_source)
+        return self._cached(('schema', species, key_sources),
+                            lambda: self.build_schema(species, data_source))
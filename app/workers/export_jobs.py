@@ -0,0 +1,405 @@
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from app import app, db_instance, schema_manager, socketio, graph_cache, redis_client, result_store
+from app.constants import TaskStatus, EXPORT_WORKERS, EXPORT_LEASE
+from app.lib import convert_to_csv
+from app.lib.export import stream_tsv_zip, stream_columnar_zip, split_by_label, \
+    EXPORT_FORMATS, export_key
+from app.serialization import dumps, loads
+from app.workers.task_handler import load_full_result, save_full_result
+
+# names clients used for a format before, the Excel export was called xls
+FORMAT_ALIASES = {
+    'xls': 'xlsx'
+}
+
+def normalize_format(file_format):
+    return FORMAT_ALIASES.get(file_format, file_format)
+
+def get_result_version(annotation):
+    '''
+    Identify the stored result of an annotation. generate_result sets a new
+    result_version every time the result is written, annotations stored
+    before that fall back to the modification time of their local result file.
+    '''
+    if getattr(annotation, 'result_version', None):
+        return annotation.result_version
+
+    path_url = getattr(annotation, 'path_url', None)
+    if path_url and os.path.exists(path_url):
+        return str(int(os.path.getmtime(path_url)))
+
+    return 'initial'
+
+def load_result_graph(annotation):
+    graph = graph_cache.get(annotation.id, annotation.path_url)
+    if graph is None:
+        raise FileNotFoundError(f"No stored result for annotation {annotation.id}")
+
+    return graph
+
+def write_chunks(chunks, file_path):
+    with open(file_path, 'wb') as file:
+        for chunk in chunks:
+            file.write(chunk)
+
+def load_or_query_full_result(annotation_id, annotation):
+    '''
+    The ungrouped result stored by generate_result. The query is only run
+    again when that copy is missing or belongs to an older result, the copy
+    is then stored for the next export.
+    '''
+    version = get_result_version(annotation)
+    result = load_full_result(annotation_id, version)
+    if result is not None:
+        return result
+
+    requests = annotation.request
+    graph_components = {
+        "nodes": requests['nodes'], "predicates": requests['predicates'],
+        'properties': True}
+
+    response_data = db_instance.run_query(annotation.query, None, annotation.species or 'human')
+    result = db_instance.parse_and_serialize(
+        response_data, schema_manager.full_schema_representation, graph_components, 'graph')
+
+    save_full_result(annotation_id, result, version)
+    return result
+
+def write_full_data_xlsx(annotation, file_path, report):
+    report('loading', 10)
+    result = load_or_query_full_result(annotation.id, annotation)
+
+    report('writing', 50)
+    species = annotation.species or 'human'
+    convert_to_csv(split_by_label(result), file_path=file_path,
+                   schema=schema_manager.full_schema_representation.get(species))
+
+def write_tsv(annotation, file_path, report):
+    report('loading', 10)
+    graph = load_result_graph(annotation)
+    report('writing', 30)
+    write_chunks(stream_tsv_zip(graph), file_path)
+
+def write_parquet(annotation, file_path, report):
+    report('loading', 10)
+    graph = load_result_graph(annotation)
+    report('writing', 30)
+    write_chunks(stream_columnar_zip(graph, 'parquet'), file_path)
+
+WRITERS = {
+    'xlsx': write_full_data_xlsx,
+    'tsv': write_tsv,
+    'parquet': write_parquet
+}
+
+class ExportJob:
+    '''
+    One export of an annotation result, identified by
+    (annotation id, format, result version). The artifact is kept in the
+    result store under `file_name`, so any replica can serve it.
+    '''
+    def __init__(self, annotation_id, file_format, version, host_url):
+        self.annotation_id = str(annotation_id)
+        self.file_format = file_format
+        self.version = version
+        self.key = f'export:{self.annotation_id}:{file_format}:{version}'
+        self.file_name = export_key(self.annotation_id, file_format, version)
+        self.link = f'{host_url}public/{self.file_name}'
+        self.status = TaskStatus.PENDING.value
+        self.stage = 'queued'
+        self.progress = 0
+        self.error = None
+        self.done = threading.Event()
+        self.callbacks = []
+        self.lock = threading.Lock()
+
+    def state(self):
+        return {'status': self.status, 'stage': self.stage, 'progress': self.progress, 'error': self.error}
+
+    def to_dict(self):
+        self.refresh()
+        response = {
+            'annotation_id': self.annotation_id,
+            'format': self.file_format,
+            'status': self.status,
+            'stage': self.stage,
+            'progress': self.progress
+        }
+        if self.status == TaskStatus.COMPLETE.value:
+            response['link'] = self.link
+        if self.error:
+            response['error'] = self.error
+        return response
+
+    def refresh(self):
+        pass
+
+    def add_callback(self, callback):
+        with self.lock:
+            if not self.done.is_set():
+                self.callbacks.append(callback)
+                return
+        callback(self)
+
+    def finish(self, status, error=None):
+        with self.lock:
+            if self.done.is_set():
+                return
+            self.status = status
+            self.error = error
+            if status == TaskStatus.COMPLETE.value:
+                self.stage, self.progress = 'complete', 100
+            else:
+                self.stage = 'failed'
+            self.done.set()
+            callbacks, self.callbacks = self.callbacks, []
+
+        for callback in callbacks:
+            try:
+                with app.app_context():
+                    callback(self)
+            except Exception as e:
+                logging.error(f"Error running export callback of {self.annotation_id}: {e}", exc_info=True)
+
+    def wait(self, timeout=None):
+        return self.done.wait(timeout)
+
+class RemoteExportJob(ExportJob):
+    '''
+    An export run by another process, followed through the state its
+    worker publishes in redis. The export failed when the state is gone
+    without the artifact, e.g. because that worker stopped.
+    '''
+    poll_interval = 1
+
+    def __init__(self, annotation_id, file_format, version, host_url, redis, store):
+        super().__init__(annotation_id, file_format, version, host_url)
+        self.redis = redis
+        self.store = store
+        self.following = False
+
+    def refresh(self):
+        if self.done.is_set():
+            return
+
+        state = self.redis.get(self.key)
+        if state is None:
+            if self.store.exists(self.file_name):
+                self.finish(TaskStatus.COMPLETE.value)
+            else:
+                self.finish(TaskStatus.FAILED.value, 'The export was interrupted')
+            return
+
+        state = loads(state)
+        if state['status'] == TaskStatus.COMPLETE.value:
+            self.finish(TaskStatus.COMPLETE.value)
+        elif state['status'] == TaskStatus.FAILED.value:
+            self.finish(TaskStatus.FAILED.value, state.get('error'))
+        else:
+            self.status, self.stage, self.progress = state['status'], state['stage'], state['progress']
+
+    def wait(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            self.refresh()
+            if self.done.is_set():
+                return True
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return False
+            self.done.wait(self.poll_interval if remaining is None else min(self.poll_interval, remaining))
+
+    def add_callback(self, callback):
+        super().add_callback(callback)
+        with self.lock:
+            if self.done.is_set() or self.following:
+                return
+            self.following = True
+        # callbacks run once the other process is done
+        threading.Thread(target=self.wait, name='export-follower', daemon=True).start()
+
+class ExportJobManager:
+    '''
+    Runs annotation exports on a bounded pool of worker threads.
+
+    Requests for an export that is already queued or running attach to the
+    existing job instead of starting another one, and a finished artifact is
+    served again until the annotation result changes (its result version).
+    Progress is emitted as 'export' events to the annotation's socket room.
+
+    How it works:
+        Jobs are claimed in redis with SET NX on the job key, so one process
+        of all the workers and replicas runs each export. The owner publishes
+        the state of the job under that key and renews it every
+        EXPORT_LEASE / 3 seconds. Other processes follow the job through a
+        RemoteExportJob. A failed export releases the key so the next
+        request starts it again.
+
+        Only running jobs and the latest `max_failed` failures are kept in
+        memory, the artifacts in the result store answer every other request.
+    '''
+    def __init__(self, redis, store, max_workers=EXPORT_WORKERS, lease=EXPORT_LEASE, max_failed=100):
+        self.redis = redis
+        self.store = store
+        self.lease = lease
+        self.max_failed = max_failed
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='export')
+        # jobs still running, finished artifacts are found in the store
+        self.jobs = {}
+        # the latest failures, so status requests can report their error
+        self.failed = OrderedDict()
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def job_key(job):
+        return (job.annotation_id, job.file_format, job.version)
+
+    def lookup(self, key):
+        with self.lock:
+            return self.jobs.get(key) or self.failed.get(key)
+
+    def track(self, job, owner=False):
+        '''
+        Keep a running job. Unless this process runs it (`owner`), a job
+        already tracked for the same export is returned instead. Jobs of
+        older versions of the result are dropped.
+        '''
+        key = self.job_key(job)
+        with self.lock:
+            for old_key in [k for k in (*self.jobs, *self.failed) if k[:2] == key[:2] and k != key]:
+                self.jobs.pop(old_key, None)
+                self.failed.pop(old_key, None)
+
+            self.failed.pop(key, None)
+            current = self.jobs.get(key)
+            if current is not None and not current.done.is_set() and not owner:
+                return current
+            self.jobs[key] = job
+            return job
+
+    def forget(self, job):
+        '''
+        Stop tracking a finished job, failures are kept for a while.
+        '''
+        key = self.job_key(job)
+        with self.lock:
+            if self.jobs.get(key) is job:
+                self.jobs.pop(key)
+            if job.status == TaskStatus.FAILED.value:
+                self.failed[key] = job
+                self.failed.move_to_end(key)
+                while len(self.failed) > self.max_failed:
+                    self.failed.popitem(last=False)
+
+    def refresh(self, job):
+        job.refresh()
+        if job.done.is_set():
+            self.forget(job)
+
+    def submit(self, annotation_id, annotation, file_format, host_url, on_complete=None):
+        file_format = normalize_format(file_format)
+        if file_format not in EXPORT_FORMATS:
+            raise ValueError(f"Unsupported export format {file_format}")
+
+        version = get_result_version(annotation)
+        job = self.lookup((str(annotation_id), file_format, version))
+        if job is not None:
+            self.refresh(job)
+
+        # the store and redis are only called outside the lock
+        if job is None or job.status == TaskStatus.FAILED.value:
+            job = ExportJob(annotation_id, file_format, version, host_url)
+
+            if self.store.exists(job.file_name):
+                job.finish(TaskStatus.COMPLETE.value)
+            elif self.claim(job):
+                self.track(job, owner=True)
+                self.executor.submit(self.run, job, annotation)
+            else:
+                job = RemoteExportJob(annotation_id, file_format, version, host_url,
+                                      self.redis, self.store)
+                job.refresh()
+                job = self.track(job) if not job.done.is_set() else job
+
+        if on_complete:
+            job.add_callback(on_complete)
+
+        return job
+
+    def get(self, annotation_id, annotation, file_format, host_url):
+        file_format = normalize_format(file_format)
+        version = get_result_version(annotation)
+
+        job = self.lookup((str(annotation_id), file_format, version))
+        if job is None:
+            job = ExportJob(annotation_id, file_format, version, host_url)
+            if self.store.exists(job.file_name):
+                # artifacts written before a restart or by another replica
+                job.finish(TaskStatus.COMPLETE.value)
+                return job
+            if self.redis.get(job.key) is None:
+                return None
+            # running in another process
+            job = self.track(RemoteExportJob(annotation_id, file_format, version, host_url,
+                                             self.redis, self.store))
+
+        self.refresh(job)
+        return job
+
+    def claim(self, job):
+        return bool(self.redis.set(job.key, dumps(job.state()), nx=True, ex=self.lease))
+
+    def publish(self, job):
+        self.redis.set(job.key, dumps(job.state()), ex=self.lease)
+
+    def heartbeat(self, job):
+        # keeps the claim alive while the writer runs, it expires if this process stops
+        while not job.done.wait(self.lease / 3):
+            try:
+                with job.lock:
+                    if not job.done.is_set():
+                        self.publish(job)
+            except Exception as e:
+                logging.error(f"Error renewing the export of {job.annotation_id}: {e}")
+
+    def emit(self, job):
+        socketio.emit('export', job.to_dict(), to=job.annotation_id)
+
+    def run(self, job, annotation):
+        def report(stage, progress):
+            job.stage, job.progress = stage, progress
+            self.publish(job)
+            self.emit(job)
+
+        threading.Thread(target=self.heartbeat, args=(job,), name='export-heartbeat', daemon=True).start()
+
+        # written in the cache directory and moved in place once stored,
+        # the name keeps the extension the writers expect
+        tmp_path = self.store.local_path(f'.partial-{job.file_name}')
+        try:
+            report('running', 0)
+            WRITERS[job.file_format](annotation, tmp_path, report)
+            self.store.put(job.file_name, tmp_path)
+            # the artifacts of previous results are deleted with their result,
+            # see remove_result, local copies are dropped here
+            self.store.prune_local(job.file_name)
+            job.finish(TaskStatus.COMPLETE.value)
+            self.publish(job)
+            self.forget(job)
+        except Exception as e:
+            logging.error(f"Error exporting {job.file_format} of annotation {job.annotation_id}: {e}",
+                          exc_info=True)
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            job.finish(TaskStatus.FAILED.value, 'Error generating the file')
+            self.redis.delete(job.key)
+            self.forget(job)
+
+        self.emit(job)
+
+export_jobs = ExportJobManager(redis_client, result_store)
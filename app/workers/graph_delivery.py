@@ -0,0 +1,86 @@
+import gzip
+import logging
+import os
+from app import socketio, result_store
+from app.serialization import dumps, pack_compact, msgpack
+from app.services.graph_payload import payload_key
+
+# size of the binary frames a graph is split into
+GRAPH_FRAME_SIZE = int(os.getenv('GRAPH_FRAME_SIZE', 256 * 1024))
+
+def delivery_formats():
+    return ['json', 'msgpack'] if msgpack is not None else ['json']
+
+def graph_room(annotation_id, wire_format):
+    '''
+    Room of the clients that asked for the graph of an annotation to be
+    pushed to them in `wire_format`.
+    '''
+    return f'{annotation_id}:graph:{wire_format}'
+
+def room_has_members(room):
+    return bool(socketio.server.manager.rooms.get('/', {}).get(room))
+
+def encode_graph(graph, wire_format, result_key=None):
+    '''
+    The gzip compressed graph in `wire_format`. The stored payload of the
+    result is used as it is for json.
+    '''
+    if wire_format == 'json' and result_key:
+        file_path = result_store.fetch(payload_key(result_key))
+        if file_path is not None:
+            with open(file_path, 'rb') as file:
+                return file.read()
+
+    graph = {'nodes': graph['nodes'], 'edges': graph['edges']}
+    data = pack_compact(graph) if wire_format == 'msgpack' else dumps(graph)
+    return gzip.compress(data, compresslevel=6)
+
+def iter_frames(annotation_id, wire_format, data, result_key=None, frame_size=None):
+    '''
+    Split the encoded graph into frames. Every frame names the result it
+    belongs to, a client that receives the frames of two results, e.g. the
+    previous result on subscribing and the new one from its room, joins the
+    chunks of each result separately.
+    '''
+    frame_size = frame_size or GRAPH_FRAME_SIZE
+    total = max(1, -(-len(data) // frame_size))
+    for seq in range(total):
+        yield {
+            'annotation_id': str(annotation_id),
+            'result_key': result_key,
+            'format': wire_format,
+            'encoding': 'gzip',
+            'seq': seq,
+            'total': total,
+            'chunk': data[seq * frame_size:(seq + 1) * frame_size]
+        }
+
+def push_graph(annotation_id, graph, result_key=None, to=None, formats=None):
+    '''
+    Send the final graph of an annotation as binary 'graph' frames.
+
+    How it works:
+        The graph is encoded once per format some client subscribed to,
+        compressed and split into frames of GRAPH_FRAME_SIZE bytes. Each
+        frame carries its position (seq, total), clients concatenate the
+        chunks and decompress them once the last one arrived.
+
+    Args:
+        annotation_id: Id of the annotation
+        graph (dict): Grouped graph containing 'nodes' and 'edges'
+        result_key (str): Key of the stored result the graph belongs to
+        to (str): Send to this client only instead of the subscribed rooms
+        formats (list): Formats to send, every available one by default
+    '''
+    for wire_format in formats or delivery_formats():
+        room = to or graph_room(annotation_id, wire_format)
+        if to is None and not room_has_members(room):
+            continue
+
+        try:
+            data = encode_graph(graph, wire_format, result_key)
+            for frame in iter_frames(annotation_id, wire_format, data, result_key):
+                socketio.emit('graph', frame, to=room)
+        except Exception as e:
+            logging.error(f"Error pushing the graph of annotation {annotation_id}: {e}", exc_info=True)
@@ -1,33 +1,44 @@
 from flask import request, Response, g
-from app import app, schema_manager, db_instance, socketio, redis_client, ThreadStopException
+from app import app, schema_manager, db_instance, socketio, redis_client, ThreadStopException, \
+    result_store, graph_cache
 import logging
 import json
 import os
 import threading
 import time
 from app.lib import Graph
+from app.lib.export import EXPORT_FORMATS, export_key
 from app.constants import TaskStatus
 from app.persistence import AnnotationStorageService
+from app.services.result_file import ResultFile
+from app.services.graph_payload import payload_key, write_payload
+from app.serialization import dumps, loads
+from app.workers.graph_delivery import push_graph
 from pathlib import Path
+from nanoid import generate
 import traceback
 
 llm = app.config['llm_handler']
 EXP = os.getenv('REDIS_EXPIRATION', 3600) # expiration time of redis cache
 
-def update_task(annotation_id, graph=None):
+def update_task(annotation_id, graph=None, result_key=None):
     with app.config['annotation_lock']:
         status = TaskStatus.PENDING.value
         # Get the cached data (Handle case where cache is None)
         cache = redis_client.get(str(annotation_id))
 
-        cache = json.loads(cache) if cache else {'graph': None, 'status': status}
+        cache = loads(cache) if cache else {'graph': None, 'status': status}
 
         status = cache['status']
-        # Merge graph updates
-        graph = graph if graph else cache['graph']
+        # Merge graph updates, result_key names the stored result the graph belongs to
+        if graph:
+            graph_cache.invalidate(annotation_id)
+        else:
+            graph = cache['graph']
+            result_key = cache.get('result_key')
         if status == TaskStatus.COMPLETE.value:
-            redis_client.setex(str(annotation_id), EXP, json.dumps({
-                'graph': graph, 'status': TaskStatus.COMPLETE.value
+            redis_client.setex(str(annotation_id), EXP, dumps({
+                'graph': graph, 'status': TaskStatus.COMPLETE.value, 'result_key': result_key
             }))
             AnnotationStorageService.update(annotation_id, {'status': status})
             redis_client.delete(f"{annotation_id}_tasks")
@@ -47,14 +58,14 @@ def update_task(annotation_id, graph=None):
         else:
             status = TaskStatus.COMPLETE.value if task_num >= 4 else TaskStatus.PENDING.value
         if status in [TaskStatus.FAILED.value, TaskStatus.COMPLETE.value] and task_num >= 4:
-            redis_client.setex(str(annotation_id), EXP, json.dumps({
-                'graph': graph, 'status': status
+            redis_client.setex(str(annotation_id), EXP, dumps({
+                'graph': graph, 'status': status, 'result_key': result_key
             }))
             AnnotationStorageService.update(annotation_id, {'status': status})
             redis_client.delete(f"{annotation_id}_tasks")
         elif status == TaskStatus.PENDING.value:
-            redis_client.set(str(annotation_id), json.dumps({
-                'graph': graph, 'status': status
+            redis_client.set(str(annotation_id), dumps({
+                'graph': graph, 'status': status, 'result_key': result_key
             }))
 
         return status
@@ -63,7 +74,7 @@ def get_status(annotation_id):
     with app.config['annotation_lock']:
         cache = redis_client.get(str(annotation_id))
         if cache is not None:
-            cache = json.loads(cache)
+            cache = loads(cache)
             status = cache['status']
             return status
         else:
@@ -73,16 +84,16 @@ def set_status(annotation_id, status):
     with app.config['annotation_lock']:
         cache = redis_client.get(str(annotation_id))
         if cache is not None:
-            cache = json.loads(cache)
+            cache = loads(cache)
             cache['status'] = status
-            redis_client.set(str(annotation_id), json.dumps(cache))
+            redis_client.set(str(annotation_id), dumps(cache))
         else:
-            redis_client.set(str(annotation_id), json.dumps({'graph': None, 'status': status}))
+            redis_client.set(str(annotation_id), dumps({'graph': None, 'status': status}))
 
 def get_annotation_redis(annotation_id):
     cache = redis_client.get(str(annotation_id))
     if cache is not None:
-        cache = json.loads(cache)
+        cache = loads(cache)
         return cache
     else:
         return None
@@ -94,6 +105,72 @@ def reset_status(annotation_id):
 def reset_task(annotation_id):
     redis_client.delete(f"{annotation_id}_tasks")
     redis_client.delete(str(annotation_id))
+    graph_cache.invalidate(annotation_id)
+
+def get_full_result_key(annotation_id, result_version):
+    return f"{annotation_id}-{result_version}.full.json"
+
+def save_full_result(annotation_id, response, result_version):
+    '''
+    Store the ungrouped result of an annotation together with the version
+    of the result it belongs to. Nothing is left in the result store when
+    the write fails.
+    '''
+    key = get_full_result_key(annotation_id, result_version)
+    file_path = result_store.local_path(key)
+    tmp_path = f'{file_path}.{os.getpid()}.{threading.get_ident()}.tmp'
+
+    try:
+        with open(tmp_path, 'wb') as file:
+            file.write(dumps({'version': result_version,
+                              'nodes': response['nodes'],
+                              'edges': response['edges']}))
+        os.replace(tmp_path, file_path)
+        result_store.put(key, file_path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        result_store.delete(key)
+        raise
+
+def load_full_result(annotation_id, result_version):
+    '''
+    Load the stored ungrouped result of an annotation, None if there is
+    none for this version of the result.
+    '''
+    file_path = result_store.fetch(get_full_result_key(annotation_id, result_version))
+    if file_path is None:
+        return None
+
+    with open(file_path, 'rb') as file:
+        return loads(file.read())
+
+def remove_result(annotation_id, annotation):
+    '''
+    Delete a replaced result, or the result of a deleted annotation, from
+    the result store with the payload, the ungrouped result and the exports
+    derived from it.
+
+    Args:
+        annotation_id: Id of the annotation
+        annotation: The annotation as stored before the new result or the
+            delete, its path_url and result_version name the result
+    '''
+    result_key = getattr(annotation, 'path_url', None)
+    result_version = getattr(annotation, 'result_version', None)
+
+    keys = [result_key]
+    if result_key and not os.path.isabs(result_key):
+        keys.append(payload_key(result_key))
+    if result_version:
+        keys.append(get_full_result_key(annotation_id, result_version))
+        keys.extend(export_key(annotation_id, file_format, result_version) for file_format in EXPORT_FORMATS)
+
+    for key in keys:
+        try:
+            result_store.delete(key)
+        except Exception as e:
+            logging.error(f"Error deleting result {key} of annotation {annotation_id}: {e}")
 
 def generate_summary(annotation_id, request, all_status, summary=None):
     result_done, total_count_done, label_count_done = all_status.values()
@@ -119,15 +196,12 @@ def generate_summary(annotation_id, request, all_status, summary=None):
         return
 
     meta_data = AnnotationStorageService.get_by_id(annotation_id)
-    cache = redis_client.get(str(annotation_id))
+    graph = graph_cache.get(annotation_id, meta_data.path_url)
 
-    if cache is not None:
-        cache = json.loads(cache)
-        graph = cache['graph']
-        if graph is not None:
-            response = {'nodes': graph['nodes'], 'edges': graph['edges']}
-        else:
-            response = {'nodes': [], 'edges': []}
+    if graph is not None:
+        response = {'nodes': graph['nodes'], 'edges': graph['edges']}
+    else:
+        response = {'nodes': [], 'edges': []}
 
     response['node_count'] = meta_data.node_count
     response['edge_count'] = meta_data.edge_count
@@ -178,6 +252,7 @@ def generate_result(query_code, annotation_id, requests, result_status, species,
         response = db_instance.parse_and_serialize(
             response_data, schema_manager.full_schema_representation, graph_components, 'graph')
 
+        result_version = generate()
         graph = Graph()
 
         if len(response['edges']) == 0 and len(response['nodes']) > 0:
@@ -185,12 +260,25 @@ def generate_result(query_code, annotation_id, requests, result_status, species,
         else:
             grouped_graph = graph.group_graph(response);
 
-        file_path = Path(__file__).parent /".."/ ".."/ "public" / "graph" / f"{annotation_id}.json"
-
-        with open(file_path, 'w') as file:
-            json.dump(grouped_graph, file)
-
-        AnnotationStorageService.update(annotation_id, {"path_url": str(file_path.resolve())})
+        # results are stored under a key unique to this version of the
+        # result, any replica can fetch it from the shared result store
+        result_key = f"{annotation_id}-{result_version}.{ResultFile.EXTENSION}"
+        file_path = result_store.local_path(result_key)
+        ResultFile.write(file_path, grouped_graph)
+        result_store.put(result_key, file_path)
+
+        # the graph as it is sent to clients, served without re-serializing it
+        graph_key = payload_key(result_key)
+        file_path = result_store.local_path(graph_key)
+        write_payload(file_path, grouped_graph)
+        result_store.put(graph_key, file_path)
+
+        # a new result version invalidates the exports of the previous result
+        previous = AnnotationStorageService.get_by_id(annotation_id)
+        AnnotationStorageService.update(annotation_id, {"path_url": result_key,
+                                                        "result_version": result_version})
+        if previous is not None and previous.path_url != result_key:
+            remove_result(annotation_id, previous)
 
         if status:
             set_status(annotation_id, status);
@@ -198,14 +286,25 @@ def generate_result(query_code, annotation_id, requests, result_status, species,
         status = update_task(annotation_id, {
             'nodes': grouped_graph['nodes'],
             'edges': grouped_graph['edges']
-        })
+        }, result_key)
         socketio.emit('update', {'status': status,
                                  'update': {'graph': True}
                                  },
                       to=str(annotation_id))
 
+        # clients that subscribed to the graph receive it without another request
+        push_graph(annotation_id, grouped_graph, result_key)
+
         result_status.set()
 
+        # keep the ungrouped result, exports are built from it instead of
+        # running the query again. Only exports read it, so it is written
+        # once the graph was delivered.
+        try:
+            save_full_result(annotation_id, response, result_version)
+        except Exception as e:
+            logging.error(f"Error storing the full result of annotation {annotation_id}: {e}")
+
         return grouped_graph
     except ThreadStopException as e:
         set_status(annotation_id, TaskStatus.CANCELLED.value)
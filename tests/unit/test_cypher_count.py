@@ -0,0 +1,53 @@
+from app.services.cypher_generator import CypherQueryGenerator
+
+def node(node_id, node_type, properties=None, id=""):
+    return {"node_id": node_id, "id": id, "type": node_type, "properties": properties or {}}
+
+def count_queries(nodes, predicates):
+    generator = CypherQueryGenerator.__new__(CypherQueryGenerator)
+    requests = {"nodes": nodes, "predicates": predicates}
+    return generator.query_Generator(requests, {n["node_id"]: n for n in nodes})[1:]
+
+def test_unfiltered_label_is_counted_from_the_count_store():
+    total_count, label_count = count_queries([node("n1", "gene")], [])
+
+    assert total_count == "MATCH (n1:gene) RETURN count(n1) AS total_nodes"
+    assert label_count == "MATCH (n1:gene) RETURN count(n1) AS n1_gene"
+
+def test_unfiltered_edge_is_counted_without_collecting_matches():
+    total_count, label_count = count_queries(
+        [node("n1", "gene"), node("n2", "transcript")],
+        [{"type": "transcribed to", "source": "n1", "target": "n2"}])
+
+    assert "COLLECT" not in total_count.upper() and "COLLECT" not in label_count.upper()
+    assert "MATCH (:gene)-[p0:transcribed_to]->(:transcript) RETURN count(p0) AS total_edges" in total_count
+    assert label_count.endswith("RETURN n1_gene, n2_transcript, p0_transcribed_to")
+
+def test_filtered_patterns_are_counted_from_their_matches():
+    for nodes, predicates in (
+            ([node("n1", "gene", {"gene_name": "TP53"})], []),
+            ([node("n1", "gene", id="ENSG00000141510"), node("n2", "transcript")],
+             [{"type": "transcribed to", "source": "n1", "target": "n2"}]),
+            ([node("n1", "gene"), node("n2", "transcript"), node("n3", "protein")],
+             [{"type": "transcribed to", "source": "n1", "target": "n2"},
+              {"type": "translates to", "source": "n2", "target": "n3"}])):
+        total_count, _ = count_queries(nodes, predicates)
+        assert "COLLECT(DISTINCT" in total_count
+
+def test_index_queries_pass_property_values_as_parameters():
+    generator = CypherQueryGenerator.__new__(CypherQueryGenerator)
+
+    query, parameters = generator.relation_query_generator(
+        "go", "protein", "go_gene_product", {"subontology": "it's", "a`b": 1})
+    assert "source.`subontology` = $source_0 AND source.`a``b` = $source_1" in query
+    assert "it's" not in query
+    assert parameters == {"source_0": "it's", "source_1": 1}
+
+    query, parameters = generator.hierarchy_query_generator("go", "subclass_of")
+    assert "WHERE" not in query and parameters == {}
+
+def test_property_stats_aliases_are_not_reserved_words():
+    generator = CypherQueryGenerator.__new__(CypherQueryGenerator)
+    query = generator.property_stats_query_generator("gene", 100)
+
+    assert query.strip().endswith("RETURN key, count(*) AS count, count(DISTINCT n[key]) AS distinct_count")
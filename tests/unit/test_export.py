@@ -0,0 +1,115 @@
+import io
+import zipfile
+import pyarrow as pa
+import pyarrow.parquet as pq
+from app.lib.export import iter_member_edges, stream_tsv_zip, stream_columnar_zip
+
+def grouped_graph():
+    return {
+        "nodes": [
+            {"data": {"id": "p1", "type": "parent", "name": "p1"}},
+            {"data": {"id": "g1", "type": "gene", "name": "gene", "parent": "p1",
+                      "nodes": [{"id": "gene a", "type": "gene", "name": "A"},
+                                {"id": "gene b", "type": "gene", "name": "B"}]}},
+            {"data": {"id": "g2", "type": "transcript", "name": "transcript",
+                      "nodes": [{"id": "transcript t", "type": "transcript", "name": "T"}]}},
+        ],
+        "edges": [
+            {"data": {"id": "e1", "source": "p1", "target": "g2", "label": "transcribed_to",
+                      "edge_id": "gene_transcribed_to_transcript"}},
+            {"data": {"id": "e2", "source": "g1", "target": "g2", "label": "transcribed_to",
+                      "edge_id": "gene_transcribed_to_transcript"}},
+        ]
+    }
+
+def test_parent_edges_are_expanded_to_members_once():
+    edges = list(iter_member_edges(grouped_graph()))
+
+    assert edges == [("gene a", "transcript t", "transcribed_to"),
+                     ("gene b", "transcript t", "transcribed_to")]
+
+def test_stream_tsv_zip_writes_nodes_and_edges():
+    data = b''.join(stream_tsv_zip(grouped_graph(), chunk_size=8))
+
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        nodes = archive.read('nodes.tsv').decode('utf-8').splitlines()
+        edges = archive.read('edges.tsv').decode('utf-8').splitlines()
+
+    assert nodes == ["id\tname\ttype", "gene a\tA\tgene", "gene b\tB\tgene", "transcript t\tT\ttranscript"]
+    assert edges == ["source\tedge\tlabel",
+                     "gene a\ttranscript t\ttranscribed_to",
+                     "gene b\ttranscript t\ttranscribed_to"]
+
+def test_stream_columnar_zip_writes_a_table_per_label():
+    data = b''.join(stream_columnar_zip(grouped_graph(), 'parquet'))
+
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        assert sorted(archive.namelist()) == ['edges/transcribed_to.parquet',
+                                              'nodes/gene.parquet', 'nodes/transcript.parquet']
+        genes = pq.read_table(pa.BufferReader(archive.read('nodes/gene.parquet')))
+        edges = pq.read_table(pa.BufferReader(archive.read('edges/transcribed_to.parquet')))
+
+    assert genes.column('name').to_pylist() == ['A', 'B']
+    assert pa.types.is_dictionary(genes.schema.field('id').type)
+    assert edges.column('source').to_pylist() == ['gene a', 'gene b']
+
+def test_columnar_entry_names_are_unique():
+    graph = {"nodes": [{"data": {"id": f"g{i}", "type": label, "nodes": [{"id": f"n{i}", "type": label}]}}
+                       for i, label in enumerate(["gene:x", "gene/x", "gene_x"])],
+             "edges": []}
+
+    data = b''.join(stream_columnar_zip(graph, 'arrow'))
+
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        assert archive.namelist() == ['nodes/gene_x.arrow', 'nodes/gene_x_2.arrow', 'nodes/gene_x_3.arrow']
+        tables = [pa.ipc.open_file(pa.BufferReader(archive.read(name))).read_all()
+                  for name in archive.namelist()]
+
+    assert [table.column('type').to_pylist() for table in tables] == [['gene:x'], ['gene/x'], ['gene_x']]
+
+def test_convert_to_csv_streams_sheets_with_schema_columns(tmp_path):
+    from openpyxl import load_workbook
+    from app.lib.utils import convert_to_csv
+
+    nodes = {'gene': [{'data': {'id': 'gene a', 'type': 'gene', 'name': 'A',
+                                'synonyms': ['x'], 'start': 5}}]}
+    edges = {'transcribed_to': [{'data': {'source': 'gene a', 'target': 'transcript t',
+                                          'label': 'transcribed_to', 'edge_id': 'e'}}]}
+    schema = {'nodes': {'gene': {'properties': {'gene_name': 'str', 'start': 'int'}}}}
+
+    file_path = convert_to_csv((nodes, edges), file_path=str(tmp_path / 'full.xlsx'), schema=schema)
+
+    workbook = load_workbook(file_path)
+    assert workbook.sheetnames == ['gene', 'gene-relationship-transcript']
+    assert list(workbook['gene'].values) == [
+        ('id', 'type', 'name', 'gene_name', 'start', 'synonyms'),
+        ('gene a', 'gene', 'A', None, 5, '["x"]')
+    ]
+
+def test_tsv_download_follows_share_tokens(monkeypatch, client):
+    import jwt
+    from types import SimpleNamespace
+    from app import routes
+    from app.lib import auth
+
+    secret = 'test-secret'
+    annotation = SimpleNamespace(id='a1', user_id='u1', path_url='a1-v1.aqr')
+    monkeypatch.setenv('SHARED_TOKEN_SECRET', secret)
+    monkeypatch.setattr(auth, 'JWT_SECRET', secret)
+    monkeypatch.setattr(routes.AnnotationStorageService, 'get_by_id', staticmethod(lambda annotation_id: annotation))
+    monkeypatch.setattr(routes.AnnotationStorageService, 'get_user_annotation',
+                        staticmethod(lambda annotation_id, user_id: annotation if user_id == 'u1' else None))
+    share = SimpleNamespace(share_type='public', recipient_user_id=None)
+    monkeypatch.setattr(routes.SharedAnnotationStorageService, 'get', staticmethod(lambda query: share))
+    monkeypatch.setattr(routes.graph_cache, 'get', lambda annotation_id, path_url: grouped_graph())
+
+    headers = {'Authorization': f"Bearer {jwt.encode({'user_id': 'u2'}, secret, algorithm='HS256')}"}
+    share_token = jwt.encode({'user_id': 'u1'}, secret, algorithm='HS256')
+    response = client.get(f'/annotation/a1/download-tsv?token={share_token}', headers=headers)
+
+    assert response.status_code == 200
+    with zipfile.ZipFile(io.BytesIO(response.data)) as archive:
+        assert archive.read('edges.tsv').decode('utf-8').startswith('source\tedge\tlabel')
+
+    monkeypatch.setattr(routes.SharedAnnotationStorageService, 'get', staticmethod(lambda query: None))
+    assert client.get('/annotation/a1/download-tsv', headers=headers).status_code == 401
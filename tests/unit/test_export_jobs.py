@@ -0,0 +1,243 @@
+import threading
+import pytest
+from types import SimpleNamespace
+from app.constants import TaskStatus
+from app.persistence import LocalResultStore, DirectoryResultStore
+from app.workers import export_jobs as export_module
+from app.workers.export_jobs import ExportJobManager, RemoteExportJob
+
+class FakeRedis:
+    def __init__(self):
+        self.values = {}
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.values:
+            return None
+        self.values[key] = value
+        return True
+
+    def delete(self, key):
+        self.values.pop(key, None)
+
+def setup_manager(monkeypatch, tmp_path, writer, redis=None, store=None):
+    monkeypatch.setitem(export_module.WRITERS, 'tsv', writer)
+    monkeypatch.setattr(ExportJobManager, 'emit', lambda self, job: None)
+    return ExportJobManager(redis or FakeRedis(), store or LocalResultStore(str(tmp_path)), max_workers=1)
+
+def test_concurrent_requests_share_one_job(monkeypatch, tmp_path):
+    release = threading.Event()
+    calls = []
+
+    def writer(annotation, file_path, report):
+        calls.append(file_path)
+        release.wait(5)
+        open(file_path, 'w').close()
+
+    manager = setup_manager(monkeypatch, tmp_path, writer)
+    annotation = SimpleNamespace(id='a1', result_version='v1', path_url=None)
+
+    first = manager.submit('a1', annotation, 'tsv', 'http://host/')
+    second = manager.submit('a1', annotation, 'tsv', 'http://host/')
+    release.set()
+    first.wait(5)
+
+    assert first is second
+    assert len(calls) == 1
+    assert first.status == TaskStatus.COMPLETE.value
+    assert first.to_dict()['link'] == 'http://host/public/export-a1-tsv-v1.zip'
+
+def test_artifact_is_reused_until_the_result_changes(monkeypatch, tmp_path):
+    calls = []
+
+    def writer(annotation, file_path, report):
+        calls.append(file_path)
+        open(file_path, 'w').close()
+
+    manager = setup_manager(monkeypatch, tmp_path, writer)
+    annotation = SimpleNamespace(id='a1', result_version='v1', path_url=None)
+    manager.submit('a1', annotation, 'tsv', 'http://host/').wait(5)
+
+    # a fresh manager, e.g. after a restart, reuses the file on disk
+    manager = setup_manager(monkeypatch, tmp_path, writer)
+    assert manager.submit('a1', annotation, 'tsv', 'http://host/').status == TaskStatus.COMPLETE.value
+    assert len(calls) == 1
+
+    annotation.result_version = 'v2'
+    manager.submit('a1', annotation, 'tsv', 'http://host/').wait(5)
+
+    assert len(calls) == 2
+    assert sorted(p.name for p in tmp_path.iterdir()) == ['export-a1-tsv-v2.zip']
+
+def test_full_data_is_only_queried_when_the_stored_copy_is_stale(monkeypatch, tmp_path):
+    from app.workers import task_handler
+
+    monkeypatch.setattr(task_handler, 'result_store', LocalResultStore(str(tmp_path)))
+    queries = []
+
+    class FakeDB:
+        def run_query(self, query, stop_event=None, species='human'):
+            queries.append(query)
+            return []
+
+        def parse_and_serialize(self, input, schema, graph_components, result_type):
+            return {'nodes': [{'data': {'id': 'gene a', 'type': 'gene'}}], 'edges': []}
+
+    monkeypatch.setattr(export_module, 'db_instance', FakeDB())
+    annotation = SimpleNamespace(id='a1', result_version='v1', path_url=None, query='MATCH',
+                                 species='human', request={'nodes': [], 'predicates': []})
+
+    task_handler.save_full_result('a1', {'nodes': [], 'edges': []}, 'v1')
+    assert export_module.load_or_query_full_result('a1', annotation)['nodes'] == []
+    assert queries == []
+
+    annotation.result_version = 'v2'
+    assert len(export_module.load_or_query_full_result('a1', annotation)['nodes']) == 1
+    assert export_module.load_or_query_full_result('a1', annotation)['version'] == 'v2'
+    assert queries == ['MATCH']
+
+def test_failed_full_result_write_leaves_no_file(monkeypatch, tmp_path):
+    from app.workers import task_handler
+
+    monkeypatch.setattr(task_handler, 'result_store', LocalResultStore(str(tmp_path)))
+
+    with pytest.raises(TypeError):
+        task_handler.save_full_result('a1', {'nodes': [object()], 'edges': []}, 'v1')
+    assert list(tmp_path.iterdir()) == []
+    assert task_handler.load_full_result('a1', 'v1') is None
+
+def test_other_processes_follow_the_running_export(monkeypatch, tmp_path):
+    release = threading.Event()
+    calls = []
+
+    def writer(annotation, file_path, report):
+        calls.append(file_path)
+        report('writing', 40)
+        release.wait(5)
+        open(file_path, 'w').close()
+
+    redis = FakeRedis()
+    # two workers sharing redis
+    owner = setup_manager(monkeypatch, tmp_path, writer, redis)
+    other = setup_manager(monkeypatch, tmp_path, writer, redis)
+    annotation = SimpleNamespace(id='a1', result_version='v1', path_url=None)
+
+    owner_job = owner.submit('a1', annotation, 'tsv', 'http://host/')
+    followed = other.submit('a1', annotation, 'tsv', 'http://host/')
+    completed = []
+    followed.add_callback(completed.append)
+
+    assert isinstance(followed, RemoteExportJob)
+    assert followed.wait(0.1) is False
+    release.set()
+    owner_job.wait(5)
+    followed.poll_interval = 0.01
+
+    assert followed.wait(5) is True
+    assert followed.to_dict()['status'] == TaskStatus.COMPLETE.value
+    assert other.get('a1', annotation, 'tsv', 'http://host/').status == TaskStatus.COMPLETE.value
+    assert len(calls) == 1
+
+def test_failed_exports_release_their_claim(monkeypatch, tmp_path):
+    calls = []
+
+    def writer(annotation, file_path, report):
+        calls.append(file_path)
+        if len(calls) == 1:
+            raise ValueError('broken')
+        open(file_path, 'w').close()
+
+    redis = FakeRedis()
+    manager = setup_manager(monkeypatch, tmp_path, writer, redis)
+    annotation = SimpleNamespace(id='a1', result_version='v1', path_url=None)
+
+    failed = manager.submit('a1', annotation, 'tsv', 'http://host/')
+    failed.wait(5)
+    assert failed.status == TaskStatus.FAILED.value
+    assert redis.values == {}
+
+    # another worker starts it again
+    retried = setup_manager(monkeypatch, tmp_path, writer, redis).submit('a1', annotation, 'tsv', 'http://host/')
+    retried.wait(5)
+    assert retried.status == TaskStatus.COMPLETE.value and len(calls) == 2
+
+def test_export_of_a_stopped_worker_fails(monkeypatch, tmp_path):
+    redis = FakeRedis()
+    manager = setup_manager(monkeypatch, tmp_path, lambda *args: None, redis)
+    annotation = SimpleNamespace(id='a1', result_version='v1', path_url=None)
+
+    # claimed by a worker that stopped before publishing a result
+    redis.set('export:a1:tsv:v1', b'{"status": "PENDING", "stage": "running", "progress": 0, "error": null}')
+    job = manager.submit('a1', annotation, 'tsv', 'http://host/')
+    assert job.status == TaskStatus.PENDING.value and not job.done.is_set()
+
+    redis.delete('export:a1:tsv:v1')
+    assert job.wait(1) is True
+    assert job.status == TaskStatus.FAILED.value
+
+def test_xls_is_an_alias_of_xlsx(monkeypatch, tmp_path):
+    calls = []
+
+    def writer(annotation, file_path, report):
+        calls.append(file_path)
+        open(file_path, 'w').close()
+
+    manager = setup_manager(monkeypatch, tmp_path, writer)
+    monkeypatch.setitem(export_module.WRITERS, 'xlsx', writer)
+    annotation = SimpleNamespace(id='a1', result_version='v1', path_url=None)
+
+    job = manager.submit('a1', annotation, 'xls', 'http://host/')
+    job.wait(5)
+
+    assert job.file_format == 'xlsx'
+    assert job.to_dict()['link'] == 'http://host/public/export-a1-xlsx-v1.xlsx'
+    found = manager.get('a1', annotation, 'xls', 'http://host/')
+    assert (found.file_name, found.status) == (job.file_name, TaskStatus.COMPLETE.value)
+    assert len(calls) == 1
+
+def test_artifacts_are_served_by_every_replica(monkeypatch, tmp_path, client):
+    from app import routes
+
+    def writer(annotation, file_path, report):
+        with open(file_path, 'w') as file:
+            file.write('exported')
+
+    shared = str(tmp_path / 'shared')
+    pod_a = DirectoryResultStore(str(tmp_path / 'pod-a'), shared)
+    pod_b = DirectoryResultStore(str(tmp_path / 'pod-b'), shared)
+    annotation = SimpleNamespace(id='a1', result_version='v1', path_url=None)
+
+    job = setup_manager(monkeypatch, tmp_path, writer, store=pod_a).submit('a1', annotation, 'tsv', 'http://host/')
+    job.wait(5)
+
+    # pod b serves the link created on pod a
+    monkeypatch.setattr(routes, 'result_store', pod_b)
+    response = client.get('/public/export-a1-tsv-v1.zip')
+    assert response.status_code == 200 and response.data == b'exported'
+    assert client.get('/public/export-a1-tsv-v2.zip').status_code == 404
+
+def test_finished_jobs_are_not_kept(monkeypatch, tmp_path):
+    def writer(annotation, file_path, report):
+        if annotation.result_version == 'v2':
+            raise ValueError('broken')
+        open(file_path, 'w').close()
+
+    manager = setup_manager(monkeypatch, tmp_path, writer)
+    manager.max_failed = 1
+    annotation = SimpleNamespace(id='a1', result_version='v1', path_url=None)
+
+    manager.submit('a1', annotation, 'tsv', 'http://host/').wait(5)
+    assert manager.jobs == {} and not manager.failed
+    # the artifact in the store answers the status request
+    assert manager.get('a1', annotation, 'tsv', 'http://host/').status == TaskStatus.COMPLETE.value
+
+    annotation.result_version = 'v2'
+    manager.submit('a1', annotation, 'tsv', 'http://host/').wait(5)
+    assert manager.jobs == {} and list(manager.failed) == [('a1', 'tsv', 'v2')]
+    assert manager.get('a1', annotation, 'tsv', 'http://host/').error == 'Error generating the file'
+
+    other = SimpleNamespace(id='a2', result_version='v2', path_url=None)
+    manager.submit('a2', other, 'tsv', 'http://host/').wait(5)
+    assert list(manager.failed) == [('a2', 'tsv', 'v2')]
@@ -0,0 +1,90 @@
+import json
+import threading
+import time
+from app.persistence.result_store import LocalResultStore
+from app.services.graph_cache import GraphCache
+from app.services.result_file import ResultFile
+
+class FakeRedis:
+    def __init__(self):
+        self.values = {}
+
+    def get(self, key):
+        return self.values.get(key)
+
+def graph(name):
+    return {"nodes": [{"data": {"id": name, "type": "gene", "nodes": [{"id": f"gene {name}"}]}}],
+            "edges": []}
+
+def store_result(store, key, value):
+    file_path = store.local_path(key)
+    ResultFile.write(file_path, value)
+    store.put(key, file_path)
+
+def test_tiers_are_read_in_order(tmp_path):
+    redis = FakeRedis()
+    store = LocalResultStore(str(tmp_path))
+    cache = GraphCache(redis, store)
+
+    store_result(store, "a1-v1.aqr", graph("stored"))
+    # redis still holds the graph of the previous result
+    redis.values["a1"] = json.dumps({"graph": graph("old"), "status": "COMPLETE",
+                                     "result_key": "a1-v0.aqr"})
+
+    assert cache.get("a1", "a1-v1.aqr")["nodes"][0]["data"]["id"] == "stored"
+    assert cache.get("a1", "a1-v1.aqr")["nodes"][0]["data"]["id"] == "stored"
+    # without a result key the graph being generated is returned as it is
+    assert cache.get("a1")["nodes"][0]["data"]["id"] == "old"
+    assert cache.get("a2", "a2-v1.aqr") is None
+
+    tiers = cache.stats()["tiers"]
+    assert tiers["memory"] == {"hit": 1, "miss": 2}
+    assert tiers["redis"] == {"hit": 1, "miss": 2}
+    assert tiers["store"] == {"hit": 1, "miss": 1}
+
+def test_concurrent_reads_load_once(tmp_path):
+    loads = []
+
+    class SlowRedis(FakeRedis):
+        def get(self, key):
+            loads.append(key)
+            time.sleep(0.1)
+            return json.dumps({"graph": graph("g"), "status": "COMPLETE", "result_key": "a1-v1.aqr"})
+
+    cache = GraphCache(SlowRedis(), LocalResultStore(str(tmp_path)))
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get("a1", "a1-v1.aqr")))
+               for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert loads == ["a1"]
+    assert len(results) == 5 and all(result["nodes"][0] is results[0]["nodes"][0] for result in results)
+
+def test_callers_get_their_own_lists(tmp_path):
+    cache = GraphCache(FakeRedis(), LocalResultStore(str(tmp_path)))
+    cache.put("a1", "a1-v1.aqr", graph("g"))
+
+    first = cache.get("a1", "a1-v1.aqr")
+    first["nodes"].append({"data": {"id": "extra"}})
+    first["edges"] = None
+
+    second = cache.get("a1", "a1-v1.aqr")
+    assert [node["data"]["id"] for node in second["nodes"]] == ["g"]
+    assert second["edges"] == []
+
+def test_memory_tier_is_size_bounded(tmp_path):
+    cache = GraphCache(FakeRedis(), LocalResultStore(str(tmp_path)), max_size=4)
+
+    cache.put("a1", "a1-v1.aqr", graph("one"))
+    cache.put("a2", "a2-v1.aqr", graph("two"))
+    cache.put("a3", "a3-v1.aqr", graph("three"))
+
+    assert list(cache.entries) == ["a2-v1.aqr", "a3-v1.aqr"]
+    assert cache.stats()["size"] == 4
+
+    cache.invalidate("a3")
+    assert list(cache.entries) == ["a2-v1.aqr"]
+    assert cache.stats()["size"] == 2
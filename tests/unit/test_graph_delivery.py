@@ -0,0 +1,81 @@
+import gzip
+import json
+from app.serialization import unpack_compact
+from app.workers import graph_delivery
+
+GRAPH = {"nodes": [{"data": {"id": f"gene {i}", "type": "gene"}} for i in range(2000)],
+         "edges": []}
+
+def test_graph_is_pushed_in_frames_to_subscribed_rooms(monkeypatch):
+    frames = []
+    monkeypatch.setattr(graph_delivery.socketio, 'emit',
+                        lambda event, frame, to=None: frames.append((event, to, frame)))
+    monkeypatch.setattr(graph_delivery, 'room_has_members', lambda room: room == 'a1:graph:msgpack')
+    monkeypatch.setattr(graph_delivery, 'GRAPH_FRAME_SIZE', 1024)
+
+    graph_delivery.push_graph('a1', GRAPH)
+
+    assert {to for _, to, _ in frames} == {'a1:graph:msgpack'}
+    assert len(frames) > 1
+    assert [frame['seq'] for _, _, frame in frames] == list(range(frames[0][2]['total']))
+
+    data = gzip.decompress(b''.join(frame['chunk'] for _, _, frame in frames))
+    assert unpack_compact(data) == GRAPH
+
+def test_single_client_receives_json_frames(monkeypatch):
+    frames = []
+    monkeypatch.setattr(graph_delivery.socketio, 'emit',
+                        lambda event, frame, to=None: frames.append(frame))
+
+    graph_delivery.push_graph('a1', GRAPH, to='sid-1', formats=['json'])
+
+    assert all(frame['format'] == 'json' for frame in frames)
+    assert all(frame['result_key'] is None for frame in frames)
+    assert json.loads(gzip.decompress(b''.join(frame['chunk'] for frame in frames))) == GRAPH
+
+def subscribe(monkeypatch, annotation, cache):
+    import jwt
+    from app import routes, socketio
+    from app.lib import auth
+
+    pushed = []
+    monkeypatch.setattr(auth, 'JWT_SECRET', 'test-secret')
+    monkeypatch.setattr(routes, 'resolve_annotation_user', lambda user_id, annotation_id, token=None: user_id)
+    monkeypatch.setattr(routes.AnnotationStorageService, 'get_user_annotation',
+                        staticmethod(lambda annotation_id, user_id: annotation))
+    monkeypatch.setattr(routes, 'get_annotation_redis', lambda annotation_id: cache)
+    monkeypatch.setattr(routes.graph_cache, 'get',
+                        lambda annotation_id, result_key: GRAPH if result_key == 'a1-v2.aqr' else None)
+    monkeypatch.setattr(routes, 'push_graph',
+                        lambda annotation_id, graph, result_key, to=None, formats=None:
+                        pushed.append((result_key, formats)))
+
+    token = jwt.encode({'user_id': 'u1'}, 'test-secret', algorithm='HS256')
+    client = socketio.test_client(routes.app, query_string=f'token={token}')
+    ack = client.emit('subscribe_graph', {'room': 'a1', 'format': 'json'}, callback=True)
+    client.disconnect()
+    return ack, pushed
+
+def test_stored_graph_is_pushed_before_the_annotation_completes(monkeypatch):
+    from types import SimpleNamespace
+    pending = SimpleNamespace(id='a1', status='PENDING', path_url=None)
+
+    ack, pushed = subscribe(monkeypatch, pending, {'status': 'PENDING', 'graph': None, 'result_key': 'a1-v2.aqr'})
+    assert ack == {'status': 'subscribed'}
+    assert pushed == [('a1-v2.aqr', ['json'])]
+
+    _, pushed = subscribe(monkeypatch, SimpleNamespace(id='a1', status='PENDING', path_url='a1-v2.aqr'), None)
+    assert pushed == [('a1-v2.aqr', ['json'])]
+
+    _, pushed = subscribe(monkeypatch, pending, None)
+    assert pushed == []
+
+    # the previous result is not pushed while the new one is being generated
+    rerun = SimpleNamespace(id='a1', status='PENDING', path_url='a1-v2.aqr')
+    _, pushed = subscribe(monkeypatch, rerun, {'status': 'PENDING', 'graph': None})
+    assert pushed == []
+
+def test_frames_name_their_result():
+    frames = list(graph_delivery.iter_frames('a1', 'json', b'x' * 10, 'a1-v2.aqr', frame_size=4))
+    assert [(frame['result_key'], frame['seq'], frame['total']) for frame in frames] == \
+        [('a1-v2.aqr', 0, 3), ('a1-v2.aqr', 1, 3), ('a1-v2.aqr', 2, 3)]
@@ -0,0 +1,68 @@
+import gzip
+import json
+from app.services.graph_payload import payload_key, write_payload, read_payload, iter_file, splice, \
+    iter_spliced, OPENING_MEMBER
+
+def test_payload_is_spliced_into_the_envelope(tmp_path):
+    graph = {"nodes": [{"data": {"id": "g1", "type": "gene", "name": "é"}}],
+             "edges": [{"data": {"source": "g1", "target": "g1", "label": "self"}}]}
+    path = str(tmp_path / payload_key("a1-v1.aqr"))
+    write_payload(path, graph)
+
+    assert path.endswith("a1-v1.graph.json.gz")
+    body = splice({"annotation_id": "a1", "status": "COMPLETE"}, read_payload(path))
+    assert json.loads(body) == {"annotation_id": "a1", "status": "COMPLETE", **graph}
+
+    compressed = b"".join(iter_file(path))
+    assert json.loads(gzip.decompress(compressed)) == graph
+    assert json.loads(b"".join(iter_file(path, decompress=True))) == graph
+
+def test_payload_is_spliced_without_decompressing(tmp_path):
+    graph = {"nodes": [{"data": {"id": "g1", "type": "gene"}}], "edges": []}
+    path = str(tmp_path / payload_key("a1-v1.aqr"))
+    write_payload(path, graph)
+
+    compressed = b"".join(iter_spliced({"annotation_id": "a1"}, path))
+    with open(path, "rb") as file:
+        # the stored members are sent as they are
+        assert compressed.endswith(file.read()[len(OPENING_MEMBER):])
+    assert json.loads(gzip.decompress(compressed)) == {"annotation_id": "a1", **graph}
+
+    # payloads written as a single gzip member are spliced after decompressing
+    legacy = str(tmp_path / "legacy.graph.json.gz")
+    with open(legacy, "wb") as file:
+        file.write(gzip.compress(json.dumps(graph).encode()))
+    assert iter_spliced({"annotation_id": "a1"}, legacy) is None
+
+def test_complete_annotation_is_sent_from_the_stored_payload(monkeypatch, tmp_path, client):
+    import jwt
+    from types import SimpleNamespace
+    from app import routes
+    from app.lib import auth
+
+    graph = {"nodes": [{"data": {"id": "g1", "type": "gene"}}], "edges": []}
+    path = str(tmp_path / payload_key("a1-v1.aqr"))
+    write_payload(path, graph)
+
+    annotation = SimpleNamespace(
+        id="a1", user_id="u1", path_url="a1-v1.aqr", request={"nodes": []}, query="", title="t",
+        summary=None, question=None, answer=None, node_count=1, edge_count=0,
+        node_count_by_label=None, edge_count_by_label=None, status="COMPLETE", species="human",
+        data_source="all")
+    monkeypatch.setattr(auth, "JWT_SECRET", "test-secret")
+    monkeypatch.setattr(routes, "resolve_annotation_user", lambda user_id, annotation_id, token=None: user_id)
+    monkeypatch.setattr(routes.AnnotationStorageService, "get_user_annotation",
+                        staticmethod(lambda annotation_id, user_id: annotation))
+    monkeypatch.setattr(routes.result_store, "fetch", lambda key: path if key == payload_key("a1-v1.aqr") else None)
+    monkeypatch.setattr(routes.graph_cache, "get", lambda annotation_id, result_key: None)
+    headers = {"Authorization": "Bearer " + jwt.encode({"user_id": "u1"}, "test-secret", algorithm="HS256")}
+
+    response = client.get("/annotation/a1", headers={**headers, "Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.headers["Content-Encoding"] == "gzip"
+    body = json.loads(gzip.decompress(response.get_data()))
+    assert body["annotation_id"] == "a1" and body["nodes"] == graph["nodes"]
+
+    plain = client.get("/annotation/a1", headers={**headers, "Accept-Encoding": "identity"})
+    assert "Content-Encoding" not in plain.headers
+    assert json.loads(plain.get_data()) == body
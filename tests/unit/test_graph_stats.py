@@ -0,0 +1,93 @@
+import json
+import os
+from types import SimpleNamespace
+from app.services.cypher_generator import CypherQueryGenerator
+from app.services.graph_stats import GraphStats, StatsCollector, shipped_stats
+from app.services.schema_adjacency import SchemaAdjacency
+
+NODE_COUNTS = {"gene": 60, "clo": 10, "cl": 5}
+EDGE_COUNTS = {"expressed_in": 300}
+KEY_COUNTS = {("gene", "clo"): 200, ("gene", "cl"): 100}
+
+class FakeDatabase:
+    labels_query_generator = CypherQueryGenerator.labels_query_generator
+    relationship_types_query_generator = CypherQueryGenerator.relationship_types_query_generator
+    node_count_query_generator = CypherQueryGenerator.node_count_query_generator
+    property_stats_query_generator = CypherQueryGenerator.property_stats_query_generator
+
+    def edge_count_query_generator(self, relationship=None, source_type=None, target_type=None):
+        return ("edges", relationship, source_type, target_type)
+
+    def run_query(self, query, stop_event=None, species="human"):
+        if species == "fly":
+            raise ConnectionError("fly graph is down")
+        if isinstance(query, tuple):
+            _, relationship, source_type, target_type = query
+            if relationship is None:
+                return [{"count": 300}]
+            if source_type:
+                return [{"count": KEY_COUNTS[(source_type, target_type)]}]
+            return [{"count": EDGE_COUNTS[relationship]}]
+        if query.startswith("CALL db.labels"):
+            return [{"label": label} for label in NODE_COUNTS]
+        if query.startswith("CALL db.relationshipTypes"):
+            return [{"relationshipType": relationship} for relationship in EDGE_COUNTS]
+        if "UNWIND keys(n)" in query:
+            return [{"key": "term_name", "count": 5, "distinct_count": 5}]
+        for label, count in NODE_COUNTS.items():
+            if f"(n:`{label}`)" in query:
+                return [{"count": count}]
+        return [{"count": sum(NODE_COUNTS.values())}]
+
+def shipped(tmp_path):
+    graph_info = tmp_path / "graph_info.json"
+    graph_info.write_text(json.dumps({"node_count": 1, "data_size": "1 GB",
+                                      "top_entities": [{"name": "gene", "count": 1}]}))
+    count_info = tmp_path / "count_info.json"
+    count_info.write_text(json.dumps({"expressed_in": {"count": 1, "name": "expressed_in"}}))
+    return lambda: shipped_stats(str(graph_info), str(count_info))
+
+def test_collected_stats_are_saved_and_swapped_in(tmp_path):
+    stats_dir = str(tmp_path / "stats")
+    graph_stats = GraphStats(stats_dir, shipped(tmp_path))
+    shipped_version = graph_stats.version
+    assert graph_stats.species("human")["node_counts"] == {"gene": 1}
+
+    schema = {key: {"represented_as": "edge", "input_label": "expressed_in", "source": "gene", "target": target}
+              for key, target in (("gene_expressed_in_clo", "clo"), ("gene_expressed_in_cl", "cl"))}
+    schema_manager = SimpleNamespace(adjacency={"human": SchemaAdjacency(schema), "fly": SchemaAdjacency({})})
+    # another process reading the same statistics
+    other = GraphStats(stats_dir, shipped(tmp_path))
+
+    stats = StatsCollector(FakeDatabase(), schema_manager, graph_stats).collect()
+
+    assert graph_stats.version == stats["version"] != shipped_version
+    human = graph_stats.species("human")
+    assert human["node_counts"] == NODE_COUNTS
+    assert human["edge_counts"] == {"gene_expressed_in_clo": {"count": 200, "name": "expressed_in"},
+                                    "gene_expressed_in_cl": {"count": 100, "name": "expressed_in"}}
+    assert human["properties"]["cl"] == {"sample": 5, "properties": {"term_name": {"count": 5, "distinct": 5}}}
+    kg_info = graph_stats.kg_info("human")
+    assert kg_info["node_count"] == 75 and kg_info["data_size"] == "1 GB"
+    assert kg_info["top_entities"][0] == {"count": 60, "name": "gene"}
+    # the fly graph could not be read and has no statistics yet
+    assert graph_stats.species("fly") == {}
+    assert graph_stats.kg_info("fly") == kg_info
+
+    assert os.listdir(stats_dir) == [f"graph_stats_{stats['version']}.json"]
+    assert other.refresh() is True and other.version == stats["version"]
+    assert other.refresh() is False
+
+def test_kg_version_follows_the_counts_only(tmp_path):
+    graph_stats = GraphStats(str(tmp_path / "stats"), shipped(tmp_path))
+    kg_version = graph_stats.kg_version
+
+    recollected = dict(graph_stats.current, version="later", generated_at="2026-01-01T00:00:00+00:00")
+    recollected["species"] = {"human": dict(graph_stats.species("human"), kg_info={"node_count": 1})}
+    graph_stats.current = recollected
+    assert graph_stats.kg_version == kg_version
+
+    recollected = dict(recollected, version="reloaded")
+    recollected["species"] = {"human": dict(recollected["species"]["human"], node_counts={"gene": 2})}
+    graph_stats.current = recollected
+    assert graph_stats.kg_version != kg_version
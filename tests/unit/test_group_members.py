@@ -0,0 +1,130 @@
+import jwt
+from types import SimpleNamespace
+from app import routes
+from app.lib import auth
+from app.lib.graph import Graph
+
+SECRET = "test-secret"
+
+def build_graph():
+    members = [{"id": f"gene ensg{i}", "type": "gene"} for i in range(5)]
+    return {
+        "nodes": [
+            {"data": {"id": "g1", "type": "gene", "name": "5 gene nodes", "nodes": members}},
+            {"data": {"id": "t1", "type": "transcript", "name": "enst1"}}
+        ],
+        "edges": [{"data": {"id": "e1", "source": "t1", "target": "g1", "label": "transcribed_to"}}]
+    }
+
+def test_skeleton_keeps_a_sample_of_each_group():
+    graph = build_graph()
+    skeleton = Graph().to_skeleton(graph, sample_size=2)
+
+    group = skeleton["nodes"][0]["data"]
+    assert group["count"] == 5 and group["truncated"] is True
+    assert [member["id"] for member in group["nodes"]] == ["gene ensg0", "gene ensg1"]
+    assert skeleton["nodes"][1] is graph["nodes"][1]
+    assert skeleton["edges"] == graph["edges"]
+    # the stored graph is left as it was
+    assert len(graph["nodes"][0]["data"]["nodes"]) == 5
+
+def test_small_groups_are_not_truncated():
+    group = Graph().to_skeleton(build_graph(), sample_size=5)["nodes"][0]["data"]
+    assert group["count"] == 5 and group["truncated"] is False
+
+def test_group_members_are_paged():
+    graph = build_graph()
+    first = Graph().get_group_members(graph, "g1", offset=0, limit=2)
+    last = Graph().get_group_members(graph, "g1", offset=4, limit=2)
+
+    assert first["count"] == 5 and first["next_offset"] == 2
+    assert [member["id"] for member in first["nodes"]] == ["gene ensg0", "gene ensg1"]
+    assert [member["id"] for member in last["nodes"]] == ["gene ensg4"]
+    assert last["next_offset"] is None
+
+def test_unknown_group_has_no_members():
+    assert Graph().get_group_members(build_graph(), "missing") is None
+
+def setup_storage(monkeypatch, shares):
+    '''
+    Annotation a1 owned by user u1, `shares` maps (user_id, annotation_id)
+    to the stored share.
+    '''
+    annotation = SimpleNamespace(id="a1", user_id="u1", path_url="a1-v1.aqr")
+    monkeypatch.setattr(routes.AnnotationStorageService, "get_by_id",
+                        staticmethod(lambda annotation_id: annotation if annotation_id == "a1" else None))
+    monkeypatch.setattr(routes.AnnotationStorageService, "get_user_annotation",
+                        staticmethod(lambda annotation_id, user_id: annotation if user_id == "u1" else None))
+    monkeypatch.setattr(routes.SharedAnnotationStorageService, "get",
+                        staticmethod(lambda query: shares.get((query["user_id"], query["annotation_id"]))))
+    monkeypatch.setenv("SHARED_TOKEN_SECRET", SECRET)
+    return annotation
+
+def test_owner_reads_own_annotation(monkeypatch):
+    setup_storage(monkeypatch, {})
+    assert routes.resolve_annotation_user("u1", "a1") == "u1"
+    assert routes.resolve_annotation_user("u2", "a1") is None
+    assert routes.resolve_annotation_user("u1", "missing") is None
+
+def test_shared_annotations_resolve_to_the_owner(monkeypatch):
+    private = SimpleNamespace(share_type="private", recipient_user_id="u2")
+    setup_storage(monkeypatch, {("u1", "a1"): private})
+    assert routes.resolve_annotation_user("u2", "a1") == "u1"
+    assert routes.resolve_annotation_user("u3", "a1") is None
+
+    public = SimpleNamespace(share_type="public", recipient_user_id=None)
+    setup_storage(monkeypatch, {("u1", "a1"): public})
+    assert routes.resolve_annotation_user("u3", "a1") == "u1"
+
+def test_share_token_reads_as_its_user(monkeypatch):
+    share = SimpleNamespace(share_type="public", recipient_user_id=None)
+    setup_storage(monkeypatch, {("u1", "a1"): share})
+    token = jwt.encode({"user_id": "u1"}, SECRET, algorithm="HS256")
+
+    assert routes.resolve_annotation_user("u9", "a1", token) == "u1"
+    # a token of another secret or for an annotation that was not shared
+    assert routes.resolve_annotation_user("u9", "a1", jwt.encode({"user_id": "u1"}, "x" * 32)) is None
+    setup_storage(monkeypatch, {})
+    assert routes.resolve_annotation_user("u9", "a1", token) is None
+
+def test_group_members_endpoint(monkeypatch, client):
+    setup_storage(monkeypatch, {})
+    monkeypatch.setattr(auth, "JWT_SECRET", SECRET)
+    monkeypatch.setattr(routes.result_store, "fetch", lambda key: None)
+    monkeypatch.setattr(routes.graph_cache, "get", lambda annotation_id, path_url: build_graph())
+
+    def get(user_id, path):
+        token = jwt.encode({"user_id": user_id}, SECRET, algorithm="HS256")
+        return client.get(path, headers={"Authorization": f"Bearer {token}"})
+
+    response = get("u1", "/annotation/a1/group/g1?offset=1&limit=3")
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body["count"] == 5 and body["offset"] == 1 and body["next_offset"] == 4
+    assert [member["id"] for member in body["nodes"]] == ["gene ensg1", "gene ensg2", "gene ensg3"]
+
+    assert get("u1", "/annotation/a1/group/missing").status_code == 404
+    assert get("u1", "/annotation/a1/group/g1?limit=0").status_code == 400
+    assert get("u1", "/annotation/a1/group/g1?offset=x").status_code == 400
+    assert get("u2", "/annotation/a1/group/g1").status_code == 401
+
+def test_group_members_are_read_from_the_stored_result(monkeypatch, tmp_path, client):
+    from app.services.result_file import ResultFile
+
+    file_path = str(tmp_path / "a1-v1.aqr")
+    ResultFile.write(file_path, build_graph())
+    setup_storage(monkeypatch, {})
+    monkeypatch.setattr(auth, "JWT_SECRET", SECRET)
+    monkeypatch.setattr(routes.result_store, "fetch", lambda key: file_path if key == "a1-v1.aqr" else None)
+
+    def decode_graph(annotation_id, path_url):
+        raise AssertionError("the whole graph is decoded")
+    monkeypatch.setattr(routes.graph_cache, "get", decode_graph)
+
+    token = jwt.encode({"user_id": "u1"}, SECRET, algorithm="HS256")
+    response = client.get("/annotation/a1/group/g1?offset=3", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 200
+    assert [member["id"] for member in response.get_json()["nodes"]] == ["gene ensg3", "gene ensg4"]
+
+    response = client.get("/annotation/a1/group/g1?offset=-1", headers={"Authorization": f"Bearer {token}"})
+    assert response.get_json()["error"] == "Offset must be non-negative and limit greater than zero."
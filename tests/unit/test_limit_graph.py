@@ -0,0 +1,41 @@
+from app.lib.limit_graph import limit_graph, get_query_anchors
+
+def build_graph():
+    nodes = [{"data": {"id": f"n{i}", "type": "gene", "name": f"n{i}",
+                       "nodes": [{"id": f"gene ensg{i}"}]}} for i in range(6)]
+    nodes.append({"data": {"id": "p1", "type": "parent", "name": "p1"}})
+    nodes[3]["data"]["parent"] = "p1"
+    nodes[4]["data"]["parent"] = "p1"
+
+    edges = [
+        {"data": {"source": "n0", "target": "n1", "label": "regulates"}},
+        {"data": {"source": "n0", "target": "n2", "label": "interacts_with"}},
+        {"data": {"source": "n1", "target": "p1", "label": "regulates"}},
+        {"data": {"source": "n5", "target": "n1", "label": "regulates"}},
+    ]
+    return {"nodes": nodes, "edges": edges}
+
+def test_graph_under_threshold_is_untouched():
+    graph = build_graph()
+    assert limit_graph(graph, 10) is graph
+
+def test_keeps_highest_degree_nodes():
+    result = limit_graph(build_graph(), 2)
+    node_ids = [node["data"]["id"] for node in result["nodes"]]
+    assert node_ids == ["n0", "n1"]
+    assert [(e["data"]["source"], e["data"]["target"]) for e in result["edges"]] == [("n0", "n1")]
+
+def test_anchors_are_ranked_first():
+    anchors = get_query_anchors({"nodes": [{"id": "ENSG5", "type": "gene"}]})
+    result = limit_graph(build_graph(), 2, anchors)
+    node_ids = {node["data"]["id"] for node in result["nodes"]}
+    assert "n5" in node_ids
+
+def test_kept_children_keep_their_parent():
+    result = limit_graph(build_graph(), 4)
+    node_ids = {node["data"]["id"] for node in result["nodes"]}
+    # n3 and n4 inherit the edge of their parent, ties are broken by position
+    assert {"n0", "n1", "n2", "n3", "p1"} == node_ids
+
+def test_result_is_deterministic():
+    assert limit_graph(build_graph(), 3) == limit_graph(build_graph(), 3)
@@ -0,0 +1,109 @@
+import jwt
+from types import SimpleNamespace
+from app import routes
+from app.lib import auth
+from app.lib.graph import Graph
+
+SECRET = "test-secret"
+EDGE_ID = "protein_interacts_with_protein"
+
+def protein(node_id, location):
+    return {"data": {"id": node_id, "type": "protein", "name": node_id, "location": location}}
+
+def interaction(source, target):
+    return {"data": {"id": f"{source}-{target}", "source": source, "target": target,
+                     "label": "interacts_with", "edge_id": EDGE_ID, "score": 0.9}}
+
+def build_graph():
+    return {
+        "nodes": [protein("p1", "A, B"), protein("p2", "A"), protein("p3", "A"), protein("p4", "B")],
+        "edges": [interaction("p2", "p4"), interaction("p3", "p4")]
+    }
+
+def collapse():
+    graph = Graph().collapse_node_nx_location(build_graph())
+    nodes = {node["data"]["id"]: node["data"] for node in graph["nodes"]}
+    return graph, nodes
+
+def test_nodes_get_one_copy_per_location():
+    graph, nodes = collapse()
+
+    assert nodes["p1_loc_0"]["location"] == "A" and "duplicate" not in nodes["p1_loc_0"]
+    assert nodes["p1_loc_1"]["location"] == "B" and nodes["p1_loc_1"]["duplicate"] is True
+    aliases = [edge["data"] for edge in graph["edges"] if edge["data"]["label"] == "location_alias"]
+    assert [(alias["source"], alias["target"]) for alias in aliases] == [("p1_loc_1", "p1_loc_0")]
+
+def test_nodes_with_the_same_location_and_edges_are_merged():
+    graph, nodes = collapse()
+
+    groups = [data for data in nodes.values() if "nodes" in data]
+    assert len(groups) == 1
+    group = groups[0]
+    assert group["location"] == "A"
+    assert [member["id"] for member in group["nodes"]] == ["p2", "p3"]
+    # p1 is in A too, but has other edges
+    assert "p1_loc_0" in nodes and "p4" in nodes
+
+def test_redirected_edges_keep_their_properties():
+    graph, nodes = collapse()
+    group_id = next(node_id for node_id, data in nodes.items() if "nodes" in data)
+
+    interactions = [edge["data"] for edge in graph["edges"] if edge["data"]["label"] == "interacts_with"]
+    # the edges of the merged nodes are redirected to the group once
+    assert len(interactions) == 1
+    edge = interactions[0]
+    assert (edge["source"], edge["target"]) == (group_id, "p4")
+    assert edge["edge_id"] == EDGE_ID and edge["score"] == 0.9
+    assert edge["id"] not in ("p2-p4", "p3-p4")
+
+def test_single_location_nodes_keep_their_id():
+    graph = Graph().collapse_node_nx_location({"nodes": [protein("p1", "")], "edges": []})
+    assert graph["nodes"] == [{"data": {"id": "p1", "type": "protein", "name": "p1", "location": ""}}]
+
+def stored_graph():
+    def group(node_id, members):
+        return {"data": {"id": node_id, "type": "protein", "name": node_id,
+                         "nodes": [{"id": f"protein {member}", "type": "protein"} for member in members]}}
+    return {
+        "nodes": [group("g1", ["p1", "p2"]), group("g2", ["p3"])],
+        "edges": [{"data": {"id": "e1", "source": "g1", "target": "g2",
+                            "label": "interacts_with", "edge_id": EDGE_ID}}]
+    }
+
+def request_localized_graph(monkeypatch, client, grouping):
+    monkeypatch.setattr(auth, "JWT_SECRET", SECRET)
+    monkeypatch.setattr(routes.AnnotationStorageService, "get_by_id",
+                        staticmethod(lambda annotation_id: SimpleNamespace(id=annotation_id, path_url=None)))
+    monkeypatch.setattr(routes.graph_cache, "get", lambda annotation_id, path_url: stored_graph())
+    monkeypatch.setattr(routes.ontology_index, "descendants",
+                        lambda term_ids, *args, **kwargs: {"go_1": ["go_2"]})
+    monkeypatch.setattr(routes.relation_index, "related",
+                        lambda node_ids, *args, **kwargs: {"p1": ["go_2"], "p2": ["go_2"], "p3": ["go_9"]})
+
+    token = jwt.encode({"user_id": "u1"}, SECRET, algorithm="HS256")
+    return client.get(f"/localized-graph?id=a1&locations=GO:1&grouping={grouping}",
+                      headers={"Authorization": f"Bearer {token}"})
+
+def test_localized_graph_without_grouping(monkeypatch, client):
+    response = request_localized_graph(monkeypatch, client, "none")
+
+    assert response.status_code == 200
+    body = response.get_json()
+    locations = {node["data"]["id"]: node["data"]["location"] for node in body["nodes"]}
+    assert locations == {"protein p1": "GO:1", "protein p2": "GO:1", "protein p3": ""}
+    assert len(body["edges"]) == 2
+
+def test_localized_graph_grouped_by_location(monkeypatch, client):
+    response = request_localized_graph(monkeypatch, client, "location")
+
+    assert response.status_code == 200
+    body = response.get_json()
+    groups = [node["data"] for node in body["nodes"] if "nodes" in node["data"]]
+    assert len(body["nodes"]) == 2 and len(groups) == 1
+    assert groups[0]["location"] == "GO:1"
+    assert sorted(member["id"] for member in groups[0]["nodes"]) == ["protein p1", "protein p2"]
+    assert [(edge["data"]["source"], edge["data"]["target"]) for edge in body["edges"]] == \
+        [(groups[0]["id"], "protein p3")]
+
+def test_localized_graph_rejects_unknown_grouping(monkeypatch, client):
+    assert request_localized_graph(monkeypatch, client, "species").status_code == 400
@@ -0,0 +1,86 @@
+from app.services.ontology_index import OntologyClosureIndex, RelationIndex
+
+class FakeDB:
+    def __init__(self, edges):
+        self.edges = edges
+        self.queries = 0
+
+    def hierarchy_query_generator(self, node_type, relationship, properties=None):
+        return f"{node_type} {relationship}", properties or {}
+
+    def relation_query_generator(self, source_type, target_type, relationship, properties=None):
+        return f"{source_type} {relationship} {target_type}", properties or {}
+
+    def run_query(self, query, stop_event=None, species='human', parameters=None):
+        self.queries += 1
+        self.parameters = parameters
+        if 'protein' in query:
+            return [{'node_id': node, 'related_ids': related} for node, related in self.edges]
+        return [{'child_id': child, 'parent_id': parent} for child, parent in self.edges]
+
+def test_descendants_are_transitive(tmp_path):
+    db = FakeDB([('go_2', 'go_1'), ('go_3', 'go_2'), ('go_4', 'go_1')])
+    index = OntologyClosureIndex(db, str(tmp_path))
+
+    result = index.descendants(['go_1', 'go_2', 'go_3', 'go_9'], 'go', 'subclass_of')
+
+    assert sorted(result['go_1']) == ['go_2', 'go_3', 'go_4']
+    assert result['go_2'] == ['go_3']
+    assert result['go_3'] == []
+    assert result['go_9'] == []
+
+def test_index_is_built_once_and_reused_from_disk(tmp_path):
+    db = FakeDB([('go_2', 'go_1')])
+    OntologyClosureIndex(db, str(tmp_path)).descendants(['go_1'], 'go', 'subclass_of')
+    result = OntologyClosureIndex(db, str(tmp_path)).descendants(['go_1'], 'go', 'subclass_of')
+
+    assert result == {'go_1': ['go_2']}
+    assert db.queries == 1
+
+def test_cycles_do_not_loop(tmp_path):
+    db = FakeDB([('go_2', 'go_1'), ('go_1', 'go_2')])
+    result = OntologyClosureIndex(db, str(tmp_path)).descendants(['go_1'], 'go', 'subclass_of')
+
+    assert result == {'go_1': ['go_2']}
+
+def test_relation_index_maps_nodes_to_related_ids(tmp_path):
+    db = FakeDB([('p1', ['go_1', 'go_2']), ('p2', ['go_2'])])
+    index = RelationIndex(db, str(tmp_path))
+
+    result = index.related(['p1', 'p2', 'p3'], 'go', 'protein', 'go_gene_product',
+                           {'subontology': 'cellular_component'})
+
+    assert result == {'p1': ['go_1', 'go_2'], 'p2': ['go_2'], 'p3': []}
+    assert db.parameters == {'subontology': 'cellular_component'}
+
+def test_new_graph_version_rebuilds_and_closes_the_old_index(tmp_path):
+    db = FakeDB([('go_2', 'go_1')])
+    version = ['v1']
+    index = OntologyClosureIndex(db, str(tmp_path), lambda: version[0])
+    spec = index.spec('go', 'subclass_of')
+
+    index.descendants(['go_1'], 'go', 'subclass_of')
+    old = index.indexes[spec][1]
+    version[0] = 'v2'
+    db.edges = [('go_3', 'go_1')]
+    result = index.descendants(['go_1'], 'go', 'subclass_of')
+
+    assert result == {'go_1': ['go_3']}
+    assert db.queries == 2
+    assert old._file.closed
+    assert not index.users and not index.retired
+
+def test_index_in_use_is_closed_after_its_last_lookup(tmp_path):
+    db = FakeDB([('go_2', 'go_1')])
+    version = ['v1']
+    index = OntologyClosureIndex(db, str(tmp_path), lambda: version[0])
+    spec = index.spec('go', 'subclass_of')
+
+    reading = index.open_index(spec)
+    version[0] = 'v2'
+    index.descendants(['go_1'], 'go', 'subclass_of')
+
+    assert not reading._file.closed
+    assert reading.get('go_1') == ['go_2']
+    index.release(reading)
+    assert reading._file.closed
@@ -0,0 +1,50 @@
+from app.lib.query_planner import CardinalityStats, plan_predicates
+
+STATS = CardinalityStats(
+    {"closest_gene": {"count": 23000000, "name": "closest_gene"},
+     "transcribed_to": {"count": 250000, "name": "transcribed_to"},
+     "translates_to": {"count": 20000, "name": "translates_to"}},
+    {"snp": 37000000, "gene": 62000, "transcript": 250000, "protein": 20000},
+    {"gene": {"sample": 10000, "properties": {"gene_type": {"count": 10000, "distinct": 40},
+                                              "gene_name": {"count": 10000, "distinct": 10000}}}})
+
+def node(node_id, node_type, properties=None, id=""):
+    return {"node_id": node_id, "id": id, "type": node_type, "properties": properties or {}}
+
+def predicate(predicate_id, predicate_type, source, target):
+    return {"predicate_id": predicate_id, "type": predicate_type, "source": source, "target": target}
+
+def plan(nodes, predicates):
+    requests = {"nodes": nodes, "predicates": predicates}
+    node_map = {node["node_id"]: node for node in nodes}
+    return [p["predicate_id"] for p in plan_predicates(requests, node_map, STATS)["predicates"]]
+
+def test_smallest_join_goes_first():
+    nodes = [node("n1", "snp"), node("n2", "gene"), node("n3", "transcript"), node("n4", "protein")]
+    predicates = [predicate("p0", "closest gene", "n1", "n2"),
+                  predicate("p1", "transcribed to", "n2", "n3"),
+                  predicate("p2", "translates to", "n3", "n4")]
+
+    assert plan(nodes, predicates) == ["p2", "p1", "p0"]
+
+def test_filters_are_joined_early_and_the_order_stays_connected():
+    # a known snp makes the largest edge type the most selective start
+    nodes = [node("n1", "snp", id="rs123"), node("n2", "gene"), node("n3", "transcript"),
+             node("n4", "protein")]
+    predicates = [predicate("p2", "translates to", "n3", "n4"),
+                  predicate("p1", "transcribed to", "n2", "n3"),
+                  predicate("p0", "closest gene", "n1", "n2")]
+
+    assert plan(nodes, predicates) == ["p0", "p1", "p2"]
+
+def test_unknown_counts_keep_the_request_order():
+    nodes = [node("n1", "tad"), node("n2", "gene"), node("n3", "tad")]
+    predicates = [predicate("p0", "in tad region", "n2", "n1"), predicate("p1", "in tad region", "n2", "n3")]
+
+    assert plan(nodes, predicates) == ["p0", "p1"]
+
+def test_property_filters_use_the_sampled_distinct_values():
+    assert STATS.selectivity(node("n1", "gene", {"gene_name": "TP53"})) == 1 / 10000
+    assert STATS.selectivity(node("n1", "gene", {"gene_type": "protein_coding"})) == 1 / 40
+    # properties without statistics
+    assert STATS.selectivity(node("n1", "snp", {"chr": "chr1"})) == 0.1
@@ -0,0 +1,40 @@
+import json
+from app.services.result_file import ResultFile, read_result_graph
+
+def grouped_graph():
+    return {
+        "nodes": [
+            {"data": {"id": "p1", "type": "parent", "name": "p1"}},
+            {"data": {"id": "g1", "type": "gene", "name": "gene", "parent": "p1",
+                      "nodes": [{"id": "gene a", "type": "gene"}, {"id": "gene b", "type": "gene"}]}},
+            {"data": {"id": "g2", "type": "transcript", "name": "transcript",
+                      "nodes": [{"id": "transcript t", "type": "transcript"}]}},
+        ],
+        "edges": [
+            {"data": {"id": "e1", "source": "g1", "target": "g2", "label": "transcribed_to"}},
+            {"data": {"id": "e2", "source": "g2", "target": "g1", "label": "translates_to"}},
+        ]
+    }
+
+def test_result_file_round_trip(tmp_path):
+    path = str(tmp_path / "result.aqr")
+    ResultFile.write(path, grouped_graph())
+
+    assert read_result_graph(path) == grouped_graph()
+
+def test_sections_are_read_on_their_own(tmp_path):
+    path = str(tmp_path / "result.aqr")
+    ResultFile.write(path, grouped_graph())
+
+    with ResultFile(path) as result:
+        assert result.counts()['member_count'] == 3
+        assert result.members("g1") == [{"id": "gene a", "type": "gene"}, {"id": "gene b", "type": "gene"}]
+        assert result.members("missing") is None
+        assert [edge["data"]["id"] for edge in result.edges("translates_to")] == ["e2"]
+        assert "nodes" not in result.nodes()[1]["data"]
+
+def test_legacy_json_results_are_still_readable(tmp_path):
+    path = tmp_path / "result.json"
+    path.write_text(json.dumps(grouped_graph()))
+
+    assert read_result_graph(str(path)) == grouped_graph()
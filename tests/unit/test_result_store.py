@@ -0,0 +1,108 @@
+import os
+import pytest
+from app.persistence.result_store import ResultStore, DirectoryResultStore, create_result_store
+
+def test_any_replica_can_fetch_a_stored_result(tmp_path):
+    shared = tmp_path / "shared"
+    writer = DirectoryResultStore(str(tmp_path / "pod-a"), str(shared))
+    reader = DirectoryResultStore(str(tmp_path / "pod-b"), str(shared))
+
+    file_path = writer.local_path("a1-v1.aqr")
+    with open(file_path, "wb") as file:
+        file.write(b"result")
+    writer.put("a1-v1.aqr", file_path)
+
+    assert reader.exists("a1-v1.aqr")
+    local_path = reader.fetch("a1-v1.aqr")
+    assert local_path == str(tmp_path / "pod-b" / "a1-v1.aqr")
+    with open(local_path, "rb") as file:
+        assert file.read() == b"result"
+
+def test_missing_and_legacy_keys(tmp_path):
+    store = DirectoryResultStore(str(tmp_path / "cache"), str(tmp_path / "shared"))
+    legacy = tmp_path / "legacy.json"
+    legacy.write_text("{}")
+
+    assert store.fetch("missing.aqr") is None
+    assert store.fetch(None) is None
+    assert store.fetch(str(legacy)) == str(legacy)
+
+def test_replaced_versions_are_deleted(tmp_path):
+    shared = tmp_path / "shared"
+    writer = DirectoryResultStore(str(tmp_path / "pod-a"), str(shared))
+    reader = DirectoryResultStore(str(tmp_path / "pod-b"), str(shared))
+
+    def put(key):
+        file_path = writer.local_path(key)
+        with open(file_path, "wb") as file:
+            file.write(key.encode())
+        writer.put(key, file_path)
+
+    for key in ("a1-v1.aqr", "a1-v1.full.json", "a2-v1.aqr", "export-a1-tsv-v1.zip"):
+        put(key)
+    reader.fetch("a1-v1.aqr")
+    reader.fetch("export-a1-tsv-v1.zip")
+
+    put("a1-v-2.aqr")
+    put("a1-v-2.full.json")
+    writer.delete("a1-v1.aqr")
+    writer.delete("a1-v1.full.json")
+    assert not reader.exists("a1-v1.full.json")
+    assert sorted(os.listdir(shared)) == ["a1-v-2.aqr", "a1-v-2.full.json", "a2-v1.aqr", "export-a1-tsv-v1.zip"]
+
+    # the reader drops its copy of the previous version with the next fetch
+    reader.fetch("a1-v-2.aqr")
+    assert sorted(os.listdir(tmp_path / "pod-b")) == ["a1-v-2.aqr", "export-a1-tsv-v1.zip"]
+
+def test_version_prefix():
+    assert ResultStore.version_prefix("a1-v-1.graph.json.gz") == "a1-"
+    assert ResultStore.version_prefix("export-a1-xlsx-v-1.xlsx") == "export-a1-xlsx-"
+    assert ResultStore.version_prefix("graph.json") is None
+
+def test_directory_store_requires_its_directory(monkeypatch, tmp_path):
+    monkeypatch.delenv("RESULT_STORE_DIR", raising=False)
+    with pytest.raises(ValueError, match="RESULT_STORE_DIR"):
+        create_result_store("directory", str(tmp_path))
+
+    monkeypatch.setenv("RESULT_STORE_DIR", str(tmp_path / "shared"))
+    assert isinstance(create_result_store("directory", str(tmp_path)), DirectoryResultStore)
+
+def test_deleted_annotations_leave_no_files(monkeypatch, tmp_path, client):
+    import jwt
+    from types import SimpleNamespace
+    from app import routes
+    from app.lib import auth
+    from app.persistence.result_store import LocalResultStore
+    from app.workers import task_handler
+
+    store = LocalResultStore(str(tmp_path))
+    annotations = {}
+    for annotation_id in ("a1", "a2"):
+        keys = [f"{annotation_id}-v1.aqr", f"{annotation_id}-v1.graph.json.gz",
+                f"{annotation_id}-v1.full.json", f"export-{annotation_id}-tsv-v1.zip"]
+        for key in keys:
+            with open(store.local_path(key), "wb") as file:
+                file.write(b"result")
+        annotations[annotation_id] = SimpleNamespace(id=annotation_id, path_url=keys[0], result_version="v1")
+
+    reset = []
+    monkeypatch.setattr(task_handler, "result_store", store)
+    monkeypatch.setattr(routes, "reset_task", reset.append)
+    monkeypatch.setattr(auth, "JWT_SECRET", "test-secret")
+    monkeypatch.setattr(routes.AnnotationStorageService, "get_user_annotation",
+                        staticmethod(lambda annotation_id, user_id: annotations.get(annotation_id)))
+    monkeypatch.setattr(routes.AnnotationStorageService, "get_by_id",
+                        staticmethod(lambda annotation_id: annotations.get(annotation_id)))
+    monkeypatch.setattr(routes.AnnotationStorageService, "delete", staticmethod(lambda annotation_id: 1))
+    monkeypatch.setattr(routes.AnnotationStorageService, "delete_many_by_id",
+                        staticmethod(lambda annotation_ids: len(annotation_ids)))
+    headers = {"Authorization": "Bearer " + jwt.encode({"user_id": "u1"}, "test-secret", algorithm="HS256")}
+
+    assert client.delete("/annotation/a1", headers=headers).status_code == 200
+    assert sorted(os.listdir(tmp_path)) == ["a2-v1.aqr", "a2-v1.full.json", "a2-v1.graph.json.gz",
+                                            "export-a2-tsv-v1.zip"]
+
+    response = client.post("/annotation/delete", headers=headers, data='{"annotation_ids": ["a2"]}')
+    assert response.status_code == 200
+    assert os.listdir(tmp_path) == []
+    assert reset == ["a1", "a2"]
@@ -0,0 +1,43 @@
+import pytest
+from app.lib.validator import validate_request
+from app.services.schema_adjacency import SchemaAdjacency
+from app.services.schema_data import SchemaManager
+
+RAW_SCHEMA = {
+    "gene": {"represented_as": "node", "input_label": "gene"},
+    "transcribed to": {"represented_as": "edge", "input_label": "transcribed_to",
+                       "source": "gene", "target": "transcript"},
+    "super enhancer to gene": {"represented_as": "edge", "input_label": "associated_with",
+                               "source": ["super enhancer", "enhancer"], "target": "gene"},
+}
+
+def adjacency():
+    schema_manager = SchemaManager.__new__(SchemaManager)
+    return SchemaAdjacency(schema_manager.process_schema(RAW_SCHEMA))
+
+def test_edges_are_indexed_by_their_end_types():
+    index = adjacency()
+
+    assert index.edge_key("gene", "transcribed_to", "transcript") == "gene_transcribed_to_transcript"
+    assert index.edge_key("transcript", "transcribed_to", "gene") is None
+    assert index.outgoing["super_enhancer"] == {"associated_with": {"gene": "super_enhancer_associated_with_gene"}}
+    assert index.incoming["gene"]["associated_with"] == {
+        "super_enhancer": "super_enhancer_associated_with_gene",
+        "enhancer": "enhancer_associated_with_gene",
+    }
+
+    # /relations only lists edges whose source or target is the node label
+    # itself, not one of a list of labels
+    assert index.relations_for("super_enhancer") == []
+    assert [relation["type"] for relation in index.relations_for("gene")] == [
+        "gene_transcribed_to_transcript", "super_enhancer_associated_with_gene", "enhancer_associated_with_gene"]
+
+def test_predicates_are_validated_against_the_index():
+    def request(predicate_type):
+        return {"nodes": [{"id": "", "node_id": "n1", "type": "gene", "properties": {}},
+                          {"id": "", "node_id": "n2", "type": "transcript", "properties": {}}],
+                "predicates": [{"type": predicate_type, "source": "n1", "target": "n2"}]}
+
+    assert set(validate_request(request("transcribed to"), adjacency(), None)) == {"n1", "n2"}
+    with pytest.raises(Exception, match="Invalid source and target"):
+        validate_request(request("translates to"), adjacency(), None)
@@ -0,0 +1,37 @@
+from types import SimpleNamespace
+from app.services.schema_reload import ReloadableSchema
+
+def test_schema_is_swapped_when_the_configs_change():
+    configs = {"hash": "a"}
+    builds = []
+    attempts = []
+
+    def factory():
+        attempts.append(configs["hash"])
+        if configs["hash"] == "broken":
+            raise ValueError("invalid schema config")
+        builds.append(configs["hash"])
+        return SimpleNamespace(version=f"v-{configs['hash']}", config_hash=configs["hash"],
+                               get_config_hash=lambda: configs["hash"])
+
+    schema_manager = ReloadableSchema(factory)
+    assert schema_manager.version == "v-a"
+    assert schema_manager.reload_if_changed() is False
+
+    configs["hash"] = "b"
+    assert schema_manager.reload_if_changed() is True
+    assert schema_manager.version == "v-b"
+
+    # a failed build keeps serving the previous schema
+    configs["hash"] = "broken"
+    assert schema_manager.reload_if_changed() is False
+    assert schema_manager.version == "v-b"
+    assert builds == ["a", "b"]
+
+    # the broken configs are not built again until they change
+    assert schema_manager.reload_if_changed() is False
+    assert attempts.count("broken") == 1
+
+    configs["hash"] = "c"
+    assert schema_manager.reload_if_changed() is True
+    assert schema_manager.version == "v-c"
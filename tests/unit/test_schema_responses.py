@@ -0,0 +1,39 @@
+import json
+from types import SimpleNamespace
+from app.services.schema_responses import SchemaResponses
+
+def node(label):
+    return {'label': label, 'properties': {'name': 'str'}}
+
+def schema_manager(version='v1'):
+    human = {'GENCODE': {
+        'nodes': {'gene': node('gene'), 'transcript': node('transcript')},
+        'edges': {
+            'transcribed_to': {'source': 'gene', 'target': 'transcript', 'output_label': 'transcribed_to'},
+            'transcribed_from': {'source': 'transcript', 'target': 'gene', 'output_label': 'transcribed_from'}
+        }}}
+    fly = {'nodes': {'gene': node('gene'), 'protein': node('protein')},
+           'edges': {'a': {'source': 'gene', 'target': 'protein', 'input_label': 'translates_to'},
+                     'b': {'source': 'gene', 'target': 'protein', 'input_label': 'encodes'}}}
+    return SimpleNamespace(version=version, schmea_representation=human, fly_schema_represetnation=fly,
+                           schema_list=[{'id': 'GENCODE', 'name': 'GENCODE', 'url': None}])
+
+def test_schema_bodies_are_built_once_with_stable_ids():
+    responses = SchemaResponses(schema_manager())
+
+    body, etag = responses.schema('human', ['GENCODE'])
+    schema = json.loads(body)
+
+    assert [n['id'] for n in schema['nodes']] == ['gene', 'transcript']
+    assert [e['id'] for e in schema['edges']] == ['gene_transcribed_to_transcript',
+                                                  'transcript_transcribed_from_gene']
+    assert responses.schema('human', ['GENCODE']) == (body, etag)
+    assert SchemaResponses(schema_manager()).schema('human', ['GENCODE']) == (body, etag)
+    assert SchemaResponses(schema_manager('v2')).schema('human', ['GENCODE'])[1] != etag
+
+def test_fly_edges_between_the_same_nodes_are_merged():
+    preference, _ = SchemaResponses(schema_manager()).preference_option()
+    fly = json.loads(preference)['sources']['fly'][0]['schema']['schema']
+
+    assert fly['edges'] == [{'data': {'source': 'gene', 'target': 'protein',
+                                      'possible_connection': ['translates_to', 'encodes']}}]
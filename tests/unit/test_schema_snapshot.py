@@ -0,0 +1,43 @@
+import os
+from app.services import schema_data
+from app.services.schema_data import SchemaManager
+
+def create_schema_manager(snapshot_dir):
+    return SchemaManager(schema_config_path='./config/schema_config.yaml',
+                         biocypher_config_path='./config/biocypher_config.yaml',
+                         config_path='./config/schema',
+                         fly_schema_config_path='./config/fly_base_schema/net_act_essential_schema_config.yaml',
+                         snapshot_dir=str(snapshot_dir))
+
+def test_snapshot_is_loaded_instead_of_building(tmp_path, monkeypatch):
+    built = create_schema_manager(tmp_path)
+    assert os.listdir(tmp_path) == [os.path.basename(built.snapshot_path)]
+
+    def no_biocypher(*args, **kwargs):
+        raise AssertionError("the schema was built again")
+
+    monkeypatch.setattr(schema_data, "BioCypher", no_biocypher)
+    loaded = create_schema_manager(tmp_path)
+
+    assert loaded.version == built.version
+    assert loaded.parent_nodes == built.parent_nodes
+    assert loaded.full_schema_representation == built.full_schema_representation
+
+def test_config_changes_change_the_hash(tmp_path):
+    source_dir = tmp_path / "schema"
+    source_dir.mkdir()
+    config = tmp_path / "schema_config.yaml"
+    config.write_text("gene:\n  represented_as: node\n")
+
+    schema_manager = SchemaManager.__new__(SchemaManager)
+    schema_manager.schema_config_path = schema_manager.biocypher_config_path = \
+        schema_manager.fly_schema_config_path = str(config)
+    schema_manager.config_path = str(source_dir)
+    hashes = [schema_manager.get_config_hash()]
+
+    config.write_text("gene:\n  represented_as: edge\n")
+    hashes.append(schema_manager.get_config_hash())
+    (source_dir / "gencode.yaml").write_text("name: GENCODE\n")
+    hashes.append(schema_manager.get_config_hash())
+
+    assert len(set(hashes)) == 3
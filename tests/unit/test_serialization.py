@@ -0,0 +1,80 @@
+import datetime
+import gzip
+import json
+from bson import ObjectId
+from flask import Flask, jsonify
+from app.serialization import dumps, init_serialization, json_response, pack_compact, unpack_compact, \
+    make_etag, not_modified, not_modified_response, cached_response, PRIVATE_CACHE
+
+def create_app():
+    test_app = Flask(__name__)
+    init_serialization(test_app)
+
+    @test_app.route('/large')
+    def large():
+        return json_response({'nodes': [{'id': str(i)} for i in range(500)]})
+
+    @test_app.route('/cached')
+    def cached():
+        etag = make_etag('v1', 'cached')
+        if not_modified(etag):
+            return not_modified_response(etag, PRIVATE_CACHE)
+        return cached_response(json_response({'nodes': list(range(1000))}), etag, PRIVATE_CACHE)
+
+    @test_app.route('/small')
+    def small():
+        return jsonify({'id': ObjectId('0123456789ab0123456789ab')})
+
+    return test_app
+
+def test_dumps_handles_datetimes_and_object_ids():
+    value = {'id': ObjectId('0123456789ab0123456789ab'),
+             'created_at': datetime.datetime(2024, 1, 2, 3, 4, 5), 1: {'a'}}
+
+    assert json.loads(dumps(value)) == {'id': '0123456789ab0123456789ab',
+                                        'created_at': '2024-01-02T03:04:05', '1': ['a']}
+    assert b'\n' in dumps(value, indent=True)
+
+def test_response_encoding_is_negotiated():
+    client = create_app().test_client()
+
+    response = client.get('/large', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert len(json.loads(gzip.decompress(response.data))['nodes']) == 500
+
+    response = client.get('/large')
+    assert 'Content-Encoding' not in response.headers
+    assert b'\n' not in response.data
+
+    response = client.get('/small', headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in response.headers
+    assert response.get_json() == {'id': '0123456789ab0123456789ab'}
+
+def test_compact_format_round_trip():
+    graph = {"nodes": [{"data": {"id": f"gene ensg{i:011d}", "type": "gene", "name": f"g{i}",
+                                 "parent": "p1"}} for i in range(100)],
+             "edges": [{"data": {"source": f"gene ensg{i:011d}", "target": "gene ensg00000000000",
+                                 "label": "regulates", "id": i}} for i in range(100)]}
+
+    data = pack_compact(graph)
+
+    assert unpack_compact(data) == graph
+    assert len(data) < len(dumps(graph)) / 2
+
+def test_conditional_requests():
+    client = create_app().test_client()
+
+    response = client.get('/cached')
+    etag = response.headers['ETag']
+    assert response.headers['Cache-Control'] == PRIVATE_CACHE
+
+    response = client.get('/cached', headers={'If-None-Match': etag})
+    assert response.status_code == 304 and response.data == b''
+
+    response = client.get('/cached', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['ETag'] == etag[:-1] + '-gzip"'
+    response = client.get('/cached', headers={'Accept-Encoding': 'gzip',
+                                              'If-None-Match': response.headers['ETag']})
+    assert response.status_code == 304
+
+    assert client.get('/cached', headers={'If-None-Match': '"other"'}).status_code == 200
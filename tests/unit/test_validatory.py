@@ -2,25 +2,27 @@ import pytest
 from app.lib.validator import validate_request 
 from app import schema_manager
 
+adjacency = schema_manager.adjacency['human']
+
 def test_node_is_missing():
     # assert validate raises an exeption with no node key in request dict
     request = []
     with pytest.raises(Exception, match="node is missing"):
-        validate_request(request, schema_manager.schema)
+        validate_request(request, adjacency, 'hypothesis')
 
 def test_wrong_node_type():
     # assert validate_request raises an exception with node value not a list
     requests = [{"nodes": ''},{"nodes": {}},{"nodes": set()},{"nodes": ()}]
     with pytest.raises(Exception, match="nodes should be a list"):
         for request in requests:
-            validate_request(request, schema_manager.schema)
+            validate_request(request, adjacency, 'hypothesis')
 
 def test_wrong_node_values():
     # assert the values of node is a list of dict
     requests = [ {'nodes':[str()]},{'nodes':[list()]},{'nodes':[set()]},{'nodes':[tuple()]} ]
     with pytest.raises(Exception, match="Each node must be a dictionary"):
         for request in requests:
-            validate_request(request, schema_manager.schema)
+            validate_request(request, adjacency, 'hypothesis')
 
 def test_node_without_node_id():
     #assert each node in nodes value have a node_id
@@ -31,7 +33,7 @@ def test_node_without_node_id():
       }]}
 
     with pytest.raises(Exception, match="node_id is required"):
-        validate_request(request, schema_manager.schema)
+        validate_request(request, adjacency, 'hypothesis')
         
     request = { 'nodes':[
                {"node_id": "", # node with empty node_id
@@ -41,7 +43,7 @@ def test_node_without_node_id():
                 }]}
 
     with pytest.raises(Exception, match="node_id is required"):
-        validate_request(request, schema_manager.schema)
+        validate_request(request, adjacency, 'hypothesis')
 
 
 def test_node_without_id():
@@ -53,7 +55,7 @@ def test_node_without_id():
         }]}
 
     with pytest.raises(Exception, match="id is required!"):
-        validate_request(request, schema_manager.schema)
+        validate_request(request, adjacency, 'hypothesis')
 
 def test_node_without_type():
     #assert each node in nodes value have a type
@@ -64,7 +66,7 @@ def test_node_without_type():
       }]}
 
     with pytest.raises(Exception, match="type is required"):
-        validate_request(request, schema_manager.schema)
+        validate_request(request, adjacency, 'hypothesis')
 
     request = { 'nodes':[
                {"node_id": "", # node with empty type
@@ -74,7 +76,7 @@ def test_node_without_type():
                 }]}
 
     with pytest.raises(Exception, match="type is required"):
-        validate_request(request, schema_manager.schema)
+        validate_request(request, adjacency, 'hypothesis')
 
 '''
 def test_properties_key():
@@ -90,7 +92,7 @@ def test_properties_key():
     ]}
 
     with pytest.raises(Exception, match="protein_nam doesn't exsist in the schema!"):
-        validate_request(request, schema_manager.schema)
+        validate_request(request, adjacency, 'hypothesis')
 '''
 
 def test_predicate_type():
@@ -129,7 +131,7 @@ def test_predicate_type():
 
     with pytest.raises(Exception, match="Predicate should be a lis"):
         for request in requests:
-            validate_request(request, schema_manager.schema)
+            validate_request(request, adjacency, 'hypothesis')
 
 def test_predicates_type():
     # assert each predicate has non emptry type value
@@ -149,12 +151,12 @@ def test_predicates_type():
             }
 
     with pytest.raises(Exception, match="predicate type is required"):
-        validate_request(request, schema_manager.schema)
+        validate_request(request, adjacency, 'hypothesis')
 
     request['predicates'][0]['type'] = "" # add empty string to predicates and assert same exception
 
     with pytest.raises(Exception, match="predicate type is required"):
-        validate_request(request, schema_manager.schema)
+        validate_request(request, adjacency, 'hypothesis')
 
 def test_predicates_source():
     # assert each predicate has non emptry source value
@@ -174,12 +176,12 @@ def test_predicates_source():
             }
 
     with pytest.raises(Exception, match="source is required"):
-        validate_request(request, schema_manager.schema)
+        validate_request(request, adjacency, 'hypothesis')
 
     request['predicates'][0]['source'] = "" # add empty string to predicates and assert same exception
 
     with pytest.raises(Exception, match="source is required"):
-        validate_request(request, schema_manager.schema)
+        validate_request(request, adjacency, 'hypothesis')
 
 
 def test_predicates_target():
@@ -200,12 +202,12 @@ def test_predicates_target():
             }
 
     with pytest.raises(Exception, match="target is required"):
-        validate_request(request, schema_manager.schema)
+        validate_request(request, adjacency, 'hypothesis')
 
     request['predicates'][0]['target'] = "" # add empty string to predicates and assert same exception
 
     with pytest.raises(Exception, match="target is required"):
-        validate_request(request, schema_manager.schema)
+        validate_request(request, adjacency, 'hypothesis')
 
 def test_predicte_source_map():
     # assert predicate source is available in node_id value
@@ -226,7 +228,7 @@ def test_predicte_source_map():
             }
 
     with pytest.raises(Exception, match="Source node n0 does not exist in the nodes object"):
-        validate_request(request, schema_manager.schema)
+        validate_request(request, adjacency, 'hypothesis')
 
 def test_predicte_target_map():
     # assert predicate target is available in node_id value
@@ -247,7 +249,7 @@ def test_predicte_target_map():
             }
 
     with pytest.raises(Exception, match="Target node n0 does not exist in the nodes object"):
-        validate_request(request, schema_manager.schema)
+        validate_request(request, adjacency, 'hypothesis')
 
 # add test for last exception
 def test_predicate_schema_type():